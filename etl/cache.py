@@ -0,0 +1,54 @@
+import json
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from helper import logger
+
+
+class CacheInvalidator:
+    """
+    Класс для удаления из кеша API записей по заново проиндексированным документам.
+    Идентификаторы документов публикуются в канал, по которому API очищает in-memory кеши воркеров.
+    Ключи списков и поиска сбрасываются все сразу увеличением поколения индекса.
+    """
+
+    # Префиксы ключей кеша API для записей по идентификатору (см. src/services/cache_keys.py)
+    KEY_PREFIXES = {
+        'movies': ('film', 'film:short'),
+        'genres': ('genre',),
+        'persons': ('person',),
+    }
+
+    # Счетчик поколения индекса (см. generation_key в src/services/cache_keys.py)
+    GENERATION_KEY = 'generation:{schema}'
+
+    def __init__(self, redis_client: Redis, schema: str, channel: str) -> None:
+        self.redis_client = redis_client
+        self.schema = schema
+        self.channel = channel
+        self.generation_key = self.GENERATION_KEY.format(schema=schema)
+        if schema in self.KEY_PREFIXES:
+            self.key_prefixes = self.KEY_PREFIXES[schema]
+        else:
+            raise ValueError(
+                f'{self.__class__.__name__}: Unknown schema name: {schema}')
+
+    def invalidate(self, ids: list[str]) -> None:
+        """Метод удаления записей кеша, в том числе негативных, для переданных идентификаторов."""
+        if not ids:
+            return
+        try:
+            self.redis_client.delete(
+                *[f'{prefix}:{id}' for id in ids for prefix in self.key_prefixes])
+            self.redis_client.publish(
+                self.channel, json.dumps({'index': self.schema, 'ids': ids}))
+        except RedisError as e:
+            logger.error(f'{self.__class__.__name__}: {e}')
+
+    def bump_generation(self) -> None:
+        """Метод увеличения поколения индекса, после которого закешированные списки становятся недоступны."""
+        try:
+            self.redis_client.incr(self.generation_key)
+        except RedisError as e:
+            logger.error(f'{self.__class__.__name__}: {e}')
@@ -25,18 +25,23 @@ class ElasticsearchLoader():
         elif self.schema == 'persons':
             r = requests.get(f'{self.es_url}/persons/_mapping')
 
-        if r.status_code != 200:
-            try:
-                es_schema_path = os.path.join(
-                    os.path.dirname(__file__), f'config/es_schema_{self.schema}.json')
-                es_schema = json.load(
-                    open(es_schema_path, 'r'))
+        try:
+            es_schema_path = os.path.join(
+                os.path.dirname(__file__), f'config/es_schema_{self.schema}.json')
+            es_schema = json.load(
+                open(es_schema_path, 'r'))
 
+            if r.status_code != 200:
                 requests.put(f'{self.es_url}/{self.schema}',
                              headers={'Content-Type': 'application/json'}, data=json.dumps(es_schema))
                 logger.info(f'Elasticsearch schema {self.schema} is created')
-            except Exception as e:
-                logger.error(f'{self.__class__.__name__}: {e}')
+            else:
+                # Индекс со строгой схемой не примет документы с новыми полями (например, modified),
+                # поэтому новые поля схемы добавляются в существующий индекс
+                requests.put(f'{self.es_url}/{self.schema}/_mapping',
+                             headers={'Content-Type': 'application/json'}, data=json.dumps(es_schema['mappings']))
+        except Exception as e:
+            logger.error(f'{self.__class__.__name__}: {e}')
 
     def save_data(self, batch_records: str) -> None:
         """Медод записи пачки записей в Elasticsearch."""
@@ -7,6 +7,7 @@ import psycopg2
 import requests
 from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
+from redis import Redis
 
 from helper import backoff, logger
 from pydantic_classes import Settings
@@ -14,14 +15,20 @@ from state_storage import JsonFileStorage, State
 from extractor import PostgresExtractor
 from transformer import Transformer
 from loader import ElasticsearchLoader
+from cache import CacheInvalidator
 
 
 # Время между заспуском очередного etl процесса (секунды)
 REFRESH = 10
 
 
-def run_etl_pipeline(pg_conn: _connection, es_url: str, schema: str, state: str) -> None:
-    """Функция синхронизации данных Postgres и Elasticsearch по определенной схеме."""
+def run_etl_pipeline(
+        pg_conn: _connection, es_url: str, schema: str, state: str, cache_invalidator: CacheInvalidator) -> int:
+    """
+    Функция синхронизации данных Postgres и Elasticsearch по определенной схеме.
+    Записи кеша API по перенесенным документам удаляются через cache_invalidator.
+    Возвращает количество перенесенных записей.
+    """
     extractor = PostgresExtractor(pg_conn, schema)
     transformer = Transformer(schema)
     loader = ElasticsearchLoader(es_url, schema)
@@ -30,16 +37,27 @@ def run_etl_pipeline(pg_conn: _connection, es_url: str, schema: str, state: str)
 
     loader.check_es_schema_exist()
 
+    records_count = 0
     for batch_records in all_records:
         transformed_batch_records = transformer.transform_batch_records(
             batch_records)
         loader.save_data(transformed_batch_records)
+        cache_invalidator.invalidate(
+            [str(record['id']) for record in batch_records])
+        records_count += len(batch_records)
 
     logger.info(f'All data {schema} is up to date')
+    return records_count
 
 
-def run_etl(pg_conn: _connection, es_url: str) -> None:
-    """Основная функция переноса данных из Postgres в Elasticsearch."""
+def run_etl(pg_conn: _connection, es_url: str, redis_client: Redis, channel: str) -> None:
+    """
+    Основная функция переноса данных из Postgres в Elasticsearch.
+    redis_client и channel - кеш API и канал сообщений об измененных документах.
+    """
+    cache_invalidators = {
+        schema: CacheInvalidator(redis_client, schema, channel) for schema in ('genres', 'persons')
+    }
 
     # получить состояние (дату последнего обновления)
     state_value = state.get_state(key='last_update')
@@ -51,11 +69,19 @@ def run_etl(pg_conn: _connection, es_url: str) -> None:
     new_state_value = datetime.now().isoformat(sep=' ', timespec='microseconds')
 
     try:
-        run_etl_pipeline(pg_conn, es_url, schema='genres', state=state_value)
-        run_etl_pipeline(pg_conn, es_url, schema='persons', state=state_value)
+        records_count = {
+            schema: run_etl_pipeline(
+                pg_conn, es_url, schema=schema, state=state_value, cache_invalidator=cache_invalidator)
+            for schema, cache_invalidator in cache_invalidators.items()
+        }
 
         # Установить новое состояние
         state.set_state(key='last_update', value=new_state_value)
+
+        # Сбросить закешированные в API списки по измененным индексам
+        for schema, count in records_count.items():
+            if count:
+                cache_invalidators[schema].bump_generation()
         logger.info(
             f'Synchronize is completed on {state.get_state("last_update")}')
     except Exception as e:
@@ -71,6 +97,9 @@ if __name__ == '__main__':
 
     es_url = f'http://{settings.ES_HOST}:{settings.ES_PORT}'
 
+    # Кеш API, из которого удаляются записи по обновленным документам
+    redis_client = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
     # Настройка работы с состоянием
     state_storage_file_path = os.path.join(os.path.dirname(
         __file__), 'state_storage/state_storage.json')
@@ -96,7 +125,7 @@ if __name__ == '__main__':
         try:
             check_connection_to_elasticsearch(es_url)
             pg_conn = make_connection_to_postgres(pg_dsn)
-            run_etl(pg_conn, es_url)
+            run_etl(pg_conn, es_url, redis_client, settings.CACHE_INVALIDATION_CHANNEL)
             pg_conn.close()
         except ConnectionError:
             logger.error(
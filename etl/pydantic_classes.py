@@ -1,5 +1,6 @@
 import os
 import uuid
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel, Field
@@ -16,6 +17,10 @@ class Settings(BaseSettings):
     ES_HOST: Optional[str] = '127.0.0.1'
     ES_PORT: str
 
+    REDIS_HOST: Optional[str] = '127.0.0.1'
+    REDIS_PORT: int = 6379
+    CACHE_INVALIDATION_CHANNEL: str = 'cache:invalidate'
+
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(__file__), 'etl.env'), env_file_encoding='utf-8')
 
@@ -24,6 +29,8 @@ class Genre(BaseModel):
     id: uuid.UUID
     name: str
     description: str | None
+    # Время изменения в Postgres, по нему API отдает изменения (параметр since в /export)
+    modified: datetime | None = None
 
 
 class PersonFilm(BaseModel):
@@ -35,3 +42,4 @@ class Person(BaseModel):
     id: uuid.UUID
     full_name: str
     films: list[PersonFilm]
+    modified: datetime | None = None
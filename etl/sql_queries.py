@@ -1,5 +1,5 @@
 sql_genres = """
-    SELECT DISTINCT g.id, g.name, g.description
+    SELECT DISTINCT g.id, g.name, g.description, g.modified
     FROM content.genre AS g
     RIGHT JOIN content.genre_film_work AS gfw ON gfw.genre_id = g.id
     WHERE g.modified > '{}';
@@ -15,9 +15,10 @@ sql_persons = """
         )
     SELECT  p.id,
             p.full_name,
+            p.modified,
             json_agg(json_build_object('film_work_id',tmp.film_work_id,'roles',tmp.roles)) as films
     FROM tmp
     LEFT JOIN content.person AS p ON p.id = tmp.person_id
     WHERE p.modified > '{}'
-    GROUP BY p.id, p.full_name;
+    GROUP BY p.id, p.full_name, p.modified;
 """
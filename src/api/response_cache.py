@@ -0,0 +1,257 @@
+import gzip
+import hashlib
+import json
+import struct
+import time
+from typing import Awaitable, Callable
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from db.redis import ICache
+from services.base import GENERATION_CACHE_EXPIRE_IN_SECONDS
+from services.cache_keys import generation_key, response_key
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Длина блока заголовков перед телами ответа в записи кеша
+RESPONSE_HEADER = struct.Struct('!I')
+# Заголовки ответа приложения, которые не сохраняются: их выставляет ResponseCacheMiddleware
+SKIPPED_HEADERS = {b'content-length', b'content-encoding', b'etag', b'cache-control', b'vary'}
+IDENTITY = 'identity'
+# Сжатые представления в порядке предпочтения
+ENCODINGS = ('br', 'gzip')
+
+
+def make_etag(body: bytes) -> bytes:
+    """Сильный ETag - хеш закодированного тела ответа."""
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode('ascii') + b'"'
+
+
+def encoded_etag(etag: bytes, encoding: str) -> bytes:
+    """У сжатых представлений свой сильный ETag: байты ответа отличаются."""
+    if encoding == IDENTITY:
+        return etag
+    return etag[:-1] + b'-' + encoding.encode('ascii') + b'"'
+
+
+def pack_response(headers: list[tuple[bytes, bytes]], bodies: dict[str, bytes]) -> bytes:
+    data = json.dumps({
+        'headers': [[name.decode('latin-1'), value.decode('latin-1')] for name, value in headers],
+        'bodies': [[encoding, len(body)] for encoding, body in bodies.items()],
+    }).encode('latin-1')
+    return RESPONSE_HEADER.pack(len(data)) + data + b''.join(bodies.values())
+
+
+def unpack_response(entry: bytes) -> tuple[list[tuple[bytes, bytes]], dict[str, bytes]]:
+    (size,) = RESPONSE_HEADER.unpack_from(entry)
+    start = RESPONSE_HEADER.size
+    data = json.loads(entry[start:start + size])
+    headers = [
+        (name.encode('latin-1'), value.encode('latin-1')) for name, value in data['headers']
+    ]
+    bodies, offset = {}, start + size
+    for encoding, length in data['bodies']:
+        bodies[encoding] = entry[offset:offset + length]
+        offset += length
+    return headers, bodies
+
+
+def etag_matches(if_none_match: str | None, etag: bytes) -> bool:
+    """Для If-None-Match используется слабое сравнение: префикс W/ не учитывается."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or etag.decode('ascii') in tags
+
+
+def accepted_encodings(accept_encoding: str | None) -> set[str]:
+    """Кодировки из Accept-Encoding, кроме явно запрещенных через q=0."""
+    encodings = set()
+    for item in (accept_encoding or '').split(','):
+        encoding, _, params = item.strip().partition(';')
+        q = params.strip().removeprefix('q=')
+        try:
+            if params and float(q) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(encoding.strip().lower())
+    return encodings
+
+
+class ResponseCacheMiddleware:
+    """
+    Класс ResponseCacheMiddleware кеширует готовые ответы GET-запросов к путям
+    с префиксами из indexes: закодированное тело, заголовки и ETag хранятся по
+    ключу из пути, отсортированных параметров запроса и поколений индексов,
+    из которых собран ответ. Попадание в кеш отдается без обращения к сервисам
+    и моделям, на совпавший If-None-Match возвращается 304 без тела.
+
+    Ответы сбрасываются вместе с остальным кешем: после увеличения поколения
+    индекса в ETL (не позднее чем через GENERATION_CACHE_EXPIRE_IN_SECONDS)
+    и по сообщениям об измененных документах (см. services/invalidation.py).
+    Клиенты и nginx могут отдавать полученный ответ еще max_age секунд
+    (Cache-Control), это предельная задержка обновления данных для них.
+
+    Тела от compress_min_size байт сжимаются один раз при записи: gzip и, если
+    установлен пакет brotli, br. Клиенту отдается сжатое тело с Content-Encoding,
+    если он его принимает, поэтому nginx не сжимает ответ повторно.
+
+    Кешируются только ответы 200, переданные одним блоком: ответы с ошибками,
+    потоковые ответы и ответы с Cache-Control: no-store передаются клиенту
+    без изменений. Запросы с параметрами из uncached_params (например, cursor
+    с идентификатором point-in-time) передаются приложению без обращения к кешу.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        get_cache: Callable[[], Awaitable[ICache]],
+        indexes: dict[str, tuple[str, ...]],
+        expired_time: int,
+        max_age: int,
+        compress_min_size: int = 1024,
+        gzip_level: int = 9,
+        brotli_quality: int = 9,
+        uncached_params: tuple[str, ...] = ()
+    ) -> None:
+        self.app = app
+        self.get_cache = get_cache
+        self.indexes = indexes
+        self.expired_time = expired_time
+        self.cache_control = f'public, max-age={max_age}'.encode('latin-1')
+        self.compress_min_size = compress_min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.uncached_params = set(uncached_params)
+        self._generations: dict[str, tuple[float, int]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        indexes = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            indexes = next(
+                (
+                    indexes for prefix, indexes in self.indexes.items()
+                    if scope['path'].startswith(prefix)
+                ),
+                None
+            )
+        if indexes is None or self.is_uncached(scope['query_string']):
+            await self.app(scope, receive, send)
+            return
+
+        cache = await self.get_cache()
+        generations = tuple([await self.get_generation(cache, index) for index in indexes])
+        key = str(response_key(scope['path'], scope['query_string'], generations))
+        request_headers = Headers(scope=scope)
+        entry = await cache.get(key)
+        if entry:
+            headers, bodies = unpack_response(entry)
+            await self._send(send, headers, bodies, request_headers)
+            return
+
+        start: Message | None = None
+        chunks: list[bytes] = []
+        passthrough = False
+
+        async def capture(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+            elif message['type'] == 'http.response.start':
+                start = message
+                cache_control = Headers(raw=start.get('headers', [])).get('cache-control', '')
+                if start['status'] != 200 or 'no-store' in cache_control:
+                    passthrough = True
+                    await send(message)
+            elif message['type'] == 'http.response.body':
+                if message.get('more_body') and not chunks:
+                    # Потоковый ответ не буферизуется
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    headers = [
+                        (name, value) for name, value in start.get('headers', [])
+                        if name.lower() not in SKIPPED_HEADERS
+                    ]
+                    bodies = self._encode(b''.join(chunks))
+                    headers.append((b'etag', make_etag(bodies[IDENTITY])))
+                    # Тела уже сжаты gzip и br, повторное сжатие в RedisCache не уменьшает запись
+                    await cache.set(
+                        key, pack_response(headers, bodies), self.expired_time, compress=False
+                    )
+                    await self._send(send, headers, bodies, request_headers)
+
+        await self.app(scope, receive, capture)
+
+    def is_uncached(self, query_string: bytes) -> bool:
+        return any(
+            name in self.uncached_params
+            for name, _ in parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)
+        )
+
+    async def get_generation(self, cache: ICache, index: str) -> int:
+        """Поколение индекса, запоминается на GENERATION_CACHE_EXPIRE_IN_SECONDS, как в обработчиках кеша."""
+        now = time.monotonic()
+        cached = self._generations.get(index)
+        if cached and cached[0] > now:
+            return cached[1]
+        generation = await cache.get_counter(str(generation_key(index)))
+        self._generations[index] = (now + GENERATION_CACHE_EXPIRE_IN_SECONDS, generation)
+        return generation
+
+    def _encode(self, body: bytes) -> dict[str, bytes]:
+        bodies = {IDENTITY: body}
+        if len(body) < self.compress_min_size:
+            return bodies
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body, quality=self.brotli_quality)
+        bodies['gzip'] = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        return bodies
+
+    async def _send(
+        self,
+        send: Send,
+        headers: list[tuple[bytes, bytes]],
+        bodies: dict[str, bytes],
+        request_headers: Headers
+    ) -> None:
+        """Отправляет ответ из кеша, headers содержат сохраненный вместе с телом ETag."""
+        accepted = accepted_encodings(request_headers.get('accept-encoding'))
+        encoding = next(
+            (
+                encoding for encoding in ENCODINGS
+                if encoding in bodies and (encoding in accepted or '*' in accepted)
+            ),
+            IDENTITY
+        )
+        body = bodies[encoding]
+        etag = encoded_etag(next(value for name, value in headers if name == b'etag'), encoding)
+
+        response_headers = [(b'etag', etag), (b'cache-control', self.cache_control)]
+        if len(bodies) > 1:
+            response_headers.append((b'vary', b'Accept-Encoding'))
+        if etag_matches(request_headers.get('if-none-match'), etag):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        if encoding != IDENTITY:
+            response_headers.append((b'content-encoding', encoding.encode('ascii')))
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (name, value) for name, value in headers if name != b'etag'
+            ] + response_headers + [(b'content-length', str(len(body)).encode('latin-1'))],
+        })
+        await send({'type': 'http.response.body', 'body': body})
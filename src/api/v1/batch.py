@@ -0,0 +1,23 @@
+from http import HTTPStatus
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from core.config import settings
+
+
+IDS_DESCRIPTION = (
+    f'Идентификаторы (не больше {settings.batch_max_ids}), повторы игнорируются. '
+    'Результаты возвращаются в порядке идентификаторов'
+)
+
+
+def unique_ids(ids: list[UUID]) -> list[UUID]:
+    """Идентификаторы без повторов в исходном порядке."""
+    ids = list(dict.fromkeys(ids))
+    if not ids or len(ids) > settings.batch_max_ids:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail=f'ids must contain from 1 to {settings.batch_max_ids} identifiers'
+        )
+    return ids
@@ -0,0 +1,39 @@
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+EXPORT_DESCRIPTION = (
+    'Потоковая выгрузка всех документов индекса в формате NDJSON (документ на строку). '
+    'Индекс обходится страницами в закрепленном point-in-time, поэтому стоимость '
+    'выгрузки не зависит от размера индекса, как при переборе page_number'
+)
+SINCE_DESCRIPTION = (
+    'Только документы, измененные начиная с этого момента (ISO 8601), '
+    'для инкрементальной выгрузки'
+)
+
+
+async def ndjson_response(pages: AsyncIterator[list[BaseModel]]) -> StreamingResponse:
+    """
+    Первая страница запрашивается до начала ответа, чтобы ошибка хранилища
+    вернулась клиенту статусом ответа, а не оборванным потоком. Далее в памяти
+    находится одна страница. Ответ не кешируется ни API, ни nginx.
+    """
+    first_page = await anext(pages, [])
+
+    async def lines() -> AsyncIterator[bytes]:
+        page = first_page
+        while True:
+            if page:
+                yield ''.join(doc.model_dump_json(by_alias=True) + '\n' for doc in page).encode('utf-8')
+            page = await anext(pages, None)
+            if page is None:
+                return
+
+    return StreamingResponse(
+        lines(), media_type=NDJSON_MEDIA_TYPE, headers={'Cache-Control': 'no-store'}
+    )
@@ -0,0 +1,52 @@
+from http import HTTPStatus
+from typing import Any
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+FIELDS_DESCRIPTION = (
+    'Поля ответа через запятую, например title,genres. '
+    'Идентификатор возвращается всегда, без параметра - все поля'
+)
+
+
+def parse_fields(value: str | None, model: type[BaseModel]) -> tuple[str, ...] | None:
+    """
+    Проверяет поля параметра fields по модели ответа. Поля можно указывать по
+    имени в ответе (uuid) или в документе (id). Возвращает имена полей документа
+    в порядке модели, None - если параметр не передан.
+    """
+    if value is None:
+        return None
+    aliases = {
+        info.serialization_alias: name
+        for name, info in model.model_fields.items() if info.serialization_alias
+    }
+    names = {aliases.get(name, name) for name in map(str.strip, value.split(',')) if name}
+    unknown = names - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail=f'unknown fields: {", ".join(sorted(unknown))}'
+        )
+    return tuple(name for name in model.model_fields if name in names or name == 'id')
+
+
+def fields_response(
+    value: Any, fields: tuple[str, ...] | None, response: Response | None = None
+) -> Any:
+    """
+    Без проекции значение возвращается как есть и проверяется моделью ответа
+    эндпоинта. В проекции нет обязательных полей этой модели, поэтому она
+    сериализуется сама, с именами полей ответа (uuid). Заголовки, заданные
+    эндпоинтом в response (например, X-Next-Cursor), переносятся в ответ.
+    """
+    if fields is None:
+        return value
+    result = JSONResponse(jsonable_encoder(value))
+    if response is not None:
+        result.raw_headers.extend(response.raw_headers)
+    return result
@@ -1,17 +1,31 @@
 from uuid import UUID
+from datetime import datetime
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response
+from fastapi.responses import StreamingResponse
 
+from api.v1.batch import IDS_DESCRIPTION, unique_ids
+from api.v1.export import EXPORT_DESCRIPTION, SINCE_DESCRIPTION, ndjson_response
+from api.v1.fields import FIELDS_DESCRIPTION, fields_response, parse_fields
+from api.v1.pagination import CURSOR_DESCRIPTION, parse_cursor, set_next_cursor
 from services.film import FilmService, get_film_service
-from models.film import Film, FilmShort
+from models.base import BatchRequest
+from models.film import Film, FilmShort, FilmsBatch
 
 
 router = APIRouter()
 
 DETAIL = 'films not found'
 
+BATCH_SUMMARY = 'Информация по нескольким кинопроизведениям'
+BATCH_DESCRIPTION = (
+    'Получение информации о кинопроизведениях по списку идентификаторов: '
+    'кеш читается одним запросом, недостающие записи загружаются из хранилища одним запросом'
+)
+BATCH_RESPONSE_DESCRIPTION = 'Кинопроизведения в порядке идентификаторов и идентификаторы ненайденных'
+
 
 @router.get(
     '/search',
@@ -21,22 +35,80 @@ DETAIL = 'films not found'
     response_description='Список кинопроизведений с названием и рейтингом',
 )
 async def search_film(
+    response: Response,
     query: Annotated[str, Query(description='Текст запроса для поиска')],
     page_size: Annotated[int, Query(description='Размер страницы', ge=1)] = 50,
     page_number: Annotated[int, Query(description='Номер страницы', ge=1)] = 1,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     film_service: FilmService = Depends(get_film_service)
 ) -> list[FilmShort]:
-    films = await film_service.get_films_by_query(
-        query, page_size, page_number
-    )
+    projection = parse_fields(fields, FilmShort)
+    if cursor is not None:
+        films, next_cursor = await film_service.get_films_by_query_after(
+            query, page_size, parse_cursor(cursor), projection
+        )
+        set_next_cursor(response, next_cursor)
+    else:
+        films = await film_service.get_films_by_query(
+            query, page_size, page_number, projection
+        )
 
     if not films:
         return []
 
-    return [
-        FilmShort(id=film.id, title=film.title, imdb_rating=film.imdb_rating)
-        for film in films
-    ]
+    return fields_response(films, projection, response)
+
+
+@router.get(
+    '/batch',
+    response_model=FilmsBatch,
+    summary=BATCH_SUMMARY,
+    description=BATCH_DESCRIPTION,
+    response_description=BATCH_RESPONSE_DESCRIPTION,
+)
+async def films_batch(
+    ids: Annotated[list[UUID], Query(description=IDS_DESCRIPTION)] = [],
+    film_service: FilmService = Depends(get_film_service)
+) -> FilmsBatch:
+    return await get_films_batch(unique_ids(ids), film_service)
+
+
+@router.post(
+    '/batch',
+    response_model=FilmsBatch,
+    summary=BATCH_SUMMARY,
+    description=BATCH_DESCRIPTION + '. Для длинных списков идентификаторов',
+    response_description=BATCH_RESPONSE_DESCRIPTION,
+)
+async def films_batch_by_body(
+    request: BatchRequest,
+    film_service: FilmService = Depends(get_film_service)
+) -> FilmsBatch:
+    return await get_films_batch(unique_ids(request.ids), film_service)
+
+
+async def get_films_batch(ids: list[UUID], film_service: FilmService) -> FilmsBatch:
+    films = await film_service.get_films_by_ids(ids)
+    return FilmsBatch(
+        films=[film for film in films if film is not None],
+        not_found=[film_id for film_id, film in zip(ids, films) if film is None]
+    )
+
+
+@router.get(
+    '/export',
+    response_class=StreamingResponse,
+    summary='Выгрузка кинопроизведений',
+    description=EXPORT_DESCRIPTION,
+    response_description='Кинопроизведений в формате NDJSON, документ на строку',
+)
+async def export_films(
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+    since: Annotated[datetime | None, Query(description=SINCE_DESCRIPTION)] = None,
+    film_service: FilmService = Depends(get_film_service)
+) -> StreamingResponse:
+    return await ndjson_response(film_service.export_films(parse_fields(fields, Film), since))
 
 
 @router.get(
@@ -48,15 +120,17 @@ async def search_film(
 )
 async def film_details(
     film_id: Annotated[UUID, Path(description='Идентификатор кинопроизведения')],
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     film_service: FilmService = Depends(get_film_service)
 ) -> Film:
-    film = await film_service.get_film_by_id(film_id)
+    projection = parse_fields(fields, Film)
+    film = await film_service.get_film_by_id(film_id, projection)
 
     if not film:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=DETAIL,
         )
-    return film
+    return fields_response(film, projection)
 
 
 @router.get(
@@ -67,26 +141,32 @@ async def film_details(
     response_description='Список кинопроизведений с названием и рейтингом',
 )
 async def films(
+    response: Response,
     genre_id: Annotated[UUID | None, Query(description='Идентификатор жанра')] = None,
     sort: Annotated[str, Query(description='Параметр сортировки')] = '-imdb_rating',
     page_size: Annotated[int, Query(description='Размер страницы', ge=1)] = 50,
     page_number: Annotated[int, Query(description='Номер страницы', ge=1)] = 1,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     film_service: FilmService = Depends(get_film_service)
 ) -> list[FilmShort]:
-    if genre_id:
+    projection = parse_fields(fields, FilmShort)
+    if cursor is not None:
+        films, next_cursor = await film_service.get_films_with_sort_after(
+            sort, genre_id, page_size, parse_cursor(cursor), projection
+        )
+        set_next_cursor(response, next_cursor)
+    elif genre_id:
         films = await film_service.get_films_by_genre_id_with_sort(
-            genre_id, sort, page_size, page_number
+            genre_id, sort, page_size, page_number, projection
         )
     else:
         films = await film_service.get_films_with_sort(
-            sort, page_size, page_number
+            sort, page_size, page_number, projection
         )
 
     if not films:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=DETAIL,
         )
-    return [
-        FilmShort(id=film.id, title=film.title, imdb_rating=film.imdb_rating)
-        for film in films
-    ]
+    return fields_response(films, projection, response)
@@ -1,9 +1,13 @@
 from uuid import UUID
+from datetime import datetime
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import StreamingResponse
 
+from api.v1.export import EXPORT_DESCRIPTION, SINCE_DESCRIPTION, ndjson_response
+from api.v1.fields import FIELDS_DESCRIPTION, fields_response, parse_fields
 from services.genre import GenreService, get_genre_service
 from models.genre import Genres
 
@@ -14,6 +18,21 @@ router = APIRouter()
 DETAIL = 'genres not found'
 
 
+@router.get(
+    '/export',
+    response_class=StreamingResponse,
+    summary='Выгрузка жанров',
+    description=EXPORT_DESCRIPTION,
+    response_description='Жанров в формате NDJSON, документ на строку',
+)
+async def export_genres(
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+    since: Annotated[datetime | None, Query(description=SINCE_DESCRIPTION)] = None,
+    genre_service: GenreService = Depends(get_genre_service)
+) -> StreamingResponse:
+    return await ndjson_response(genre_service.export_genres(parse_fields(fields, Genres), since))
+
+
 @router.get(
     '/{genre_id}',
     response_model=Genres,
@@ -23,16 +42,18 @@ DETAIL = 'genres not found'
 )
 async def genre_details(
     genre_id: Annotated[UUID, Path(description='Идентификатор жанра')],
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     genre_service: GenreService = Depends(get_genre_service)
 ) -> Genres:
-    genre = await genre_service.get_genre_by_id(genre_id)
+    projection = parse_fields(fields, Genres)
+    genre = await genre_service.get_genre_by_id(genre_id, projection)
 
     if not genre:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=DETAIL,
         )
 
-    return genre
+    return fields_response(genre, projection)
 
 
 @router.get(
@@ -43,12 +64,14 @@ async def genre_details(
     response_description='Список жанров'
 )
 async def genres(
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     genre_service: GenreService = Depends(get_genre_service)
 ) -> list[Genres]:
-    genres = await genre_service.get_genres()
+    projection = parse_fields(fields, Genres)
+    genres = await genre_service.get_genres(projection)
 
     if not genres:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=DETAIL,
         )
-    return genres
+    return fields_response(genres, projection)
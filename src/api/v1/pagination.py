@@ -0,0 +1,33 @@
+from http import HTTPStatus
+
+from fastapi import HTTPException, Response
+
+from services.pagination import Cursor, InvalidCursorError, decode_cursor, encode_cursor
+
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+CURSOR_DESCRIPTION = (
+    'Курсор следующей страницы из заголовка X-Next-Cursor, пустое значение - первая страница. '
+    'Если передан, page_number не используется'
+)
+
+
+def parse_cursor(value: str) -> Cursor:
+    try:
+        return decode_cursor(value)
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+
+
+def set_next_cursor(response: Response, cursor: Cursor | None) -> None:
+    """
+    Передает курсор следующей страницы в заголовке. Страницы по курсору не кешируются
+    ни API, ни nginx: курсор ссылается на point-in-time, который может быть уже закрыт.
+    """
+    response.headers['Cache-Control'] = 'no-store'
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(cursor)
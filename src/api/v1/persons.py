@@ -1,13 +1,20 @@
 from uuid import UUID
+from datetime import datetime
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response
+from fastapi.responses import StreamingResponse
 
+from api.v1.batch import IDS_DESCRIPTION, unique_ids
+from api.v1.export import EXPORT_DESCRIPTION, SINCE_DESCRIPTION, ndjson_response
+from api.v1.fields import FIELDS_DESCRIPTION, fields_response, parse_fields
+from api.v1.pagination import CURSOR_DESCRIPTION, parse_cursor, set_next_cursor
 from services.person import PersonService, get_person_service
 from services.film import FilmService, get_film_service
 from models.film import FilmShort
-from models.person import Person
+from models.base import BatchRequest
+from models.person import Person, PersonsBatch
 
 
 router = APIRouter()
@@ -15,6 +22,13 @@ router = APIRouter()
 
 DETAIL = 'persons not found'
 
+BATCH_SUMMARY = 'Информация по нескольким персонам'
+BATCH_DESCRIPTION = (
+    'Получение информации о персонах по списку идентификаторов: '
+    'кеш читается одним запросом, недостающие записи загружаются из хранилища одним запросом'
+)
+BATCH_RESPONSE_DESCRIPTION = 'Персоны в порядке идентификаторов и идентификаторы ненайденных'
+
 
 @router.get(
     '/search',
@@ -24,16 +38,28 @@ DETAIL = 'persons not found'
     response_description='Список персон со списком фильмов и ролей, исполненных в них'
 )
 async def search_persons(
+    response: Response,
     query: Annotated[str, Query(description='Текст запроса для поиска')],
     page_size: Annotated[int, Query(description='Размер страницы', ge=1)] = 50,
     page_number: Annotated[int, Query(description='Номер страницы', ge=1)] = 1,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     person_service: PersonService = Depends(get_person_service)
 ) -> list[Person]:
-    persons = await person_service.get_persons_by_query(
-        query, page_size, page_number
-    )
+    projection = parse_fields(fields, Person)
+    if cursor is not None:
+        persons, next_cursor = await person_service.get_persons_by_query_after(
+            query, page_size, parse_cursor(cursor), projection
+        )
+        set_next_cursor(response, next_cursor)
+    else:
+        persons = await person_service.get_persons_by_query(
+            query, page_size, page_number, projection
+        )
     if not persons:
         return []
+    if projection is not None:
+        return fields_response(persons, projection, response)
 
     return [
         Person.model_validate_json(person.model_dump_json())
@@ -41,6 +67,57 @@ async def search_persons(
     ]
 
 
+@router.get(
+    '/batch',
+    response_model=PersonsBatch,
+    summary=BATCH_SUMMARY,
+    description=BATCH_DESCRIPTION,
+    response_description=BATCH_RESPONSE_DESCRIPTION,
+)
+async def persons_batch(
+    ids: Annotated[list[UUID], Query(description=IDS_DESCRIPTION)] = [],
+    person_service: PersonService = Depends(get_person_service)
+) -> PersonsBatch:
+    return await get_persons_batch(unique_ids(ids), person_service)
+
+
+@router.post(
+    '/batch',
+    response_model=PersonsBatch,
+    summary=BATCH_SUMMARY,
+    description=BATCH_DESCRIPTION + '. Для длинных списков идентификаторов',
+    response_description=BATCH_RESPONSE_DESCRIPTION,
+)
+async def persons_batch_by_body(
+    request: BatchRequest,
+    person_service: PersonService = Depends(get_person_service)
+) -> PersonsBatch:
+    return await get_persons_batch(unique_ids(request.ids), person_service)
+
+
+async def get_persons_batch(ids: list[UUID], person_service: PersonService) -> PersonsBatch:
+    persons = await person_service.get_persons_by_ids(ids)
+    return PersonsBatch(
+        persons=[person for person in persons if person is not None],
+        not_found=[person_id for person_id, person in zip(ids, persons) if person is None]
+    )
+
+
+@router.get(
+    '/export',
+    response_class=StreamingResponse,
+    summary='Выгрузка персон',
+    description=EXPORT_DESCRIPTION,
+    response_description='Персон в формате NDJSON, документ на строку',
+)
+async def export_persons(
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+    since: Annotated[datetime | None, Query(description=SINCE_DESCRIPTION)] = None,
+    person_service: PersonService = Depends(get_person_service)
+) -> StreamingResponse:
+    return await ndjson_response(person_service.export_persons(parse_fields(fields, Person), since))
+
+
 @router.get(
     '/{person_id}',
     response_model=Person,
@@ -50,14 +127,18 @@ async def search_persons(
 )
 async def person_details(
     person_id: Annotated[UUID, Path(description='Идентификатор пользователя')],
+    fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
     person_service: PersonService = Depends(get_person_service)
 ) -> Person:
-    person = await person_service.get_person_by_id(person_id)
+    projection = parse_fields(fields, Person)
+    person = await person_service.get_person_by_id(person_id, projection)
 
     if not person:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=DETAIL,
         )
+    if projection is not None:
+        return fields_response(person, projection)
 
     return Person.model_validate_json(person.model_dump_json())
 
@@ -87,7 +168,4 @@ async def person_films(
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=DETAIL,
         )
-    return [
-        FilmShort(id=film.id, title=film.title, imdb_rating=film.imdb_rating)
-        for film in person_films
-    ]
+    return person_films
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends
+
+from db.cache import get_cache
+from db.redis import ICache
+from db.storage import get_elastic
+from db.elastic import IStorage
+
+
+router = APIRouter()
+
+
+@router.get(
+    '/',
+    summary='Статистика соединений',
+    description='Использование пулов соединений с Redis и Elasticsearch текущим воркером',
+    response_description='Статистика пулов соединений и кеша',
+)
+async def stats(
+    cache: ICache = Depends(get_cache),
+    elastic: IStorage = Depends(get_elastic)
+) -> dict:
+    return {
+        'redis': cache.stats(),
+        'elastic': elastic.stats(),
+    }
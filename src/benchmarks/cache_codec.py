@@ -0,0 +1,66 @@
+"""
+Микро-бенчмарк форматов хранения значений в кеше.
+
+Сравнивает прежний формат (JSON-массив JSON-строк с повторной валидацией
+каждого элемента) с кодеками из services.codecs по объему хранимых байт
+и времени декодирования на фильмах из init_es/es_bulk_dump.json.
+
+Запуск из каталога src:
+    python -m benchmarks.cache_codec --page-size 50
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+
+from models.film import Film
+from services.codecs import CODECS, msgpack
+
+
+DUMP_PATH = Path(__file__).resolve().parents[2] / 'init_es' / 'es_bulk_dump.json'
+
+
+def load_films(limit: int) -> list[Film]:
+    with open(DUMP_PATH) as f:
+        lines = json.load(f).splitlines()
+    # В дампе чередуются строки действия bulk и документы
+    return [Film(**json.loads(line)) for line in lines[1::2][:limit]]
+
+
+def legacy_encode(films: list[Film]) -> bytes:
+    return json.dumps([film.model_dump_json() for film in films]).encode('utf-8')
+
+
+def legacy_decode(data: bytes) -> list[Film]:
+    return [Film.model_validate_json(obj) for obj in json.loads(data)]
+
+
+def measure(name: str, encode, decode, films: list[Film], number: int) -> None:
+    data = encode(films)
+    assert decode(data) == films
+    encode_time = timeit.timeit(lambda: encode(films), number=number) / number
+    decode_time = timeit.timeit(lambda: decode(data), number=number) / number
+    print(f'{name:<10}{len(data):>10}{encode_time * 1e6:>14.1f}{decode_time * 1e6:>14.1f}')
+
+
+def main(page_size: int, number: int) -> None:
+    films = load_films(page_size)
+    print(f'{len(films)} films per entry, {number} iterations')
+    print(f'{"format":<10}{"bytes":>10}{"encode, us":>14}{"decode, us":>14}')
+    measure('legacy', legacy_encode, legacy_decode, films, number)
+    for name, codec_class in CODECS.items():
+        if name == 'msgpack' and msgpack is None:
+            print(f'{name:<10} skipped: msgpack is not installed')
+            continue
+        codec = codec_class(Film)
+        measure(
+            name, codec.encode, lambda data: codec.decode(data, many=True), films, number
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+    main(args.page_size, args.number)
@@ -0,0 +1,83 @@
+"""
+Бенчмарк сжатия значений кеша.
+
+Для каждого класса записей (фильм, страница фильмов, страница поиска персон,
+список жанров) печатает размер значения, степень сжатия и затраты CPU на
+сжатие и распаковку при текущих настройках RedisCache.
+
+Запуск из каталога src:
+    python -m benchmarks.cache_compression --min-size 1024 --level 6
+"""
+import argparse
+import json
+import timeit
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from db.redis import compress_value, decompress_value, lz4
+from models.film import Film
+from models.genre import Genres
+from models.person import Person, PersonRoles
+from services.codecs import JsonCodec
+
+
+DUMP_PATH = Path(__file__).resolve().parents[2] / 'init_es' / 'es_bulk_dump.json'
+
+
+def load_entries() -> dict[str, bytes]:
+    with open(DUMP_PATH) as f:
+        docs = [json.loads(line) for line in json.load(f).splitlines()[1::2]]
+    films = [Film(**doc) for doc in docs if doc['imdb_rating'] is not None]
+
+    roles = defaultdict(lambda: defaultdict(list))
+    names = {}
+    genres = {}
+    for doc in docs:
+        for role in ('actors', 'writers', 'directors'):
+            for person in doc[role] or []:
+                names[person['id']] = person['name']
+                roles[person['id']][doc['id']].append(role[:-1])
+        for genre in doc['genres'] or []:
+            genres[genre['id']] = Genres(**genre)
+    persons = [
+        Person(
+            id=uuid.UUID(person_id),
+            full_name=names[person_id],
+            films=[PersonRoles(id=film_id, roles=film_roles) for film_id, film_roles in films_roles.items()]
+        )
+        for person_id, films_roles in roles.items()
+    ]
+    persons.sort(key=lambda person: len(person.films), reverse=True)
+
+    return {
+        'film': JsonCodec(Film).encode(films[0]),
+        'films page': JsonCodec(Film).encode(films[:50]),
+        'persons page': JsonCodec(Person).encode(persons[:50]),
+        'genres': JsonCodec(Genres).encode(list(genres.values())),
+    }
+
+
+def main(min_size: int, level: int, number: int) -> None:
+    print(f'algorithm: {"lz4" if lz4 is not None else "zlib"}, min size: {min_size}, level: {level}')
+    print(f'{"entry":<14}{"bytes":>9}{"stored":>9}{"ratio":>8}{"compress, us":>15}{"decompress, us":>17}')
+    for name, value in load_entries().items():
+        stored = compress_value(value, min_size, level)
+        assert decompress_value(stored) == value
+        compress_time = timeit.timeit(
+            lambda: compress_value(value, min_size, level), number=number
+        ) / number
+        decompress_time = timeit.timeit(lambda: decompress_value(stored), number=number) / number
+        print(
+            f'{name:<14}{len(value):>9}{len(stored):>9}{len(value) / len(stored):>8.2f}'
+            f'{compress_time * 1e6:>15.1f}{decompress_time * 1e6:>17.1f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--min-size', type=int, default=1024)
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+    main(args.min_size, args.level, args.number)
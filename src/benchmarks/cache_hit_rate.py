@@ -0,0 +1,172 @@
+"""
+Бенчмарк доли попаданий в кеш по эндпоинтам.
+
+Прогоняет сервисы фильмов, персон и жанров на синтетической нагрузке
+с распределением Ципфа поверх in-memory кеша и фиктивного хранилища
+и печатает статистику обработчиков кеша по пространствам имен ключей.
+
+Запуск из каталога src:
+    python -m benchmarks.cache_hit_rate --requests 20000
+"""
+import argparse
+import asyncio
+import random
+import uuid
+
+from db.memory import InMemoryCache
+from models.film import Film
+from models.genre import Genres
+from models.person import Person, PersonRoles
+from services.film import CacheFilmHandler, FilmService, StorageFilmHandler
+from services.genre import CacheGenreHandler, GenreService, StorageGenreHandler
+from services.person import CachePersonHandler, PersonService, StoragePersonHandler
+
+
+class FakeCatalog:
+    def __init__(self, films_count: int, persons_count: int, genres_count: int) -> None:
+        self.genres = [
+            Genres(id=uuid.uuid4(), name=f'genre {i}') for i in range(genres_count)
+        ]
+        self.films = [
+            Film(
+                id=uuid.uuid4(),
+                title=f'film {i}',
+                imdb_rating=round(random.uniform(0, 10), 1),
+                description='description',
+                genres=random.sample(self.genres, 2),
+            )
+            for i in range(films_count)
+        ]
+        self.persons = [
+            Person(
+                id=uuid.uuid4(),
+                full_name=f'person {i}',
+                films=[
+                    PersonRoles(id=film.id, roles=['actor'])
+                    for film in random.sample(self.films, random.randint(1, 30))
+                ]
+            )
+            for i in range(persons_count)
+        ]
+
+
+class FakeFilmHandler(StorageFilmHandler):
+    def __init__(self, catalog: FakeCatalog) -> None:
+        super().__init__(None)
+        self.catalog = catalog
+        self.by_id = {film.id: film for film in catalog.films}
+
+    async def get_film_by_id(self, film_id, fields=None):
+        return self.by_id.get(film_id)
+
+    async def get_films_by_query(self, query, page_size, page_number, fields=None):
+        return self.catalog.films[:page_size]
+
+    async def get_films_with_sort(self, sort, page_size, page_number, fields=None):
+        offset = (page_number - 1) * page_size
+        return self.catalog.films[offset:offset + page_size]
+
+    async def get_films_by_genre_id_with_sort(
+        self, genre_id, sort, page_size, page_number, fields=None
+    ):
+        return self.catalog.films[:page_size]
+
+    async def get_films_by_ids(self, film_ids):
+        return [self.by_id[uuid.UUID(film_id)] for film_id in film_ids]
+
+    async def get_full_films_by_ids(self, film_ids):
+        return [self.by_id[uuid.UUID(film_id)] for film_id in film_ids]
+
+    async def get_films_by_query_after(self, query, page_size, cursor, fields=None):
+        return self.catalog.films[:page_size], None
+
+    async def get_films_with_sort_after(self, sort, genre_id, page_size, cursor, fields=None):
+        return self.catalog.films[:page_size], None
+
+    async def export_films(self, fields, since):
+        yield self.catalog.films
+
+
+class FakePersonHandler(StoragePersonHandler):
+    def __init__(self, catalog: FakeCatalog) -> None:
+        super().__init__(None)
+        self.by_id = {person.id: person for person in catalog.persons}
+        self.catalog = catalog
+
+    async def get_person_by_id(self, person_id, fields=None):
+        return self.by_id.get(person_id)
+
+    async def get_persons_by_ids(self, person_ids):
+        return [self.by_id[uuid.UUID(person_id)] for person_id in person_ids]
+
+    async def get_persons_by_query(self, query, page_size, page_number, fields=None):
+        return self.catalog.persons[:page_size]
+
+    async def get_persons_by_query_after(self, query, page_size, cursor, fields=None):
+        return self.catalog.persons[:page_size], None
+
+    async def export_persons(self, fields, since):
+        yield self.catalog.persons
+
+
+class FakeGenreHandler(StorageGenreHandler):
+    def __init__(self, catalog: FakeCatalog) -> None:
+        super().__init__(None)
+        self.by_id = {genre.id: genre for genre in catalog.genres}
+        self.catalog = catalog
+
+    async def get_genre_by_id(self, genre_id, fields=None):
+        return self.by_id.get(genre_id)
+
+    async def get_genres(self, fields=None):
+        return self.catalog.genres
+
+    async def export_genres(self, fields, since):
+        yield self.catalog.genres
+
+
+def zipf_choice(items: list, s: float = 1.1):
+    weights = [1 / (rank ** s) for rank in range(1, len(items) + 1)]
+    return random.choices(items, weights)[0]
+
+
+async def run(requests: int) -> None:
+    random.seed(42)
+    catalog = FakeCatalog(films_count=1000, persons_count=500, genres_count=30)
+    cache = InMemoryCache()
+
+    film_service = FilmService(CacheFilmHandler(cache, 300), FakeFilmHandler(catalog))
+    person_service = PersonService(CachePersonHandler(cache, 300), FakePersonHandler(catalog))
+    genre_service = GenreService(CacheGenreHandler(cache, 300), FakeGenreHandler(catalog))
+    queries = ['star', 'war', 'love', 'night', 'dark', 'man', 'king']
+
+    endpoints = [
+        lambda: film_service.get_film_by_id(zipf_choice(catalog.films).id),
+        lambda: film_service.get_films_with_sort(
+            random.choice(['-imdb_rating', 'imdb_rating']), 50, zipf_choice(list(range(1, 21)))
+        ),
+        lambda: film_service.get_films_by_genre_id_with_sort(
+            zipf_choice(catalog.genres).id, '-imdb_rating', 50, 1
+        ),
+        lambda: film_service.get_films_by_query(zipf_choice(queries), 50, 1),
+        lambda: film_service.get_person_films(zipf_choice(catalog.persons)),
+        lambda: person_service.get_person_by_id(zipf_choice(catalog.persons).id),
+        lambda: person_service.get_persons_by_query(zipf_choice(queries), 50, 1),
+        lambda: genre_service.get_genre_by_id(zipf_choice(catalog.genres).id),
+        genre_service.get_genres,
+    ]
+    for _ in range(requests):
+        await random.choice(endpoints)()
+
+    print(f'{"namespace":<16}{"hits":>8}{"misses":>8}{"hit rate":>10}')
+    for handler in (film_service, person_service, genre_service):
+        for namespace, stats in sorted(handler.cache_handler.stats.items()):
+            print(f'{namespace:<16}{stats.hits:>8}{stats.misses:>8}{stats.hit_rate:>10.1%}')
+    print(f'max key length: {max(len(key) for key in cache.data)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
@@ -0,0 +1,79 @@
+"""
+Бенчмарк выборки полей документа из Elasticsearch для списков фильмов.
+
+Выполняет один и тот же запрос страницы фильмов с полными документами и с
+проекцией на поля FilmShort и печатает объем ответа, задержку запроса и
+время построения моделей.
+
+Запуск из каталога src при запущенном Elasticsearch с индексом movies:
+    python -m benchmarks.storage_projection --host localhost:9200 --page-size 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from elasticsearch import AsyncElasticsearch
+
+from core.config import settings
+from models.film import Film, FilmShort
+from services.film import FILM_SHORT_FIELDS
+
+
+async def measure(
+    connection: AsyncElasticsearch,
+    body: dict,
+    fields: list[str] | None,
+    model: type[FilmShort],
+    number: int
+) -> tuple[float, float, float, float]:
+    sizes, latencies, build_times = [], [], []
+    for _ in range(number):
+        started = time.perf_counter()
+        response = await connection.search(
+            index=settings.es_movies_index, body=body, _source_includes=fields
+        )
+        latencies.append(time.perf_counter() - started)
+        sizes.append(len(json.dumps(response)))
+
+        started = time.perf_counter()
+        [model(**doc['_source']) for doc in response['hits']['hits']]
+        build_times.append(time.perf_counter() - started)
+
+    latencies.sort()
+    return (
+        statistics.mean(sizes),
+        latencies[len(latencies) // 2],
+        latencies[int(len(latencies) * 0.95)],
+        statistics.mean(build_times)
+    )
+
+
+async def main(host: str, page_size: int, number: int) -> None:
+    connection = AsyncElasticsearch(hosts=[host])
+    body = {
+        'query': {'exists': {'field': 'imdb_rating'}},
+        'sort': [{'imdb_rating': {'order': 'desc'}}],
+        'size': page_size
+    }
+    try:
+        print(f'page size: {page_size}, requests: {number}')
+        print(f'{"source":<10}{"bytes":>10}{"p50, ms":>10}{"p95, ms":>10}{"models, ms":>12}')
+        for name, fields, model in (
+            ('full', None, Film),
+            ('short', FILM_SHORT_FIELDS, FilmShort),
+        ):
+            size, p50, p95, build_time = await measure(connection, body, fields, model, number)
+            print(f'{name:<10}{size:>10.0f}{p50 * 1e3:>10.2f}{p95 * 1e3:>10.2f}{build_time * 1e3:>12.3f}')
+    finally:
+        await connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default=f'{settings.es_host}:{settings.es_port}')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.page_size, args.number))
@@ -0,0 +1,104 @@
+"""
+Микро-бенчмарк сериализаторов ответов Elasticsearch.
+
+Строит ответы поиска из фильмов init_es/es_bulk_dump.json (полные документы
+с вложенными списками жанров и персон) и сравнивает сериализаторы из
+db.serializers по времени разбора ответа, кодирования тела запроса и
+построения моделей. Строка pydantic - разбор тех же байт сразу в модели
+через типизированную обертку ответа, без промежуточных словарей.
+
+Запуск из каталога src:
+    python -m benchmarks.storage_serializer --page-size 50
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+from db.query_builder import BY_SCORE, TIE_BREAKER, FuzzyMatch, NestedTerm, SearchQuery
+from db.serializers import SERIALIZERS, orjson
+from models.film import Film
+
+
+DUMP_PATH = Path(__file__).resolve().parents[2] / 'init_es' / 'es_bulk_dump.json'
+
+
+class SearchHit(BaseModel):
+    source: Film = Field(alias='_source')
+
+
+class SearchHits(BaseModel):
+    hits: list[SearchHit]
+
+
+class SearchResponse(BaseModel):
+    hits: SearchHits
+
+
+def load_response(page_size: int) -> bytes:
+    with open(DUMP_PATH) as f:
+        lines = json.load(f).splitlines()
+    # В дампе чередуются строки действия bulk и документы
+    docs = [json.loads(line) for line in lines[1::2][:page_size]]
+    response = {
+        'took': 3,
+        'timed_out': False,
+        'hits': {
+            'total': {'value': len(docs), 'relation': 'eq'},
+            'max_score': 1.0,
+            'hits': [
+                {'_index': 'movies', '_id': doc['id'], '_score': 1.0, '_source': doc}
+                for doc in docs
+            ]
+        }
+    }
+    return json.dumps(response).encode('utf-8')
+
+
+def main(page_size: int, number: int) -> None:
+    raw = load_response(page_size)
+    body = SearchQuery(
+        match=FuzzyMatch('title', 'star'),
+        filters=[NestedTerm('genres', 'id', '3d8d9bf5-0d90-4353-88ba-4ccc5d2c07ff')],
+        sort=[BY_SCORE, TIE_BREAKER],
+        size=page_size
+    ).to_body()
+    # Клиент получает тело ответа от aiohttp строкой
+    text = raw.decode('utf-8')
+
+    print(f'response: {len(raw)} bytes, {page_size} hits, {number} iterations')
+    print(f'{"serializer":<12}{"loads, us":>12}{"dumps, us":>12}{"models, us":>12}{"total, us":>12}')
+    films = None
+    for name, serializer_class in SERIALIZERS.items():
+        if name == 'orjson' and orjson is None:
+            print(f'{name:<12} skipped: orjson is not installed')
+            continue
+        serializer = serializer_class()
+        response = serializer.loads(text)
+        films = [Film(**doc['_source']) for doc in response['hits']['hits']]
+
+        loads_time = timeit.timeit(lambda: serializer.loads(text), number=number) / number
+        dumps_time = timeit.timeit(lambda: serializer.dumps(body), number=number) / number
+        models_time = timeit.timeit(
+            lambda: [Film(**doc['_source']) for doc in response['hits']['hits']], number=number
+        ) / number
+        total = loads_time + models_time
+        print(
+            f'{name:<12}{loads_time * 1e6:>12.1f}{dumps_time * 1e6:>12.1f}'
+            f'{models_time * 1e6:>12.1f}{total * 1e6:>12.1f}'
+        )
+
+    adapter = TypeAdapter(SearchResponse)
+    assert [hit.source for hit in adapter.validate_json(raw).hits.hits] == films
+    direct_time = timeit.timeit(lambda: adapter.validate_json(raw), number=number) / number
+    print(f'{"pydantic":<12}{"":>12}{"":>12}{"":>12}{direct_time * 1e6:>12.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+    main(args.page_size, args.number)
@@ -12,10 +12,104 @@ class Settings(BaseSettings):
     es_host: str = 'elastic'
     es_port: int = 9200
 
+    # Пул соединений с Redis
+    redis_max_connections: int = 64
+    redis_socket_timeout: float = 5
+    redis_socket_connect_timeout: float = 2
+    redis_socket_keepalive: bool = True
+    redis_retry_on_timeout: bool = True
+    redis_health_check_interval: int = 30
+
+    # Пул соединений с Elasticsearch (на каждый узел)
+    es_max_connections: int = 32
+    es_timeout: float = 10
+    es_max_retries: int = 3
+    es_retry_on_timeout: bool = True
+    es_http_compress: bool = False
+    es_sniff_on_start: bool = False
+    es_sniff_on_connection_fail: bool = False
+    es_sniffer_timeout: float | None = None
+    # Сериализатор запросов и ответов Elasticsearch: json или orjson
+    es_serializer: str = 'orjson'
+
+    # Хранилище: elastic или memory (документы из дампа в памяти процесса, без Elasticsearch)
+    storage_backend: str = 'elastic'
+    # Дамп в формате _bulk для storage_backend=memory, путь относительно каталога src
+    storage_dump_path: str = '../init_es/es_bulk_dump.json'
+
+    # Ограничение времени вызова хранилища и автоматический выключатель (см. db/circuit_breaker.py)
+    storage_call_timeout: float = 5
+    storage_breaker_enabled: bool = True
+    storage_breaker_failure_rate: float = 0.5
+    storage_breaker_slow_call_time: float = 2
+    storage_breaker_min_calls: int = 20
+    storage_breaker_window: int = 100
+    storage_breaker_open_time: float = 10
+
+    # Количество соединений, открываемых при старте приложения
+    redis_warm_up_connections: int = 8
+    es_warm_up_connections: int = 8
+
     es_movies_index: str = 'movies'
     es_genres_index: str = 'genres'
     es_persons_index: str = 'persons'
 
+    # Закреплять point-in-time для постраничного обхода по курсору
+    es_point_in_time_enabled: bool = False
+    es_point_in_time_keep_alive: str = '1m'
+    # Ключ подписи курсоров (HMAC-SHA256). Без него курсор можно подделать, в том числе
+    # подменить point-in-time, поэтому в production ключ нужно задать одинаковым для всех воркеров
+    cursor_secret_key: str | None = None
+
+    # Объединение одновременных поисковых запросов в _msearch
+    es_search_batch_enabled: bool = False
+    es_search_batch_delay_in_ms: float = 2
+    es_search_batch_max_size: int = 32
+
+    # Дублирование медленных запросов к Elasticsearch
+    es_hedging_enabled: bool = False
+    es_hedge_quantile: float = 0.95
+    # Максимальная доля запросов, которые могут быть продублированы
+    es_hedge_budget: float = 0.05
+    es_hedge_min_delay_in_ms: float = 5
+
+    # In-memory кеш воркера перед Redis
+    local_cache_enabled: bool = True
+    local_cache_max_entries: int = 1024
+    local_cache_max_bytes: int = 16 * 1024 * 1024  # 16 Мб
+    local_cache_expire_in_seconds: int = 10
+
+    # Формат значений в кеше: json или msgpack
+    cache_codec: str = 'json'
+    # Значения больше этого размера (в байтах) сжимаются перед записью в Redis
+    cache_compress_min_size: int = 1024
+    cache_compress_level: int = 6
+    # Записи кеша хранятся дольше своего срока жизни, чтобы отдавать их при недоступности хранилища
+    cache_shadow_expire_in_seconds: int = 24 * 60 * 60
+    # Коэффициент досрочного обновления горячих ключей фильмов и жанров (XFetch), None - выключено.
+    # Обычно достаточно 1.0, большие значения обновляют ключи раньше
+    cache_early_refresh_beta: float | None = None
+
+    # Максимальное количество идентификаторов в запросах /batch
+    batch_max_ids: int = 100
+
+    # Количество документов в одном запросе потоковой выгрузки /export
+    export_page_size: int = 1000
+
+    # Кеш готовых HTTP-ответов GET-эндпоинтов фильмов, персон и жанров
+    response_cache_enabled: bool = True
+    response_cache_expire_in_seconds: int = 60
+    # Значение max-age в Cache-Control для nginx и браузеров: столько секунд после изменения
+    # данных клиенты могут получать прежний ответ, даже когда кеш API уже сброшен
+    response_cache_max_age_in_seconds: int = 60
+    # Тела ответов от этого размера (в байтах) сжимаются при записи в кеш: gzip и brotli, если установлен
+    response_compress_min_size: int = 1024
+    response_gzip_level: int = 9
+    response_brotli_quality: int = 9
+
+    # Канал Redis, в который ETL публикует идентификаторы обновленных документов
+    cache_invalidation_channel: str = 'cache:invalidate'
+
 
 settings = Settings()
 
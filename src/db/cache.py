@@ -1,8 +1,8 @@
-from db.redis import RedisCache
+from db.redis import ICache
 
 
-cache: RedisCache | None = None
+cache: ICache | None = None
 
 
-async def get_cache() -> RedisCache:
+async def get_cache() -> ICache:
     return cache
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from elasticsearch.exceptions import ConnectionError, TransportError
+
+from db.elastic import IStorage, SearchPage
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class StorageUnavailableError(Exception):
+    """Хранилище недоступно: автомат разомкнут или вызов завершился сбоем."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__('storage unavailable')
+        self.retry_after = retry_after
+
+
+def is_storage_failure(error: Exception) -> bool:
+    """Сбоем хранилища считаются таймауты, ошибки соединения и ответы 429/5xx, но не ошибки запроса."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, TransportError):
+        status = error.status_code
+        return not isinstance(status, int) or status == 429 or status >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Класс CircuitBreaker - автоматический выключатель обращений к хранилищу.
+
+    Учитывает исходы последних window вызовов. Медленный вызов (дольше slow_call_time)
+    считается сбоем. Если среди не менее min_calls вызовов доля сбоев достигает
+    failure_rate, автомат размыкается на open_time секунд и вызовы сразу отклоняются.
+    Затем пропускается один пробный вызов: при успехе автомат замыкается.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float,
+        slow_call_time: float,
+        min_calls: int,
+        window: int,
+        open_time: float
+    ) -> None:
+        self.failure_rate = failure_rate
+        self.slow_call_time = slow_call_time
+        self.min_calls = min_calls
+        self.open_time = open_time
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._probe_in_flight = False
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_time - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == OPEN and self.retry_after == 0:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, failed: bool, duration: float) -> None:
+        failed = failed or duration >= self.slow_call_time
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if failed:
+                self._open()
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append(failed)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+        ):
+            self._open()
+
+    def cancel(self) -> None:
+        """Отмененный вызов не влияет на статистику, но освобождает место пробного вызова."""
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'recent_calls': len(self._outcomes),
+            'recent_failures': sum(self._outcomes),
+            'rejected': self.rejected,
+            'retry_after': self.retry_after,
+        }
+
+
+class CircuitBreakerStorage(IStorage):
+    """
+    Класс CircuitBreakerStorage ограничивает время вызовов хранилища и защищает их
+    автоматическим выключателем. При сбое или разомкнутом автомате вызов завершается
+    StorageUnavailableError, не дожидаясь хранилища.
+    """
+
+    def __init__(self, storage: IStorage, breaker: CircuitBreaker, call_timeout: float) -> None:
+        self.storage = storage
+        self.breaker = breaker
+        self.call_timeout = call_timeout
+
+    async def get_by_id(self, index: str, id: str, fields: list[str] | None = None) -> dict | None:
+        return await self._call(lambda: self.storage.get_by_id(index, id, fields))
+
+    async def get_by_ids(self, index: str, ids: list[str], fields: list[str] | None = None) -> list[dict]:
+        return await self._call(lambda: self.storage.get_by_ids(index, ids, fields))
+
+    async def search(
+        self,
+        index: str,
+        body: Any,
+        fields: list[str] | None = None,
+        request_cache: bool | None = None
+    ) -> list[dict] | None:
+        return await self._call(lambda: self.storage.search(index, body, fields, request_cache))
+
+    async def search_after(
+        self,
+        index: str,
+        body: Any,
+        after: list[Any] | None = None,
+        fields: list[str] | None = None,
+        point_in_time: dict | None = None
+    ) -> SearchPage:
+        return await self._call(
+            lambda: self.storage.search_after(index, body, after, fields, point_in_time)
+        )
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        return await self._call(lambda: self.storage.open_point_in_time(index, keep_alive))
+
+    async def close_point_in_time(self, point_in_time: str) -> None:
+        await self._call(lambda: self.storage.close_point_in_time(point_in_time))
+
+    async def _call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.breaker.allow():
+            raise StorageUnavailableError(self.breaker.retry_after)
+
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(), self.call_timeout)
+        except asyncio.CancelledError:
+            self.breaker.cancel()
+            raise
+        except Exception as e:
+            failed = is_storage_failure(e)
+            self.breaker.record(failed, time.monotonic() - started)
+            if failed:
+                raise StorageUnavailableError(self.breaker.retry_after) from e
+            raise
+        self.breaker.record(False, time.monotonic() - started)
+        return result
+
+    def stats(self) -> dict:
+        return {**self.storage.stats(), 'circuit_breaker': self.breaker.stats()}
+
+    async def close(self):
+        await self.storage.close()
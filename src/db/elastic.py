@@ -1,41 +1,285 @@
-from typing import Any
+import asyncio
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable
 from abc import ABC, abstractmethod
 from elasticsearch import AsyncElasticsearch, NotFoundError
 
+from db.hedging import Hedger
+from db.search_batcher import SearchBatcher
+
+
+# Количество идентификаторов в одном запросе _mget
+MGET_CHUNK_SIZE = 200
+
+
+@dataclass
+class SearchPage:
+    """Страница выдачи: документы, значения сортировки последнего из них и идентификатор point-in-time."""
+    docs: list[dict]
+    sort: list[Any] | None = None
+    point_in_time: str | None = None
+
 
 class IStorage(ABC):
     @abstractmethod
-    async def get_by_id(self, index: str, id: str) -> dict | None:
+    async def get_by_id(
+        self,
+        index: str,
+        id: str,
+        fields: list[str] | None = None
+    ) -> dict | None:
+        pass
+
+    @abstractmethod
+    async def get_by_ids(
+        self,
+        index: str,
+        ids: list[str],
+        fields: list[str] | None = None
+    ) -> list[dict]:
+        pass
+
+    @abstractmethod
+    async def search(
+        self,
+        index: str,
+        body: Any,
+        fields: list[str] | None = None,
+        request_cache: bool | None = None
+    ) -> list[dict] | None:
         pass
 
     @abstractmethod
-    async def search(self, index: str, body: Any) -> list[dict] | None:
+    async def search_after(
+        self,
+        index: str,
+        body: Any,
+        after: list[Any] | None = None,
+        fields: list[str] | None = None,
+        point_in_time: dict | None = None
+    ) -> SearchPage:
         pass
 
+    @abstractmethod
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        pass
+
+    async def close_point_in_time(self, point_in_time: str) -> None:
+        """Освобождает point-in-time до истечения keep_alive."""
+        pass
+
+    def stats(self) -> dict:
+        """Статистика соединений с хранилищем."""
+        return {}
+
     @abstractmethod
     async def close(self):
         pass
 
 
 class ElasticStorage(IStorage):
-    def __init__(self, **kwargs) -> None:
+    """
+    Класс ElasticStorage - хранилище в Elasticsearch.
+
+    Если передан список fields, из документа возвращаются только эти поля
+    (_source_includes), остальные не передаются по сети.
+
+    Остальные параметры передаются клиенту, в том числе serializer
+    (см. db/serializers.py).
+
+    Если задан search_batch_delay, одновременные вызовы search объединяются
+    в запросы _msearch (см. SearchBatcher).
+
+    Если задан hedge_budget, медленные вызовы get_by_id и search дублируются
+    (см. Hedger), но не чаще чем для доли hedge_budget запросов.
+    """
+
+    def __init__(
+        self,
+        search_batch_delay: float | None = None,
+        search_batch_size: int = 32,
+        hedge_budget: float | None = None,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.0,
+        **kwargs
+    ) -> None:
         self.connection = AsyncElasticsearch(**kwargs)
+        # Размер пула соединений с каждым узлом, заданный при создании клиента
+        self.max_connections = kwargs.get('maxsize')
+        self.batcher = None
+        if search_batch_delay is not None:
+            self.batcher = SearchBatcher(self.connection, search_batch_delay, search_batch_size)
+        self.hedger = None
+        if hedge_budget is not None:
+            self.hedger = Hedger(hedge_quantile, hedge_budget, hedge_min_delay)
+
+    async def get_by_id(
+        self,
+        index: str,
+        id: str,
+        fields: list[str] | None = None
+    ) -> dict | None:
+        def get(preference: str | None = None) -> Awaitable[dict]:
+            return self.connection.get(
+                index=index, id=id, _source_includes=fields, preference=preference
+            )
 
-    async def get_by_id(self, index: str, id: str) -> dict | None:
         try:
-            doc = await self.connection.get(index=index, id=id)
+            if self.hedger is not None:
+                doc = await self.hedger.run(f'get:{index}', get)
+            else:
+                doc = await get()
         except NotFoundError:
             return None
         return doc['_source']
 
-    async def search(self, index: str, body: Any) -> list[dict] | None:
+    async def get_by_ids(
+        self,
+        index: str,
+        ids: list[str],
+        fields: list[str] | None = None
+    ) -> list[dict]:
+        """
+        Возвращает найденные документы в порядке ids. Идентификаторы запрашиваются
+        через _mget частями по MGET_CHUNK_SIZE, части выполняются параллельно.
+        """
         try:
-            docs = await self.connection.search(
-                index=index, body=body
+            responses = await asyncio.gather(*[
+                self.connection.mget(
+                    index=index,
+                    body={'ids': ids[i:i + MGET_CHUNK_SIZE]},
+                    _source_includes=fields
+                )
+                for i in range(0, len(ids), MGET_CHUNK_SIZE)
+            ])
+        except NotFoundError:
+            return []
+        return [
+            doc['_source']
+            for response in responses
+            for doc in response['docs']
+            if doc.get('found')
+        ]
+
+    async def search(
+        self,
+        index: str,
+        body: Any,
+        fields: list[str] | None = None,
+        request_cache: bool | None = None
+    ) -> list[dict] | None:
+        """
+        Если request_cache=True, результат кешируется в кеше запросов шарда Elasticsearch.
+        Запросы, объединяемые в _msearch, не дублируются.
+        """
+        def search(preference: str | None = None) -> Awaitable[dict]:
+            return self.connection.search(
+                index=index,
+                body=body,
+                _source_includes=fields,
+                request_cache=request_cache,
+                preference=preference
             )
+
+        try:
+            if self.batcher is not None:
+                # В _msearch нет параметра _source_includes, проекция передается в теле запроса
+                docs = await self.batcher.search(
+                    index, body if fields is None else {**body, '_source': fields}, request_cache
+                )
+            elif self.hedger is not None:
+                docs = await self.hedger.run(f'search:{index}', search)
+            else:
+                docs = await search()
         except NotFoundError:
             return None
         return [doc['_source'] for doc in docs['hits']['hits']]
 
+    async def search_after(
+        self,
+        index: str,
+        body: Any,
+        after: list[Any] | None = None,
+        fields: list[str] | None = None,
+        point_in_time: dict | None = None
+    ) -> SearchPage:
+        """
+        Возвращает страницу, следующую за документом со значениями сортировки after.
+        Запрос с point-in-time выполняется без индекса: индекс закреплен в самом point-in-time.
+        Для ненайденного индекса возвращается пустая страница, а для истекшего или закрытого
+        point-in-time вызывается NotFoundError: пустая страница означала бы конец выдачи.
+        """
+        body = dict(body)
+        if after is not None:
+            body['search_after'] = after
+        if point_in_time is not None:
+            body['pit'] = point_in_time
+            index = None
+        try:
+            docs = await self.connection.search(
+                index=index, body=body, _source_includes=fields
+            )
+        except NotFoundError:
+            if point_in_time is not None:
+                raise
+            return SearchPage(docs=[])
+        hits = docs['hits']['hits']
+        return SearchPage(
+            docs=[doc['_source'] for doc in hits],
+            sort=hits[-1]['sort'] if hits else None,
+            point_in_time=docs.get('pit_id')
+        )
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        # В клиенте 7.9 нет метода open_point_in_time, запрос выполняется через транспорт
+        response = await self.connection.transport.perform_request(
+            'POST', f'/{index}/_pit', params={'keep_alive': keep_alive}
+        )
+        return response['id']
+
+    async def close_point_in_time(self, point_in_time: str) -> None:
+        try:
+            await self.connection.transport.perform_request(
+                'DELETE', '/_pit', body={'id': point_in_time}
+            )
+        except NotFoundError:
+            # Point-in-time уже истек
+            pass
+
+    async def warm_up(self, connections: int) -> None:
+        """Открывает до connections соединений с каждым узлом заранее, до первых запросов."""
+        # Асинхронный транспорт создает пул узлов при первом запросе
+        await self.connection.ping()
+        for node in self.connection.transport.connection_pool.connections:
+            await asyncio.gather(*[node.perform_request('GET', '/') for _ in range(connections)])
+
+    def stats(self) -> dict:
+        """
+        Статистика узлов, объединения и дублирования запросов. Клиент не раскрывает
+        загрузку пулов соединений, поэтому для узлов выводится только их состав и размер пула.
+        """
+        # Асинхронный транспорт создает пул узлов при первом запросе
+        nodes = self.connection.transport.connection_pool.connections
+        pool = {
+            'nodes': [node.host for node in nodes],
+            'max_connections_per_node': self.max_connections,
+        }
+
+        search_batching = None
+        if self.batcher is not None:
+            search_batching = {
+                **asdict(self.batcher.stats),
+                'average_batch_size': self.batcher.stats.average_batch_size,
+                'request_reduction': self.batcher.stats.request_reduction,
+                'average_wait_time': self.batcher.stats.average_wait_time,
+            }
+
+        hedging = None
+        if self.hedger is not None:
+            hedging = {**asdict(self.hedger.stats), 'hedge_rate': self.hedger.stats.hedge_rate}
+        return {'pool': pool, 'search_batching': search_batching, 'hedging': hedging}
+
     async def close(self):
+        if self.batcher is not None:
+            await self.batcher.close()
         await self.connection.close()
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+
+# Минимальное число замеров задержки, после которого включается дублирование
+HEDGE_MIN_SAMPLES = 50
+# Количество последних замеров, по которым считается квантиль задержки
+HEDGE_LATENCY_WINDOW = 500
+
+
+@dataclass
+class HedgingStats:
+    """Статистика дублирования запросов."""
+    requests: int = 0
+    hedged: int = 0
+    # Запросы, на которые первым ответил дублирующий запрос
+    hedge_wins: int = 0
+    # Запросы, которые не были продублированы из-за исчерпания бюджета
+    budget_exhausted: int = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+
+class LatencyTracker:
+    """Квантиль задержки по последним window успешным запросам."""
+
+    def __init__(self, quantile: float, window: int = HEDGE_LATENCY_WINDOW) -> None:
+        self.quantile = quantile
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    def value(self) -> float | None:
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.quantile))]
+
+
+class HedgeBudget:
+    """
+    Ограничение доли дублирующих запросов: каждый запрос добавляет ratio токенов
+    (не больше burst), дублирующий запрос расходует один токен. Поэтому при
+    замедлении всего кластера нагрузка растет не больше чем на долю ratio.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    def deposit(self) -> None:
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def acquire(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class Hedger:
+    """
+    Класс Hedger выполняет запрос и, если ответа нет дольше quantile-квантиля
+    задержки операции (но не меньше min_delay секунд), отправляет второй такой же
+    запрос с другим значением preference, чтобы он попал на другую копию шарда.
+    Используется первый успешный ответ, второй запрос отменяется.
+    """
+
+    def __init__(self, quantile: float, budget: float, min_delay: float = 0.0) -> None:
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.budget = HedgeBudget(budget)
+        self.stats = HedgingStats()
+        self._latencies: dict[str, LatencyTracker] = {}
+        self._preferences = itertools.count()
+
+    def delay(self, operation: str) -> float | None:
+        tracker = self._latencies.get(operation)
+        latency = tracker.value() if tracker is not None else None
+        return None if latency is None else max(latency, self.min_delay)
+
+    async def run(self, operation: str, call: Callable[[str | None], Awaitable[Any]]) -> Any:
+        """call принимает значение preference: None для основного запроса, строку для дублирующего."""
+        self.stats.requests += 1
+        self.budget.deposit()
+        delay = self.delay(operation)
+        started = time.monotonic()
+
+        primary = asyncio.ensure_future(call(None))
+        tasks = {primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if self.budget.acquire():
+                        self.stats.hedged += 1
+                        tasks.add(asyncio.ensure_future(call(f'hedge-{next(self._preferences)}')))
+                    else:
+                        self.stats.budget_exhausted += 1
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats.hedge_wins += 1
+                        self._record(operation, time.monotonic() - started)
+                        return task.result()
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _record(self, operation: str, latency: float) -> None:
+        tracker = self._latencies.get(operation)
+        if tracker is None:
+            tracker = self._latencies[operation] = LatencyTracker(self.quantile)
+        tracker.record(latency)
@@ -0,0 +1,150 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+from db.redis import ICache, RedisCache
+
+
+class LocalCache:
+    """
+    Класс LocalCache - ограниченный по количеству записей и объему
+    in-memory кеш процесса с TTL и вытеснением по LRU.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, expired_time: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.expired_time = expired_time
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expire_at, value, _ = entry
+        if expire_at <= time.monotonic():
+            self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expired_time: float) -> None:
+        """
+        Кладет значение в кеш. Время жизни записи не превышает
+        ни собственного TTL кеша, ни переданного expired_time.
+        """
+        self.delete(key)
+
+        ttl = min(self.expired_time, expired_time)
+        value_size = get_size(value)
+        if ttl <= 0 or value_size > self.max_bytes:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, value, value_size)
+        self.size += value_size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def get_size(value: Any) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(str(value))
+
+
+class TwoTierCache(ICache):
+    """
+    Класс TwoTierCache - двухуровневый кеш: in-memory кеш воркера (L1)
+    перед общим кешом в Redis (L2). Горячие ключи отдаются из L1 без
+    обращения к сети.
+
+    Ключи с префиксами из remote_only_prefixes хранятся только в Redis.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        local_cache: LocalCache,
+        remote_only_prefixes: tuple[str, ...] = ()
+    ) -> None:
+        self.cache = cache
+        self.local_cache = local_cache
+        self.remote_only_prefixes = remote_only_prefixes
+
+    def is_local(self, key: str) -> bool:
+        """Хранится ли ключ также в L1."""
+        return not key.startswith(self.remote_only_prefixes)
+
+    async def get(self, key: str) -> str | None:
+        if not self.is_local(key):
+            return await self.cache.get(key)
+
+        value = self.local_cache.get(key)
+        if value is not None:
+            return value
+
+        value, expired_time = await self.cache.get_with_ttl(key)
+        if value is not None and expired_time is not None:
+            self.local_cache.set(key, value, expired_time)
+        return value
+
+    async def set(self, key: str, value: Any, expired_time: int, compress: bool = True) -> None:
+        await self.cache.set(key, value, expired_time, compress)
+        if self.is_local(key):
+            self.local_cache.set(key, value, expired_time)
+
+    async def get_many(self, keys: list[str]) -> list[str | None]:
+        values = [self.local_cache.get(key) if self.is_local(key) else None for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        loaded = await self.cache.get_many_with_ttl([keys[i] for i in missing])
+        for i, (value, expired_time) in zip(missing, loaded):
+            if value is not None and expired_time is not None and self.is_local(keys[i]):
+                self.local_cache.set(keys[i], value, expired_time)
+            values[i] = value
+        return values
+
+    async def set_many(self, values: dict[str, Any], expired_time: int) -> None:
+        await self.cache.set_many(values, expired_time)
+        for key, value in values.items():
+            if self.is_local(key):
+                self.local_cache.set(key, value, expired_time)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.local_cache.delete(key)
+        await self.cache.delete(*keys)
+
+    async def get_counter(self, key: str) -> int:
+        return await self.cache.get_counter(key)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            'local': {
+                'entries': len(self.local_cache),
+                'bytes': self.local_cache.size,
+            }
+        }
+
+    async def close(self):
+        self.local_cache.clear()
+        await self.cache.close()
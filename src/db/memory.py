@@ -0,0 +1,396 @@
+import json
+import re
+import uuid
+from bisect import bisect_right
+from functools import cmp_to_key
+from typing import Any, Callable
+
+from elasticsearch.exceptions import NotFoundError, RequestError
+
+from db.elastic import IStorage, SearchPage
+from db.redis import ICache
+
+
+# Размер страницы Elasticsearch по умолчанию
+DEFAULT_SIZE = 10
+# Количество запомненных раскрытий нечеткого терма на поле
+FUZZY_CACHE_SIZE = 1024
+# Роли персон по полям документа фильма
+PERSON_ROLES = {'actors': 'actor', 'writers': 'writer', 'directors': 'director'}
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(value: Any) -> list[str]:
+    """Разбивает текст на термы так же, как стандартный анализатор: слова в нижнем регистре."""
+    return TOKEN_RE.findall(str(value).lower())
+
+
+def fuzziness(term: str) -> int:
+    """Допустимое число правок для fuzziness AUTO."""
+    if len(term) <= 2:
+        return 0
+    if len(term) <= 5:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int | None:
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних символов) или None, если оно больше limit."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return None
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+def compare_values(a: Any, b: Any, order: str) -> int:
+    """Сравнение значений сортировки: документы без значения идут последними при любом порядке."""
+    if a == b:
+        return 0
+    if a is None:
+        return 1
+    if b is None:
+        return -1
+    result = -1 if a < b else 1
+    return result if order == 'asc' else -result
+
+
+class MemoryIndex:
+    """
+    Индекс документов в памяти. Вспомогательные структуры строятся при первом
+    запросе по полю и переиспользуются: инвертированный индекс текстового поля
+    (терм -> идентификаторы, термы сгруппированы по длине), индекс значений
+    вложенных документов и отсортированный по полю список идентификаторов.
+    """
+
+    def __init__(self, docs: list[dict]) -> None:
+        self.docs = {str(doc['id']): doc for doc in docs}
+        self._terms: dict[str, dict[str, set[str]]] = {}
+        self._terms_by_length: dict[str, dict[int, list[str]]] = {}
+        self._fuzzy: dict[str, dict[str, dict[str, int]]] = {}
+        self._nested: dict[str, dict[Any, set[str]]] = {}
+        self._sorted: dict[tuple[str, str], list[str]] = {}
+
+    def terms(self, field: str) -> dict[str, set[str]]:
+        if field not in self._terms:
+            terms = self._terms[field] = {}
+            for id, doc in self.docs.items():
+                for term in tokenize(doc.get(field) or ''):
+                    terms.setdefault(term, set()).add(id)
+            by_length = self._terms_by_length[field] = {}
+            for term in terms:
+                by_length.setdefault(len(term), []).append(term)
+        return self._terms[field]
+
+    def fuzzy_terms(self, field: str, value: str) -> dict[str, int]:
+        """Термы поля на расстоянии не больше fuzziness AUTO от value и расстояния до них."""
+        cache = self._fuzzy.setdefault(field, {})
+        if value not in cache:
+            self.terms(field)
+            limit = fuzziness(value)
+            matches = {}
+            for length in range(len(value) - limit, len(value) + limit + 1):
+                for term in self._terms_by_length[field].get(length, ()):
+                    distance = edit_distance(value, term, limit)
+                    if distance is not None:
+                        matches[term] = distance
+            if len(cache) >= FUZZY_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[value] = matches
+        return cache[value]
+
+    def nested(self, path: str, field: str) -> dict[Any, set[str]]:
+        key = f'{path}.{field}'
+        if key not in self._nested:
+            values = self._nested[key] = {}
+            for id, doc in self.docs.items():
+                for nested_doc in doc.get(path) or []:
+                    values.setdefault(str(nested_doc.get(field)), set()).add(id)
+        return self._nested[key]
+
+    def sorted_ids(self, field: str, order: str) -> list[str]:
+        """Идентификаторы в порядке значения поля, при равных значениях - в порядке id."""
+        key = (field, order)
+        if key not in self._sorted:
+            ids = sorted(self.docs)
+            self._sorted[key] = sorted(
+                ids,
+                key=cmp_to_key(
+                    lambda a, b: compare_values(
+                        self.docs[a].get(field), self.docs[b].get(field), order
+                    )
+                )
+            )
+        return self._sorted[key]
+
+
+class InMemoryStorage(IStorage):
+    """
+    Класс InMemoryStorage - хранилище в памяти процесса.
+
+    Выполняет запросы тех видов, которые строят обработчики Elastic*Handler:
+    поиск по id, нечеткий поиск (fuzzy) по текстовому полю, фильтр по
+    вложенному документу (nested term), нижняя граница значения поля (range gte),
+    сортировка, from/size и search_after.
+    Используется для бенчмарков и тестов без Elasticsearch, а также как
+    резервный режим работы API. Для других запросов вызывается RequestError,
+    как для некорректного запроса в Elasticsearch.
+    """
+
+    def __init__(self, indexes: dict[str, list[dict]]) -> None:
+        self.indexes = {name: MemoryIndex(docs) for name, docs in indexes.items()}
+        self._points_in_time: dict[str, str] = {}
+
+    @classmethod
+    def from_bulk_dump(
+        cls,
+        path: str,
+        movies_index: str = 'movies',
+        genres_index: str = 'genres',
+        persons_index: str = 'persons'
+    ) -> 'InMemoryStorage':
+        """
+        Загружает дамп в формате _bulk (см. init_es/es_bulk_dump.json). Если в дампе
+        нет документов жанров или персон, они строятся по вложенным спискам фильмов.
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        lines = data.splitlines() if isinstance(data, str) else data
+
+        indexes: dict[str, list[dict]] = {}
+        for action, doc in zip(lines[::2], lines[1::2]):
+            action = json.loads(action) if isinstance(action, str) else action
+            doc = json.loads(doc) if isinstance(doc, str) else doc
+            indexes.setdefault(action['index']['_index'], []).append(doc)
+
+        films = indexes.get(movies_index, [])
+        if genres_index not in indexes:
+            indexes[genres_index] = list({
+                genre['id']: genre for film in films for genre in film.get('genres') or []
+            }.values())
+        if persons_index not in indexes:
+            persons: dict[str, dict] = {}
+            for film in films:
+                for field, role in PERSON_ROLES.items():
+                    for person in film.get(field) or []:
+                        doc = persons.setdefault(
+                            person['id'], {'id': person['id'], 'full_name': person['name'], 'films': {}}
+                        )
+                        doc['films'].setdefault(film['id'], []).append(role)
+            indexes[persons_index] = [
+                {**doc, 'films': [{'id': id, 'roles': roles} for id, roles in doc['films'].items()]}
+                for doc in persons.values()
+            ]
+        return cls(indexes)
+
+    async def get_by_id(
+        self,
+        index: str,
+        id: str,
+        fields: list[str] | None = None
+    ) -> dict | None:
+        memory_index = self.indexes.get(index)
+        doc = memory_index.docs.get(str(id)) if memory_index is not None else None
+        return self._project(doc, fields) if doc is not None else None
+
+    async def get_by_ids(
+        self,
+        index: str,
+        ids: list[str],
+        fields: list[str] | None = None
+    ) -> list[dict]:
+        memory_index = self.indexes.get(index)
+        if memory_index is None:
+            return []
+        docs = (memory_index.docs.get(str(id)) for id in ids)
+        return [self._project(doc, fields) for doc in docs if doc is not None]
+
+    async def search(
+        self,
+        index: str,
+        body: Any,
+        fields: list[str] | None = None,
+        request_cache: bool | None = None
+    ) -> list[dict] | None:
+        memory_index = self.indexes.get(index)
+        if memory_index is None:
+            return None
+        ids, _ = self._execute(memory_index, body)
+        offset = body.get('from', 0)
+        size = body.get('size', DEFAULT_SIZE)
+        return [self._project(memory_index.docs[id], fields) for id in ids[offset:offset + size]]
+
+    async def search_after(
+        self,
+        index: str,
+        body: Any,
+        after: list[Any] | None = None,
+        fields: list[str] | None = None,
+        point_in_time: dict | None = None
+    ) -> SearchPage:
+        if point_in_time is not None:
+            # Данные не меняются, поэтому point-in-time только хранит имя индекса
+            if point_in_time['id'] not in self._points_in_time:
+                raise NotFoundError(404, 'search_context_missing_exception', 'Point-in-time не найден')
+            index = self._points_in_time[point_in_time['id']]
+        memory_index = self.indexes.get(index)
+        if memory_index is None:
+            return SearchPage(docs=[])
+
+        ids, sort_values = self._execute(memory_index, body)
+        if after is not None:
+            key = cmp_to_key(self._comparator(body.get('sort') or []))
+            ids = ids[bisect_right(ids, key(after), key=lambda id: key(sort_values(id))):]
+        ids = ids[:body.get('size', DEFAULT_SIZE)]
+        return SearchPage(
+            docs=[self._project(memory_index.docs[id], fields) for id in ids],
+            sort=sort_values(ids[-1]) if ids else None,
+            point_in_time=point_in_time['id'] if point_in_time is not None else None
+        )
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        point_in_time = str(uuid.uuid4())
+        self._points_in_time[point_in_time] = index
+        return point_in_time
+
+    async def close_point_in_time(self, point_in_time: str) -> None:
+        self._points_in_time.pop(point_in_time, None)
+
+    def stats(self) -> dict:
+        return {'indexes': {name: len(index.docs) for name, index in self.indexes.items()}}
+
+    async def close(self):
+        pass
+
+    def _execute(
+        self,
+        index: MemoryIndex,
+        body: dict
+    ) -> tuple[list[str], Callable[[str], list[Any]]]:
+        """
+        Идентификаторы подходящих документов в порядке сортировки и функция,
+        возвращающая значения сортировки документа (как поле sort в ответе).
+        """
+        ids, scores = self._match(index, body.get('query'))
+        sort = [self._parse_sort(clause) for clause in body.get('sort') or []]
+
+        def sort_values(id: str, sort: list[tuple[str, str]] = sort) -> list[Any]:
+            doc = index.docs[id]
+            return [scores.get(id, 1.0) if field == '_score' else doc.get(field) for field, _ in sort]
+
+        # Без сортировки - по релевантности, как в Elasticsearch
+        order = sort or [('_score', 'desc')]
+        if order[0][0] != '_score' and order[1:] in ([], [('id', 'asc')]):
+            # Готовый порядок по полю, при равных значениях он совпадает с сортировкой по id
+            ordered = [id for id in index.sorted_ids(*order[0]) if ids is None or id in ids]
+        elif order[0] == ('_score', 'desc') and order[1:] in ([], [('id', 'asc')]):
+            ordered = sorted(index.docs if ids is None else ids, key=lambda id: (-scores.get(id, 1.0), id))
+        else:
+            key = cmp_to_key(self._comparator([{field: {'order': o}} for field, o in order]))
+            keys = {id: key(sort_values(id, order)) for id in (index.docs if ids is None else ids)}
+            ordered = sorted(keys, key=lambda id: (keys[id], id))
+        return ordered, sort_values
+
+    def _match(self, index: MemoryIndex, query: dict | None) -> tuple[set[str] | None, dict[str, float]]:
+        """Идентификаторы подходящих документов (None - все документы) и их релевантность."""
+        if query is None or 'match_all' in query:
+            return None, {}
+        if 'fuzzy' in query:
+            [(field, params)] = query['fuzzy'].items()
+            value = str(params['value'] if isinstance(params, dict) else params).lower()
+            scores: dict[str, float] = {}
+            terms = index.terms(field)
+            for term, distance in index.fuzzy_terms(field, value).items():
+                score = 1 - distance / max(len(value), len(term))
+                for id in terms[term]:
+                    scores[id] = max(scores.get(id, 0.0), score)
+            return set(scores), scores
+        if 'nested' in query:
+            [(field, value)] = query['nested']['query']['term'].items()
+            path = query['nested']['path']
+            return set(index.nested(path, field[len(path) + 1:]).get(str(value), ())), {}
+        if 'range' in query:
+            # Даты в формате ISO 8601 с одинаковым часовым поясом сравниваются как строки
+            [(field, bounds)] = query['range'].items()
+            return {
+                id for id, doc in index.docs.items()
+                if doc.get(field) is not None and doc[field] >= bounds['gte']
+            }, {}
+        if 'bool' in query:
+            ids, scores = None, {}
+            for clause in ('filter', 'must'):
+                for sub_query in query['bool'].get(clause) or []:
+                    sub_ids, sub_scores = self._match(index, sub_query)
+                    if clause == 'must':
+                        scores = sub_scores
+                    if sub_ids is not None:
+                        ids = sub_ids if ids is None else ids & sub_ids
+            return ids, scores
+        raise RequestError(400, 'parsing_exception', f'Неподдерживаемый запрос: {query}')
+
+    @staticmethod
+    def _parse_sort(clause: dict | str) -> tuple[str, str]:
+        if isinstance(clause, str):
+            return clause, 'desc' if clause == '_score' else 'asc'
+        [(field, params)] = clause.items()
+        return field, params.get('order', 'asc') if isinstance(params, dict) else params
+
+    def _comparator(self, sort: list[dict]):
+        orders = [order for _, order in map(self._parse_sort, sort)]
+
+        def compare(a: list[Any], b: list[Any]) -> int:
+            for a_value, b_value, order in zip(a, b, orders):
+                result = compare_values(a_value, b_value, order)
+                if result:
+                    return result
+            return 0
+        return compare
+
+    @staticmethod
+    def _project(doc: dict, fields: list[str] | None) -> dict:
+        if fields is None:
+            return doc
+        return {field: doc[field] for field in fields if field in doc}
+
+
+class InMemoryCache(ICache):
+    """
+    Класс InMemoryCache - кеш в словаре процесса без ограничения размера и времени жизни.
+
+    Используется для бенчмарков и тестов без Redis.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, Any] = {}
+
+    async def get(self, key: str) -> Any:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: Any, expired_time: int, compress: bool = True) -> None:
+        self.data[key] = value
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        return [self.data.get(key) for key in keys]
+
+    async def set_many(self, values: dict[str, Any], expired_time: int) -> None:
+        self.data.update(values)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def get_counter(self, key: str) -> int:
+        return int(self.data.get(key) or 0)
+
+    async def close(self):
+        pass
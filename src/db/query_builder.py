@@ -0,0 +1,114 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass(frozen=True)
+class Sort:
+    field: str
+    order: str = 'asc'
+
+    @classmethod
+    def parse(cls, sort: str) -> 'Sort':
+        """Разбирает параметр сортировки API: '-imdb_rating' - по убыванию, 'imdb_rating' - по возрастанию."""
+        if sort.startswith('-'):
+            return cls(sort[1:], 'desc')
+        return cls(sort, 'asc')
+
+    def to_dsl(self) -> dict:
+        return {self.field: {'order': self.order}}
+
+
+# Сортировка по релевантности для полнотекстового поиска
+BY_SCORE = Sort('_score', 'desc')
+# Уточняющая сортировка, чтобы порядок документов с равными значениями был стабильным
+TIE_BREAKER = Sort('id', 'asc')
+
+
+@dataclass(frozen=True)
+class FuzzyMatch:
+    """Нечеткий поиск по полю, влияет на релевантность документов."""
+    field: str
+    value: str
+
+    def to_dsl(self) -> dict:
+        return {
+            'fuzzy': {
+                self.field: {
+                    'value': self.value,
+                    'fuzziness': 'AUTO'
+                }
+            }
+        }
+
+
+@dataclass(frozen=True)
+class NestedTerm:
+    """Точное совпадение значения во вложенном документе, выполняется как фильтр без расчета релевантности."""
+    path: str
+    field: str
+    value: Any
+
+    def to_dsl(self) -> dict:
+        value = str(self.value) if isinstance(self.value, uuid.UUID) else self.value
+        return {
+            'nested': {
+                'path': self.path,
+                'query': {
+                    'term': {
+                        f'{self.path}.{self.field}': value
+                    }
+                }
+            }
+        }
+
+
+@dataclass(frozen=True)
+class Range:
+    """Значение поля не меньше gte, выполняется как фильтр. Документы без поля не подходят."""
+    field: str
+    gte: Any
+
+    def to_dsl(self) -> dict:
+        return {'range': {self.field: {'gte': self.gte}}}
+
+
+@dataclass
+class SearchQuery:
+    """
+    Класс SearchQuery описывает поисковый запрос через намерения (поиск, фильтры,
+    сортировка, страница) и компилирует его в DSL Elasticsearch.
+
+    Фильтры попадают в bool.filter: они не участвуют в расчете релевантности
+    и кешируются Elasticsearch на уровне сегментов. Для запросов без
+    недетерминированных частей включается кеш запросов шарда (request_cache).
+    """
+    match: FuzzyMatch | None = None
+    filters: list[NestedTerm | Range] = field(default_factory=list)
+    sort: list[Sort] = field(default_factory=list)
+    size: int | None = None
+    offset: int | None = None
+    request_cache: bool = True
+
+    def to_body(self) -> dict:
+        body = {}
+        query = self._query()
+        if query is not None:
+            body['query'] = query
+        if self.sort:
+            body['sort'] = [sort.to_dsl() for sort in self.sort]
+        if self.size is not None:
+            body['size'] = self.size
+        if self.offset:
+            body['from'] = self.offset
+        return body
+
+    def _query(self) -> dict | None:
+        if self.match is None and not self.filters:
+            return None
+        if not self.filters:
+            return self.match.to_dsl()
+        query = {'filter': [query_filter.to_dsl() for query_filter in self.filters]}
+        if self.match is not None:
+            query['must'] = [self.match.to_dsl()]
+        return {'bool': query}
@@ -1,7 +1,27 @@
-from typing import Any
+import asyncio
+import math
+import zlib
+from typing import Any, AsyncIterator
 from abc import ABC, abstractmethod
 from redis.asyncio import Redis
 
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+# Первый байт значения в Redis указывает на способ сжатия
+RAW = 0
+ZLIB = 1
+LZ4 = 2
+
+# Время ожидания сообщения подписки за одно чтение (секунды). Должно быть меньше
+# socket_timeout, иначе ожидание сообщения завершится ошибкой таймаута
+PUBSUB_POLL_TIMEOUT_IN_SECONDS = 1.0
+# Параметры соединений пула, которые выводятся в статистике (пароль в нее не попадает)
+STATS_CONNECTION_KWARGS = ('host', 'port', 'db', 'socket_timeout', 'socket_connect_timeout')
+
 
 class ICache(ABC):
     @abstractmethod
@@ -9,23 +29,174 @@ class ICache(ABC):
         pass
 
     @abstractmethod
-    async def set(self, key: str, value: Any, expired_time: int) -> None:
+    async def set(self, key: str, value: Any, expired_time: int, compress: bool = True) -> None:
+        """compress=False - значение уже сжато и сохраняется как есть."""
+        pass
+
+    @abstractmethod
+    async def get_many(self, keys: list[str]) -> list[str | None]:
+        pass
+
+    @abstractmethod
+    async def set_many(self, values: dict[str, Any], expired_time: int) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
         pass
 
+    @abstractmethod
+    async def get_counter(self, key: str) -> int:
+        pass
+
+    def stats(self) -> dict:
+        """Статистика использования кеша и его соединений."""
+        return {}
+
     @abstractmethod
     async def close(self):
         pass
 
 
+def compress_value(value: str | bytes, min_size: int, level: int) -> bytes:
+    """Сжимает значения от min_size байт (lz4, если установлен, иначе zlib) и добавляет байт-заголовок."""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if len(value) < min_size:
+        return bytes((RAW,)) + value
+    if lz4 is not None:
+        return bytes((LZ4,)) + lz4.frame.compress(value)
+    return bytes((ZLIB,)) + zlib.compress(value, level)
+
+
+def decompress_value(data: bytes) -> bytes | None:
+    """Возвращает исходное значение, либо None для значения без известного заголовка."""
+    if not data:
+        return None
+    header, payload = data[0], data[1:]
+    try:
+        if header == RAW:
+            return payload
+        if header == ZLIB:
+            return zlib.decompress(payload)
+        if header == LZ4 and lz4 is not None:
+            return lz4.frame.decompress(payload)
+    except (zlib.error, RuntimeError):
+        pass
+    return None
+
+
 class RedisCache(ICache):
-    def __init__(self, **kwargs) -> None:
+    def __init__(
+        self,
+        compress_min_size: int = 1024,
+        compress_level: int = 6,
+        **kwargs
+    ) -> None:
         self.connection = Redis(**kwargs)
+        self.compress_min_size = compress_min_size
+        self.compress_level = compress_level
 
     async def get(self, key: str) -> str | None:
-        return await self.connection.get(key)
+        return decompress_value(await self.connection.get(key))
+
+    async def get_with_ttl(self, key: str) -> tuple[str | None, float | None]:
+        """Возвращает значение и оставшееся время жизни ключа (в секундах) за один запрос."""
+        async with self.connection.pipeline(transaction=False) as pipe:
+            value, ttl = await pipe.get(key).pttl(key).execute()
+        value = decompress_value(value)
+        if value is None:
+            return None, None
+        # -1: у ключа нет срока жизни
+        return value, float('inf') if ttl < 0 else ttl / 1000
+
+    async def set(self, key: str, value: Any, expired_time: int, compress: bool = True) -> None:
+        # Без сжатия значение сохраняется с заголовком RAW при любом размере
+        min_size = self.compress_min_size if compress else math.inf
+        await self.connection.set(
+            key, compress_value(value, min_size, self.compress_level), expired_time
+        )
+
+    async def get_many(self, keys: list[str]) -> list[str | None]:
+        if not keys:
+            return []
+        return [decompress_value(value) for value in await self.connection.mget(keys)]
+
+    async def get_many_with_ttl(self, keys: list[str]) -> list[tuple[str | None, float | None]]:
+        """Пакетный вариант get_with_ttl: все ключи читаются за один проход по сети."""
+        async with self.connection.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key).pttl(key)
+            results = await pipe.execute()
+        values = []
+        for value, ttl in zip(results[::2], results[1::2]):
+            value = decompress_value(value)
+            if value is None:
+                values.append((None, None))
+            else:
+                values.append((value, float('inf') if ttl < 0 else ttl / 1000))
+        return values
+
+    async def set_many(self, values: dict[str, Any], expired_time: int) -> None:
+        async with self.connection.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(
+                    key,
+                    compress_value(value, self.compress_min_size, self.compress_level),
+                    expired_time
+                )
+            await pipe.execute()
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.connection.delete(*keys)
+
+    async def listen(self, channel: str) -> AsyncIterator[bytes]:
+        """Подписывается на канал Redis и отдает данные приходящих сообщений."""
+        pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        try:
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=PUBSUB_POLL_TIMEOUT_IN_SECONDS
+                )
+                if message is not None:
+                    yield message['data']
+        finally:
+            await pubsub.close()
+
+    async def warm_up(self, connections: int) -> None:
+        """Открывает connections соединений пула заранее, до первых запросов."""
+        pool = self.connection.connection_pool
+        results = await asyncio.gather(
+            *[pool.get_connection('PING') for _ in range(connections)], return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        for connection in results:
+            if not isinstance(connection, Exception):
+                await pool.release(connection)
+        if errors:
+            raise errors[0]
+
+    def stats(self) -> dict:
+        """
+        Настройки пула соединений. Загрузку пула redis-py хранит только в закрытых
+        атрибутах, которые меняются между версиями, поэтому она не выводится.
+        """
+        pool = self.connection.connection_pool
+        return {
+            'pool': {
+                'max_connections': pool.max_connections,
+                **{
+                    name: pool.connection_kwargs.get(name) for name in STATS_CONNECTION_KWARGS
+                },
+            }
+        }
 
-    async def set(self, key: str, value: Any, expired_time: int) -> None:
-        await self.connection.set(key, value, expired_time)
+    async def get_counter(self, key: str) -> int:
+        """Читает счетчик, который изменяется командой INCR без заголовка сжатия."""
+        value = await self.connection.get(key)
+        return int(value) if value else 0
 
     async def close(self):
-        await self.connection.close()
\ No newline at end of file
+        await self.connection.close()
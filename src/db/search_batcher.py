@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import HTTP_EXCEPTIONS, TransportError
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchBatcherStats:
+    """Статистика объединения поисковых запросов."""
+    searches: int = 0
+    batches: int = 0
+    max_batch_size: int = 0
+    # Суммарное время ожидания запросов в очереди до отправки (секунды)
+    wait_time: float = 0.0
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.searches / self.batches if self.batches else 0.0
+
+    @property
+    def request_reduction(self) -> float:
+        """Доля запросов к Elasticsearch, которые удалось не отправлять."""
+        return 1 - self.batches / self.searches if self.searches else 0.0
+
+    @property
+    def average_wait_time(self) -> float:
+        return self.wait_time / self.searches if self.searches else 0.0
+
+
+def get_item_error(item: dict) -> TransportError:
+    """Исключение клиента Elasticsearch для ответа с ошибкой внутри _msearch."""
+    status = item.get('status', 500)
+    error = item['error']
+    if isinstance(error, dict):
+        error = error.get('type', 'unknown')
+    return HTTP_EXCEPTIONS.get(status, TransportError)(status, error, item)
+
+
+class SearchBatcher:
+    """
+    Класс SearchBatcher объединяет поисковые запросы, пришедшие в течение
+    max_delay секунд (или до max_size запросов), в один запрос _msearch
+    и раздает ответы ожидающим корутинам.
+    """
+
+    def __init__(
+        self,
+        connection: AsyncElasticsearch,
+        max_delay: float,
+        max_size: int
+    ) -> None:
+        self.connection = connection
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self.stats = SearchBatcherStats()
+        self._pending: list[tuple[dict, dict, float, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def search(self, index: str, body: dict, request_cache: bool | None = None) -> dict:
+        header = {'index': index}
+        if request_cache is not None:
+            header['request_cache'] = request_cache
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((header, body, time.monotonic(), future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        now = time.monotonic()
+        self.stats.searches += len(batch)
+        self.stats.batches += 1
+        self.stats.max_batch_size = max(self.stats.max_batch_size, len(batch))
+        self.stats.wait_time += sum(now - queued_at for _, _, queued_at, _ in batch)
+
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[dict, dict, float, asyncio.Future]]) -> None:
+        body = []
+        for header, search_body, _, _ in batch:
+            body.extend((header, search_body))
+        try:
+            response = await self.connection.msearch(body=body)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), item in zip(batch, response['responses']):
+            if future.done():
+                continue
+            if 'error' in item:
+                future.set_exception(get_item_error(item))
+            else:
+                future.set_result(item)
+
+    async def close(self) -> None:
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info(
+            f'Объединение поисковых запросов: {self.stats.searches} запросов в '
+            f'{self.stats.batches} _msearch, сокращение {self.stats.request_reduction:.1%}, '
+            f'среднее ожидание {self.stats.average_wait_time * 1e3:.2f} мс'
+        )
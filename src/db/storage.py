@@ -1,8 +1,8 @@
-from db.elastic import ElasticStorage
+from db.elastic import IStorage
 
 
-es: ElasticStorage | None = None
+es: IStorage | None = None
 
 
-async def get_elastic() -> ElasticStorage:
+async def get_elastic() -> IStorage:
     return es
@@ -1,33 +1,125 @@
+import logging
+import math
 from contextlib import asynccontextmanager
+from http import HTTPStatus
 
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 
-from api.v1 import films, genres, persons
+from api.response_cache import ResponseCacheMiddleware
+from api.v1 import films, genres, persons, stats
 from core.config import settings
 
 from db.redis import RedisCache
+from db.local_cache import LocalCache, TwoTierCache
 from db.elastic import ElasticStorage
+from db.memory import InMemoryStorage
+from db.serializers import create_serializer
+from db.circuit_breaker import CircuitBreaker, CircuitBreakerStorage, StorageUnavailableError
 
 from db import cache
 from db import storage
 
+from services.cache_keys import RESPONSE_NAMESPACE
+from services.invalidation import RESOURCE_INDEXES, CacheInvalidationSubscriber
+from services.pagination import InvalidCursorError
+
+
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    cache.cache = RedisCache(
-        host=settings.redis_host, port=settings.redis_port
+    redis_cache = cache.cache = RedisCache(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        max_connections=settings.redis_max_connections,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_connect_timeout,
+        socket_keepalive=settings.redis_socket_keepalive,
+        retry_on_timeout=settings.redis_retry_on_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        compress_min_size=settings.cache_compress_min_size,
+        compress_level=settings.cache_compress_level
     )
-    storage.es = ElasticStorage(
-        hosts=[f'{settings.es_host}:{settings.es_port}', ]
+    if settings.local_cache_enabled:
+        cache.cache = TwoTierCache(
+            cache.cache,
+            LocalCache(
+                max_entries=settings.local_cache_max_entries,
+                max_bytes=settings.local_cache_max_bytes,
+                expired_time=settings.local_cache_expire_in_seconds
+            ),
+            # Ответы велики и в L1 пережили бы увеличение поколения индекса в ETL
+            remote_only_prefixes=(f'{RESPONSE_NAMESPACE}:',)
+        )
+    if settings.storage_backend == 'memory':
+        storage.es = InMemoryStorage.from_bulk_dump(
+            settings.storage_dump_path,
+            movies_index=settings.es_movies_index,
+            genres_index=settings.es_genres_index,
+            persons_index=settings.es_persons_index
+        )
+        await warm_up(redis_cache)
+    else:
+        elastic = storage.es = ElasticStorage(
+            search_batch_delay=(
+                settings.es_search_batch_delay_in_ms / 1000 if settings.es_search_batch_enabled else None
+            ),
+            search_batch_size=settings.es_search_batch_max_size,
+            hedge_budget=settings.es_hedge_budget if settings.es_hedging_enabled else None,
+            hedge_quantile=settings.es_hedge_quantile,
+            hedge_min_delay=settings.es_hedge_min_delay_in_ms / 1000,
+            hosts=[f'{settings.es_host}:{settings.es_port}', ],
+            maxsize=settings.es_max_connections,
+            timeout=settings.es_timeout,
+            max_retries=settings.es_max_retries,
+            retry_on_timeout=settings.es_retry_on_timeout,
+            http_compress=settings.es_http_compress,
+            sniff_on_start=settings.es_sniff_on_start,
+            sniff_on_connection_fail=settings.es_sniff_on_connection_fail,
+            sniffer_timeout=settings.es_sniffer_timeout,
+            serializer=create_serializer(settings.es_serializer)
+        )
+        await warm_up(redis_cache, elastic)
+        if settings.storage_breaker_enabled:
+            storage.es = CircuitBreakerStorage(
+                elastic,
+                CircuitBreaker(
+                    failure_rate=settings.storage_breaker_failure_rate,
+                    slow_call_time=settings.storage_breaker_slow_call_time,
+                    min_calls=settings.storage_breaker_min_calls,
+                    window=settings.storage_breaker_window,
+                    open_time=settings.storage_breaker_open_time
+                ),
+                call_timeout=settings.storage_call_timeout
+            )
+    invalidation = CacheInvalidationSubscriber(
+        cache.cache, redis_cache, settings.cache_invalidation_channel
     )
+    invalidation.start()
     yield
+    await invalidation.stop()
     await cache.cache.close()
     await storage.es.close()
 
 
+async def warm_up(redis_cache: RedisCache, es: ElasticStorage | None = None) -> None:
+    """Открывает соединения пулов до первых запросов. Ошибка не мешает запуску приложения."""
+    try:
+        await redis_cache.warm_up(settings.redis_warm_up_connections)
+    except Exception as e:
+        logger.warning(f'Не удалось открыть соединения с Redis при старте: {e}')
+    if es is None:
+        return
+    try:
+        await es.warm_up(settings.es_warm_up_connections)
+    except Exception as e:
+        logger.warning(f'Не удалось открыть соединения с Elasticsearch при старте: {e}')
+
+
 app = FastAPI(
     description='Информация о фильмах, жанрах и людях, участвовавших в создании произведения',
     version='1.0.0',
@@ -42,9 +134,39 @@ app = FastAPI(
 )
 
 
+if settings.response_cache_enabled:
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        get_cache=cache.get_cache,
+        indexes={f'/api/v1/{resource}': indexes for resource, indexes in RESOURCE_INDEXES.items()},
+        expired_time=settings.response_cache_expire_in_seconds,
+        max_age=settings.response_cache_max_age_in_seconds,
+        compress_min_size=settings.response_compress_min_size,
+        gzip_level=settings.response_gzip_level,
+        brotli_quality=settings.response_brotli_quality,
+        # Страница по курсору привязана к point-in-time, который закрывается после обхода
+        uncached_params=('cursor',)
+    )
+
+
+@app.exception_handler(StorageUnavailableError)
+async def storage_unavailable_handler(request: Request, exc: StorageUnavailableError) -> JSONResponse:
+    return JSONResponse(
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+        content={'detail': 'storage unavailable'},
+        headers={'Retry-After': str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError) -> JSONResponse:
+    return JSONResponse(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, content={'detail': str(exc)})
+
+
 app.include_router(films.router, prefix='/api/v1/films', tags=['films'])
 app.include_router(persons.router, prefix='/api/v1/persons', tags=['persons'])
 app.include_router(genres.router, prefix='/api/v1/genres', tags=['genres'])
+app.include_router(stats.router, prefix='/api/v1/stats', tags=['stats'])
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 import uuid
+from functools import lru_cache
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 
 
 class BaseProjectModel(BaseModel):
@@ -8,3 +9,27 @@ class BaseProjectModel(BaseModel):
 
     class Config:
         populate_by_name = True
+
+
+class BatchRequest(BaseModel):
+    """Тело запросов POST /api/v1/films/batch и /api/v1/persons/batch."""
+    ids: list[uuid.UUID]
+
+
+@lru_cache(maxsize=None)
+def projection_model(model: type[BaseModel], fields: tuple[str, ...] | None) -> type[BaseModel]:
+    """
+    Модель с подмножеством полей model (параметр fields в API), без fields - сама model.
+    Проекция наследует model, поэтому сохраняет типы, псевдонимы и валидаторы полей,
+    а остальные поля становятся необязательными и не сериализуются.
+    """
+    if fields is None:
+        return model
+    return create_model(
+        f'{model.__name__}Projection',
+        __base__=model,
+        **{
+            name: (info.annotation | None, Field(default=None, exclude=True))
+            for name, info in model.model_fields.items() if name not in fields
+        }
+    )
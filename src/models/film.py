@@ -38,3 +38,12 @@ class Film(FilmShort):
     actors: list[IdName] | None = None
     writers: list[IdName] | None = None
     directors: list[IdName] | None = None
+
+
+class FilmsBatch(BaseModel):
+    """
+    Схема ответа для:
+    /api/v1/films/batch
+    """
+    films: list[Film]
+    not_found: list[uuid.UUID]
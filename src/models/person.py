@@ -1,3 +1,7 @@
+import uuid
+
+from pydantic import BaseModel
+
 from models.film import BaseProjectModel
 
 
@@ -15,3 +19,12 @@ class Person(BaseProjectModel):
     """
     full_name: str
     films: list[PersonRoles]
+
+
+class PersonsBatch(BaseModel):
+    """
+    Схема ответа для:
+    /api/v1/persons/batch
+    """
+    persons: list[Person]
+    not_found: list[uuid.UUID]
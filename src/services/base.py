@@ -0,0 +1,424 @@
+import asyncio
+import logging
+import math
+import random
+import struct
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable
+
+from pydantic import BaseModel
+
+from core.config import settings
+from db.circuit_breaker import StorageUnavailableError
+from db.redis import ICache
+from models.base import projection_model
+from services.cache_keys import CacheKey, generation_key
+from services.codecs import CodecError, ICodec, create_codec
+from services.single_flight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+# Заголовок записи кеша: версия формата, момент, до которого значение считается свежим,
+# момент, после которого оно отдается только при недоступности хранилища,
+# и время его пересчета в хранилище (секунды)
+ENTRY_VERSION = 3
+ENTRY_HEADER = struct.Struct('!Bddf')
+
+# Значение из кеша для сущности, которой нет в хранилище (негативное кеширование)
+NOT_FOUND = object()
+
+# Время, на которое воркер запоминает поколение индекса (секунды)
+GENERATION_CACHE_EXPIRE_IN_SECONDS = 1
+
+
+def pack_entry(
+    value: str | bytes,
+    fresh_until: float,
+    cost: float = 0.0,
+    expire_at: float = math.inf
+) -> bytes:
+    """expire_at - конец срока жизни значения, если запись хранится в кеше дольше него."""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return ENTRY_HEADER.pack(ENTRY_VERSION, fresh_until, expire_at, cost) + value
+
+
+def unpack_entry(data: bytes) -> tuple[float, float, float, bytes] | None:
+    """
+    Возвращает момент устаревания, конец срока жизни, время пересчета и полезную
+    нагрузку, либо None для записи неизвестного формата.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if len(data) < ENTRY_HEADER.size or data[0] != ENTRY_VERSION:
+        return None
+    _, fresh_until, expire_at, cost = ENTRY_HEADER.unpack_from(data)
+    return fresh_until, expire_at, cost, data[ENTRY_HEADER.size:]
+
+
+def should_refresh_early(
+    now: float,
+    fresh_until: float,
+    cost: float,
+    beta: float,
+    rand: float | None = None
+) -> bool:
+    """
+    Вероятностное досрочное обновление (XFetch): чем ближе момент устаревания
+    и чем дороже пересчет значения, тем выше вероятность обновить его заранее.
+    """
+    # 1 - random() лежит в (0, 1], логарифм определен
+    rand = 1.0 - random.random() if rand is None else rand
+    return now - cost * beta * math.log(rand) >= fresh_until
+
+
+@dataclass
+class CacheStats:
+    """Статистика обращений к кешу по одному пространству имен ключей."""
+    hits: int = 0
+    stale_hits: int = 0
+    early_refreshes: int = 0
+    misses: int = 0
+    shadow_hits: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class BaseCacheHandler:
+    """
+    Класс BaseCacheHandler - общая логика обработчиков кеша.
+
+    Поддерживает режим stale-while-revalidate: запись живет в кеше expired_time секунд
+    (жесткий TTL), но свежей считается только refresh_time секунд (мягкий TTL).
+    После мягкого TTL устаревшее значение сразу отдается клиенту, а обновление
+    из хранилища выполняется одной фоновой задачей.
+
+    Отсутствие сущности в хранилище кешируется пустой записью на not_found_time секунд.
+
+    Если задан early_refresh_beta, свежее значение может быть обновлено в фоне досрочно
+    по алгоритму XFetch, чтобы горячие ключи не устаревали во всех воркерах одновременно.
+
+    Ключи списков включают поколение индекса (см. get_generation), поэтому для них
+    можно задать отдельные, более длинные list_expired_time и list_refresh_time.
+
+    Полные значения сущностей по идентификатору (film_key, person_key, genre_key) из put_value
+    хранятся в кеше shadow_time секунд, если это дольше expired_time. После expired_time запись
+    считается отсутствующей и отдается только через get_shadow, когда хранилище недоступно.
+    Списки и проекции включают поколение индекса и после его увеличения не читаются,
+    поэтому хранятся только expired_time.
+
+    Значения ключей с полями проекции (CacheKey.fields) кодируются моделью проекции.
+    """
+
+    model: type[BaseModel]
+    # Модель элементов списков, если списки хранятся в сокращенном виде
+    list_model: type[BaseModel] | None = None
+
+    def __init__(
+        self,
+        cache: ICache,
+        expired_time: int,
+        refresh_time: int | None = None,
+        not_found_time: int | None = None,
+        early_refresh_beta: float | None = None,
+        list_expired_time: int | None = None,
+        list_refresh_time: int | None = None,
+        shadow_time: int | None = None,
+        codec: ICodec | None = None
+    ) -> None:
+        self.cache = cache
+        self.codec = codec or create_codec(settings.cache_codec, self.model)
+        self.list_codec = (
+            create_codec(settings.cache_codec, self.list_model) if self.list_model else self.codec
+        )
+        self.expired_time = expired_time
+        self.refresh_time = refresh_time or expired_time
+        self.not_found_time = not_found_time
+        self.early_refresh_beta = early_refresh_beta
+        self.list_expired_time = list_expired_time or self.expired_time
+        self.list_refresh_time = list_refresh_time or self.refresh_time
+        self.shadow_time = (
+            settings.cache_shadow_expire_in_seconds if shadow_time is None else shadow_time
+        )
+        self.stats: dict[str, CacheStats] = {}
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._generations: dict[str, tuple[float, int]] = {}
+        self._projection_codecs: dict[tuple[bool, tuple[str, ...]], ICodec] = {}
+
+    def key_codec(self, key: CacheKey) -> ICodec:
+        """Кодек значений ключа: списков, отдельных значений или их проекции."""
+        if key.fields is None:
+            return self.list_codec if key.many else self.codec
+        codec = self._projection_codecs.get((key.many, key.fields))
+        if codec is None:
+            codec = self.list_codec if key.many else self.codec
+            codec = type(codec)(projection_model(codec.model, key.fields))
+            self._projection_codecs[(key.many, key.fields)] = codec
+        return codec
+
+    async def get_value(
+        self,
+        key: CacheKey,
+        refresh: Callable[[], Awaitable[Any]] | None = None
+    ) -> Any:
+        data = await self.get(key, refresh)
+        if data is None:
+            return None
+        if not data:
+            return NOT_FOUND
+        try:
+            return self.key_codec(key).decode(data, key.many)
+        except CodecError:
+            return None
+
+    async def put_value(self, key: CacheKey, value: Any, cost: float = 0.0) -> None:
+        data = self.key_codec(key).encode(value)
+        if key.many:
+            await self.put(key, data, self.list_expired_time, cost, self.list_refresh_time)
+        else:
+            await self.put(key, data, cost=cost, shadow=key.fields is None)
+
+    async def get_shadow(self, key: CacheKey) -> Any:
+        """Последнее известное значение, независимо от срока его жизни (см. put_value)."""
+        data = await self.cache.get(str(key))
+        entry = unpack_entry(data) if data else None
+        if entry is None or not entry[3]:
+            return None
+        try:
+            value = self.key_codec(key).decode(entry[3], key.many)
+        except CodecError:
+            return None
+        self.stats.setdefault(key.namespace, CacheStats()).shadow_hits += 1
+        return value
+
+    async def get_items(self, keys: list[CacheKey], codec: ICodec | None = None) -> list[Any]:
+        """
+        Читает значения, хранящиеся по отдельным ключам, одним запросом: по умолчанию
+        элементы списков (list_codec). Для отсутствующих и устаревших значений возвращает None,
+        для сущностей, которых нет в хранилище, - NOT_FOUND.
+        """
+        codec = codec or self.list_codec
+        values = await self.cache.get_many([str(key) for key in keys])
+        now = time.time()
+        items = []
+        for key, data in zip(keys, values):
+            stats = self.stats.setdefault(key.namespace, CacheStats())
+            entry = unpack_entry(data) if data else None
+            item = None
+            if entry is not None and entry[0] > now:
+                if not entry[3]:
+                    item = NOT_FOUND
+                else:
+                    try:
+                        item = codec.decode(entry[3], many=False)
+                    except CodecError:
+                        pass
+            if item is None:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+            items.append(item)
+        return items
+
+    async def put_items(self, items: dict[CacheKey, Any], codec: ICodec | None = None) -> None:
+        if not items:
+            return
+        codec = codec or self.list_codec
+        fresh_until = time.time() + self.refresh_time
+        await self.cache.set_many(
+            {
+                str(key): pack_entry(codec.encode(item), fresh_until)
+                for key, item in items.items()
+            },
+            self.expired_time
+        )
+
+    async def put_not_found(self, key: CacheKey) -> None:
+        """Запоминает, что сущности нет в хранилище. Пустая запись не пересекается с форматом кодеков."""
+        if self.not_found_time:
+            await self.put(key, b'', self.not_found_time)
+
+    async def put_not_found_items(self, keys: list[CacheKey]) -> None:
+        """Запоминает отсутствие в хранилище нескольких сущностей одним запросом (см. put_not_found)."""
+        if not keys or not self.not_found_time:
+            return
+        fresh_until = time.time() + self.not_found_time
+        await self.cache.set_many(
+            {str(key): pack_entry(b'', fresh_until) for key in keys}, self.not_found_time
+        )
+
+    async def get(
+        self,
+        key: CacheKey,
+        refresh: Callable[[], Awaitable[Any]] | None = None
+    ) -> bytes | None:
+        stats = self.stats.setdefault(key.namespace, CacheStats())
+
+        entry = None
+        data = await self.cache.get(str(key))
+        if data:
+            entry = unpack_entry(data)
+        if entry is None:
+            stats.misses += 1
+            return None
+
+        fresh_until, expire_at, cost, payload = entry
+        now = time.time()
+        if expire_at <= now:
+            # Запись хранится только как копия для get_shadow
+            stats.misses += 1
+            return None
+        if fresh_until <= now:
+            if refresh is None:
+                stats.misses += 1
+                return None
+            stats.stale_hits += 1
+            self._schedule_refresh(str(key), refresh)
+        elif (
+            refresh is not None
+            and self.early_refresh_beta
+            and should_refresh_early(now, fresh_until, cost, self.early_refresh_beta)
+        ):
+            stats.early_refreshes += 1
+            self._schedule_refresh(str(key), refresh)
+        stats.hits += 1
+        return payload
+
+    async def put(
+        self,
+        key: CacheKey,
+        value: str | bytes,
+        expired_time: int | None = None,
+        cost: float = 0.0,
+        refresh_time: int | None = None,
+        shadow: bool = False
+    ) -> None:
+        """Если shadow, запись хранится и после expired_time, как копия для get_shadow."""
+        expired_time = expired_time or self.expired_time
+        refresh_time = min(refresh_time or self.refresh_time, expired_time)
+        now = time.time()
+        entry = pack_entry(value, now + refresh_time, cost, now + expired_time)
+        await self.cache.set(
+            str(key), entry, max(expired_time, self.shadow_time) if shadow else expired_time
+        )
+
+    async def get_generation(self, index: str) -> int:
+        """
+        Возвращает поколение индекса. ETL увеличивает его после синхронизации,
+        значение запоминается воркером на GENERATION_CACHE_EXPIRE_IN_SECONDS.
+        """
+        now = time.monotonic()
+        cached = self._generations.get(index)
+        if cached and cached[0] > now:
+            return cached[1]
+        generation = await self.cache.get_counter(str(generation_key(index)))
+        self._generations[index] = (now + GENERATION_CACHE_EXPIRE_IN_SECONDS, generation)
+        return generation
+
+    def _schedule_refresh(
+        self,
+        key: str,
+        refresh: Callable[[], Awaitable[Any]]
+    ) -> None:
+        if key in self._refresh_tasks:
+            return
+        task = asyncio.ensure_future(refresh())
+        self._refresh_tasks[key] = task
+        task.add_done_callback(lambda done: self._on_refreshed(key, done))
+
+    def _on_refreshed(self, key: str, task: asyncio.Task) -> None:
+        del self._refresh_tasks[key]
+        if not task.cancelled() and task.exception():
+            logger.error(f'Ошибка фонового обновления кеша {key}: {task.exception()}')
+
+
+class BaseService:
+    """
+    Класс BaseService - общая логика сервисов: чтение из кеша и загрузка промахов
+    из хранилища. Сервисы передают в _get только ключ и функцию загрузки значения.
+
+    Одновременные промахи по одному ключу загружаются одним запросом (single-flight),
+    отсутствие сущности кешируется (см. BaseCacheHandler.put_not_found), а при
+    недоступности хранилища отдается последняя известная копия значения.
+    """
+
+    def __init__(self, cache_handler: BaseCacheHandler, storage_handler: Any) -> None:
+        self.cache_handler = cache_handler
+        self.storage_handler = storage_handler
+        self.single_flight = SingleFlight()
+
+    async def _get(self, key: CacheKey, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Читает значение из кеша, при промахе загружает его из хранилища через single-flight."""
+        load = partial(self.single_flight.do, str(key), partial(self._load, key, fetch))
+        value = await self.cache_handler.get_value(key, load)
+        if value is NOT_FOUND:
+            return None
+        if not value:
+            value = await load()
+        return value
+
+    async def _load(self, key: CacheKey, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        try:
+            value = await fetch()
+        except StorageUnavailableError:
+            # Хранилище недоступно: отдаем последнюю известную копию, если она есть
+            value = await self.cache_handler.get_shadow(key)
+            if value is None:
+                raise
+            return value
+        if not value:
+            if key.many:
+                return []
+            await self.cache_handler.put_not_found(key)
+            return None
+
+        await self.cache_handler.put_value(key, value, time.monotonic() - started)
+        return value
+
+    async def _get_items(
+        self,
+        ids: list[Any],
+        item_key: Callable[[Any], CacheKey],
+        fetch: Callable[[list[str]], Awaitable[list[BaseModel] | None]],
+        codec: ICodec | None = None
+    ) -> list[Any]:
+        """
+        Сущности, которые кешируются по отдельным ключам item_key(id), в порядке ids,
+        None - для отсутствующих в хранилище. Записи кеша читаются одним запросом,
+        промахи загружаются из хранилища одним запросом fetch(ids) через single-flight.
+        """
+        keys = [item_key(id) for id in ids]
+        items = await self.cache_handler.get_items(keys, codec)
+
+        missing = {str(key): str(id) for id, key, item in zip(ids, keys, items) if item is None}
+        if missing:
+            loaded = await self.single_flight.do_many(
+                list(missing), partial(self._load_items, missing, item_key, fetch, codec)
+            )
+            loaded_by_key = dict(zip(missing, loaded))
+            items = [loaded_by_key.get(str(key), item) for key, item in zip(keys, items)]
+        return [None if item is NOT_FOUND else item for item in items]
+
+    async def _load_items(
+        self,
+        ids_by_key: dict[str, str],
+        item_key: Callable[[Any], CacheKey],
+        fetch: Callable[[list[str]], Awaitable[list[BaseModel] | None]],
+        codec: ICodec | None,
+        keys: list[str]
+    ) -> dict[str, Any]:
+        loaded = await fetch([ids_by_key[key] for key in keys]) or []
+        items = {item_key(item.id): item for item in loaded}
+        await self.cache_handler.put_items(items, codec)
+        found = {str(key) for key in items}
+        await self.cache_handler.put_not_found_items(
+            [item_key(ids_by_key[key]) for key in keys if key not in found]
+        )
+        return {str(key): item for key, item in items.items()}
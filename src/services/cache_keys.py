@@ -0,0 +1,173 @@
+import hashlib
+import uuid
+from urllib.parse import parse_qsl, urlencode
+from dataclasses import dataclass
+from typing import Any
+
+
+# Часть ключа длиннее этого значения заменяется хешем
+MAX_KEY_LENGTH = 128
+# Пространство имен готовых HTTP-ответов (см. response_key)
+RESPONSE_NAMESPACE = 'response'
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """
+    Ключ кеша: пространство имен эндпоинта, итоговая строка ключа, признак списка
+    и поля проекции (параметр fields в API), None - значение с полным набором полей.
+    """
+    namespace: str
+    value: str
+    many: bool = False
+    fields: tuple[str, ...] | None = None
+
+    def __str__(self) -> str:
+        return self.value
+
+
+def build_key(
+    namespace: str,
+    *parts: Any,
+    many: bool = False,
+    generation: int | None = None,
+    fields: tuple[str, ...] | None = None
+) -> CacheKey:
+    """
+    Строит ключ вида namespace:tail. Ключи списков включают поколение индекса:
+    после его увеличения все ранее закешированные списки становятся недоступны.
+
+    Проекция хранится под собственным ключом и не вытесняет полное значение.
+    """
+    if fields is not None:
+        parts = (*parts, 'fields=' + ','.join(fields))
+    tail = '/'.join(str(part) for part in parts)
+    if len(tail) > MAX_KEY_LENGTH:
+        tail = hashlib.sha1(tail.encode('utf-8')).hexdigest()
+    if generation is not None:
+        tail = f'g{generation}:{tail}'
+    return CacheKey(namespace, f'{namespace}:{tail}', many, fields)
+
+
+def generation_key(index: str) -> CacheKey:
+    """Счетчик поколения индекса, его увеличивает ETL после синхронизации (см. etl/cache.py)."""
+    return build_key('generation', index)
+
+
+def film_key(
+    film_id: uuid.UUID,
+    fields: tuple[str, ...] | None = None,
+    generation: int = 0
+) -> CacheKey:
+    """
+    Ключ фильма. Записи проекций нельзя перечислить при удалении по идентификатору,
+    поэтому они включают поколение индекса, как списки.
+    """
+    if fields is None:
+        return build_key('film', film_id)
+    return build_key('film', film_id, generation=generation, fields=fields)
+
+
+def films_search_key(
+    query: str,
+    page_size: int,
+    page_number: int,
+    generation: int = 0,
+    fields: tuple[str, ...] | None = None
+) -> CacheKey:
+    return build_key(
+        'films:search', query, page_size, page_number, many=True, generation=generation, fields=fields
+    )
+
+
+def films_sort_key(
+    sort: str,
+    page_size: int,
+    page_number: int,
+    generation: int = 0,
+    fields: tuple[str, ...] | None = None
+) -> CacheKey:
+    return build_key(
+        'films:sort', sort, page_size, page_number, many=True, generation=generation, fields=fields
+    )
+
+
+def films_genre_key(
+    genre_id: uuid.UUID,
+    sort: str,
+    page_size: int,
+    page_number: int,
+    generation: int = 0,
+    fields: tuple[str, ...] | None = None
+) -> CacheKey:
+    return build_key(
+        'films:genre', genre_id, sort, page_size, page_number, many=True, generation=generation, fields=fields
+    )
+
+
+def film_short_key(film_id: uuid.UUID | str) -> CacheKey:
+    """Краткая информация о фильме для списков, общая для фильмографий разных персон."""
+    return build_key('film:short', film_id)
+
+
+def person_key(
+    person_id: uuid.UUID,
+    fields: tuple[str, ...] | None = None,
+    generation: int = 0
+) -> CacheKey:
+    if fields is None:
+        return build_key('person', person_id)
+    return build_key('person', person_id, generation=generation, fields=fields)
+
+
+def persons_search_key(
+    query: str,
+    page_size: int,
+    page_number: int,
+    generation: int = 0,
+    fields: tuple[str, ...] | None = None
+) -> CacheKey:
+    return build_key(
+        'persons:search', query, page_size, page_number, many=True, generation=generation, fields=fields
+    )
+
+
+def genre_key(
+    genre_id: uuid.UUID,
+    fields: tuple[str, ...] | None = None,
+    generation: int = 0
+) -> CacheKey:
+    if fields is None:
+        return build_key('genre', genre_id)
+    return build_key('genre', genre_id, generation=generation, fields=fields)
+
+
+def genres_key(generation: int = 0, fields: tuple[str, ...] | None = None) -> CacheKey:
+    return build_key('genres', 'all', many=True, generation=generation, fields=fields)
+
+
+def response_key(
+    path: str,
+    query_string: bytes | str = b'',
+    generations: tuple[int, ...] = ()
+) -> CacheKey:
+    """
+    Ключ готового HTTP-ответа: путь и параметры запроса, отсортированные по имени.
+    Повторяющиеся параметры (например, ids) сохраняют свой порядок: от него зависит ответ.
+    generations - поколения индексов, из которых собран ответ: после их увеличения
+    в ETL закешированные ответы становятся недоступны, как списки.
+    """
+    if isinstance(query_string, bytes):
+        query_string = query_string.decode('latin-1')
+    pairs = parse_qsl(query_string, keep_blank_values=True)
+    query = urlencode(sorted(pairs, key=lambda pair: pair[0]))
+    return build_key(RESPONSE_NAMESPACE, *(f'g{generation}' for generation in generations), path, query)
+
+
+def detail_response_key(
+    resource: str,
+    id: uuid.UUID,
+    generations: tuple[int, ...] = ()
+) -> CacheKey:
+    """Ключ ответа эндпоинта /api/v1/<resource>/<id> без параметров запроса."""
+    return response_key(f'/api/v1/{resource}/{id}', generations=generations)
@@ -0,0 +1,87 @@
+import logging
+from abc import ABC, abstractmethod
+
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class CodecError(ValueError):
+    pass
+
+
+class ICodec(ABC):
+    """
+    Кодек значений кеша. Значение (модель или список моделей) хранится одним
+    сериализованным блоком с байтом версии формата в начале.
+    """
+
+    version: int
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        self.model = model
+        self._one = TypeAdapter(model)
+        self._many = TypeAdapter(list[model])
+
+    def encode(self, value: BaseModel | list[BaseModel]) -> bytes:
+        return bytes((self.version,)) + self._encode(value)
+
+    def decode(self, data: bytes, many: bool) -> BaseModel | list[BaseModel]:
+        if not data or data[0] != self.version:
+            raise CodecError(f'Неизвестная версия формата кеша для {self.model.__name__}')
+        return self._decode(memoryview(data)[1:], many)
+
+    @abstractmethod
+    def _encode(self, value: BaseModel | list[BaseModel]) -> bytes:
+        pass
+
+    @abstractmethod
+    def _decode(self, payload: memoryview, many: bool) -> BaseModel | list[BaseModel]:
+        pass
+
+
+class JsonCodec(ICodec):
+    """Класс JsonCodec хранит значение одним JSON-документом, список разбирается за один проход."""
+
+    version = 1
+
+    def _encode(self, value: BaseModel | list[BaseModel]) -> bytes:
+        adapter = self._many if isinstance(value, list) else self._one
+        return adapter.dump_json(value)
+
+    def _decode(self, payload: memoryview, many: bool) -> BaseModel | list[BaseModel]:
+        adapter = self._many if many else self._one
+        return adapter.validate_json(bytes(payload))
+
+
+class MsgpackCodec(ICodec):
+    """Класс MsgpackCodec хранит значение в формате msgpack."""
+
+    version = 2
+
+    def _encode(self, value: BaseModel | list[BaseModel]) -> bytes:
+        adapter = self._many if isinstance(value, list) else self._one
+        return msgpack.packb(adapter.dump_python(value, mode='json'))
+
+    def _decode(self, payload: memoryview, many: bool) -> BaseModel | list[BaseModel]:
+        adapter = self._many if many else self._one
+        return adapter.validate_python(msgpack.unpackb(payload))
+
+
+CODECS: dict[str, type[ICodec]] = {
+    'json': JsonCodec,
+    'msgpack': MsgpackCodec,
+}
+
+
+def create_codec(name: str, model: type[BaseModel]) -> ICodec:
+    if name == 'msgpack' and msgpack is None:
+        logger.warning('Пакет msgpack не установлен, для кеша используется кодек json')
+        name = 'json'
+    return CODECS[name](model)
@@ -1,7 +1,7 @@
-import json
 import uuid
-from functools import lru_cache
-from typing import Any
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import AsyncIterator
 from abc import ABC, abstractmethod
 
 from fastapi import Depends
@@ -10,24 +10,45 @@ from db.cache import get_cache
 from db.redis import ICache
 from db.storage import get_elastic
 from db.elastic import ElasticStorage, IStorage
-from models.film import Film
+from db.query_builder import BY_SCORE, TIE_BREAKER, FuzzyMatch, NestedTerm, SearchQuery, Sort
+from models.base import projection_model
+from models.film import Film, FilmShort
 from models.person import Person
 from core.config import settings
+from services.base import BaseCacheHandler, BaseService
+from services.cache_keys import (
+    film_key,
+    film_short_key,
+    films_genre_key,
+    films_search_key,
+    films_sort_key
+)
+from services.pagination import Cursor, export_query, scan, search_page
 
 
-FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 минут
+FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 15  # 15 минут
+FILM_CACHE_REFRESH_IN_SECONDS = 60 * 5  # 5 минут
+FILM_NOT_FOUND_CACHE_EXPIRE_IN_SECONDS = 60  # 1 минута
+
+# Поля документа, которые запрашиваются у хранилища для списков фильмов
+FILM_SHORT_FIELDS = list(FilmShort.model_fields)
 
 
 def calculate_offset(page_size: int, page_number: int) -> int:
     return (page_number - 1) * page_size
 
 
-def get_sort_field(sort: str) -> str:
-    return sort[1:] if sort.startswith('-') else sort
+def get_sort(sort: str) -> list[Sort]:
+    return [Sort.parse(sort), TIE_BREAKER]
+
+
+def get_genre_filter(genre_id: uuid.UUID) -> NestedTerm:
+    return NestedTerm('genres', 'id', genre_id)
 
 
-def get_sort_order(sort: str) -> str:
-    return 'desc' if sort.startswith('-') else 'asc'
+def get_short_fields(fields: tuple[str, ...] | None) -> list[str]:
+    """Поля документа для списков фильмов: проекция из параметра fields или поля FilmShort."""
+    return FILM_SHORT_FIELDS if fields is None else list(fields)
 
 
 class StorageFilmHandler(ABC):
@@ -40,7 +61,8 @@ class StorageFilmHandler(ABC):
     @abstractmethod
     async def get_film_by_id(
         self,
-        film_id: uuid.UUID
+        film_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
     ) -> Film | None:
         pass
 
@@ -49,8 +71,9 @@ class StorageFilmHandler(ABC):
         self,
         query: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film] | None:
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort] | None:
         pass
 
     @abstractmethod
@@ -58,8 +81,9 @@ class StorageFilmHandler(ABC):
         self,
         sort: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film] | None:
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort] | None:
         pass
 
     @abstractmethod
@@ -68,36 +92,60 @@ class StorageFilmHandler(ABC):
         genre_id: uuid.UUID,
         sort: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film] | None:
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort] | None:
         pass
 
     @abstractmethod
     async def get_films_by_ids(
         self,
         film_ids: list[str]
+    ) -> list[FilmShort] | None:
+        pass
+
+    @abstractmethod
+    async def get_full_films_by_ids(
+        self,
+        film_ids: list[str]
     ) -> list[Film] | None:
         pass
 
+    @abstractmethod
+    async def get_films_by_query_after(
+        self,
+        query: str,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[FilmShort], Cursor | None]:
+        pass
 
-class CacheFilmHandler:
-    """Класс CacheFilmHandler отвечает за работу с кешом по информации о фильмах."""
+    @abstractmethod
+    async def get_films_with_sort_after(
+        self,
+        sort: str,
+        genre_id: uuid.UUID | None,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[FilmShort], Cursor | None]:
+        pass
 
-    def __init__(self, cache: ICache, expired_time: int) -> None:
-        self.cache = cache
-        self.expired_time = expired_time
+    @abstractmethod
+    def export_films(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Film]]:
+        pass
 
-    async def get_film(self, key: str) -> None | Film | list[Film] | Any:
-        data = await self.cache.get(key)
-        if not data:
-            return None
 
-        if '/' not in key:
-            return Film.model_validate_json(data)
-        return [Film.model_validate_json(obj) for obj in json.loads(data)]
+class CacheFilmHandler(BaseCacheHandler):
+    """Класс CacheFilmHandler отвечает за работу с кешом по информации о фильмах."""
 
-    async def put_film(self, key: str, value: Any):
-        await self.cache.set(key, value, self.expired_time)
+    model = Film
+    list_model = FilmShort
 
 
 class ElasticFilmHandler(StorageFilmHandler):
@@ -108,223 +156,297 @@ class ElasticFilmHandler(StorageFilmHandler):
 
     async def get_film_by_id(
         self,
-        film_id: uuid.UUID
+        film_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
     ) -> Film | None:
         doc = await self.storage.get_by_id(
-            index=settings.es_movies_index, id=str(film_id)
+            index=settings.es_movies_index,
+            id=str(film_id),
+            fields=list(fields) if fields is not None else None
         )
         if not doc:
             return None
-        return Film(**doc)
+        return projection_model(Film, fields)(**doc)
 
     async def get_films_by_query(
         self,
         query: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film] | None:
-        elastic_query = {
-            'query': {
-                'fuzzy': {
-                    'title': {
-                        'value': query,
-                        'fuzziness': 'AUTO'
-                    }
-                }
-            },
-            'size': page_size,
-            'from': calculate_offset(page_size, page_number)
-        }
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort] | None:
+        search_query = SearchQuery(
+            match=FuzzyMatch('title', query),
+            size=page_size,
+            offset=calculate_offset(page_size, page_number)
+        )
 
         docs = await self.storage.search(
-            index=settings.es_movies_index, body=elastic_query
+            index=settings.es_movies_index,
+            body=search_query.to_body(),
+            fields=get_short_fields(fields),
+            request_cache=search_query.request_cache
         )
         if not docs:
             return None
-        return [Film(**doc) for doc in docs]
+        model = projection_model(FilmShort, fields)
+        return [model(**doc) for doc in docs]
 
     async def get_films_with_sort(
         self,
         sort: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film] | None:
-        elastic_query = {
-            'sort': [
-                {
-                    get_sort_field(sort): {
-                        'order': get_sort_order(sort)
-                    }
-                }
-            ],
-            'size': page_size,
-            'from': calculate_offset(page_size, page_number)
-        }
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort] | None:
+        search_query = SearchQuery(
+            sort=get_sort(sort),
+            size=page_size,
+            offset=calculate_offset(page_size, page_number)
+        )
 
         docs = await self.storage.search(
-            index=settings.es_movies_index, body=elastic_query
+            index=settings.es_movies_index,
+            body=search_query.to_body(),
+            fields=get_short_fields(fields),
+            request_cache=search_query.request_cache
         )
         if not docs:
             return None
-        return [Film(**doc) for doc in docs]
+        model = projection_model(FilmShort, fields)
+        return [model(**doc) for doc in docs]
 
     async def get_films_by_genre_id_with_sort(
         self,
         genre_id: uuid.UUID,
         sort: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film] | None:
-        elastic_query = {
-            'query': {
-                'nested': {
-                    'path': 'genres',
-                    'query': {
-                        'match': {
-                            'genres.id': genre_id
-                        }
-                    }
-                }
-            },
-            'sort': [
-                {
-                    get_sort_field(sort): {
-                        'order': get_sort_order(sort)
-                    }
-                }
-            ],
-            'size': page_size,
-            'from': calculate_offset(page_size, page_number)
-        }
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort] | None:
+        search_query = SearchQuery(
+            filters=[get_genre_filter(genre_id)],
+            sort=get_sort(sort),
+            size=page_size,
+            offset=calculate_offset(page_size, page_number)
+        )
 
         docs = await self.storage.search(
-            index=settings.es_movies_index, body=elastic_query
+            index=settings.es_movies_index,
+            body=search_query.to_body(),
+            fields=get_short_fields(fields),
+            request_cache=search_query.request_cache
         )
         if not docs:
             return None
-        return [Film(**doc) for doc in docs]
+        model = projection_model(FilmShort, fields)
+        return [model(**doc) for doc in docs]
 
     async def get_films_by_ids(
         self,
         film_ids: list[str],
-    ) -> list[Film] | None:
-        elastic_query = {
-            'query': {
-                'ids': {
-                    'values': film_ids
-                }
-            }
-        }
-
-        docs = await self.storage.search(
-            index=settings.es_movies_index, body=elastic_query
+    ) -> list[FilmShort] | None:
+        docs = await self.storage.get_by_ids(
+            index=settings.es_movies_index, ids=film_ids, fields=FILM_SHORT_FIELDS
         )
+        if not docs:
+            return None
+        return [FilmShort(**doc) for doc in docs]
+
+    async def get_full_films_by_ids(
+        self,
+        film_ids: list[str],
+    ) -> list[Film] | None:
+        docs = await self.storage.get_by_ids(index=settings.es_movies_index, ids=film_ids)
         if not docs:
             return None
         return [Film(**doc) for doc in docs]
 
+    async def get_films_by_query_after(
+        self,
+        query: str,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[FilmShort], Cursor | None]:
+        search_query = SearchQuery(
+            match=FuzzyMatch('title', query),
+            sort=[BY_SCORE, TIE_BREAKER],
+            size=page_size
+        )
 
-class FilmService:
-    """Класс FilmService содержит бизнес-логику по работе с фильмами."""
+        docs, next_cursor = await search_page(
+            self.storage,
+            settings.es_movies_index,
+            search_query.to_body(),
+            cursor,
+            get_short_fields(fields)
+        )
+        model = projection_model(FilmShort, fields)
+        return [model(**doc) for doc in docs], next_cursor
 
-    def __init__(
+    async def get_films_with_sort_after(
         self,
-        cache_handler: CacheFilmHandler,
-        storage_handler: ElasticFilmHandler
-    ) -> None:
-        self.cache_handler = cache_handler
-        self.storage_handler = storage_handler
+        sort: str,
+        genre_id: uuid.UUID | None,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[FilmShort], Cursor | None]:
+        search_query = SearchQuery(
+            filters=[get_genre_filter(genre_id)] if genre_id else [],
+            sort=get_sort(sort),
+            size=page_size
+        )
 
-    async def get_film_by_id(self, film_id: uuid.UUID) -> Film | None:
-        film = await self.cache_handler.get_film(str(film_id))
-        if not film:
-            film = await self.storage_handler.get_film_by_id(film_id)
-            if not film:
-                return None
+        docs, next_cursor = await search_page(
+            self.storage,
+            settings.es_movies_index,
+            search_query.to_body(),
+            cursor,
+            get_short_fields(fields)
+        )
+        model = projection_model(FilmShort, fields)
+        return [model(**doc) for doc in docs], next_cursor
 
-            await self.cache_handler.put_film(film.model_dump_json(), str(film_id))
+    async def export_films(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Film]]:
+        """Страницы всех фильмов, fields - проекция документа (см. projection_model)."""
+        model = projection_model(Film, fields)
+        async for docs in scan(
+            self.storage,
+            settings.es_movies_index,
+            export_query(since).to_body(),
+            list(fields) if fields is not None else None
+        ):
+            yield [model(**doc) for doc in docs]
+
+
+class FilmService(BaseService):
+    """Класс FilmService содержит бизнес-логику по работе с фильмами."""
 
-        return film
+    cache_handler: CacheFilmHandler
+    storage_handler: StorageFilmHandler
+
+    async def get_film_by_id(
+        self,
+        film_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
+    ) -> Film | None:
+        """Проекция fields загружается из хранилища только с этими полями и кешируется отдельно."""
+        if fields is None:
+            key = film_key(film_id)
+        else:
+            generation = await self.cache_handler.get_generation(settings.es_movies_index)
+            key = film_key(film_id, fields, generation)
+        return await self._get(
+            key, partial(self.storage_handler.get_film_by_id, film_id, fields)
+        )
 
     async def get_films_by_query(
         self,
         query: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film]:
-        key = f'{query}/{page_size}/{page_number}'
-        films = await self.cache_handler.get_film(key)
-        if not films:
-            films = await self.storage_handler.get_films_by_query(
-                query, page_size, page_number
-            )
-
-            if not films:
-                return []
-            value = json.dumps([film.model_dump_json() for film in films])
-            await self.cache_handler.put_film(key, value)
-
-        return films
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort]:
+        generation = await self.cache_handler.get_generation(settings.es_movies_index)
+        key = films_search_key(query, page_size, page_number, generation, fields)
+        return await self._get(
+            key,
+            partial(self.storage_handler.get_films_by_query, query, page_size, page_number, fields)
+        )
 
     async def get_films_with_sort(
         self,
         sort: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film]:
-        key = f'{sort}/{page_size}/{page_number}'
-        films = await self.cache_handler.get_film(key)
-        if not films:
-            films = await self.storage_handler.get_films_with_sort(
-                sort, page_size, page_number
-            )
-            if not films:
-                return []
-            value = json.dumps([film.model_dump_json() for film in films])
-            await self.cache_handler.put_film(value, key)
-
-        return films
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort]:
+        generation = await self.cache_handler.get_generation(settings.es_movies_index)
+        key = films_sort_key(sort, page_size, page_number, generation, fields)
+        return await self._get(
+            key,
+            partial(self.storage_handler.get_films_with_sort, sort, page_size, page_number, fields)
+        )
 
     async def get_films_by_genre_id_with_sort(
         self,
         genre_id: uuid.UUID,
         sort: str,
         page_size: int,
-        page_number: int
-    ) -> list[Film]:
-        key = f'{genre_id}/{sort}/{page_size}/{page_number}'
-        films = await self.cache_handler.get_film(key)
-        if not films:
-            films = await self.storage_handler.get_films_by_genre_id_with_sort(
-                genre_id, sort, page_size, page_number
+        page_number: int,
+        fields: tuple[str, ...] | None = None
+    ) -> list[FilmShort]:
+        generation = await self.cache_handler.get_generation(settings.es_movies_index)
+        key = films_genre_key(genre_id, sort, page_size, page_number, generation, fields)
+        return await self._get(
+            key,
+            partial(
+                self.storage_handler.get_films_by_genre_id_with_sort,
+                genre_id, sort, page_size, page_number, fields
             )
-            if not films:
-                return []
-            value = json.dumps([film.model_dump_json() for film in films])
-            await self.cache_handler.put_film(value, key)
-
-        return films
+        )
 
-    async def get_person_films(
+    async def get_films_by_query_after(
         self,
-        person: Person,
-    ) -> list[Film]:
+        query: str,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[FilmShort], Cursor | None]:
+        """Постраничный обход по курсору. Страницы не кешируются: их стоимость не зависит от глубины."""
+        return await self.storage_handler.get_films_by_query_after(
+            query, page_size, cursor, fields
+        )
 
-        film_ids = [str(film.id) for film in person.films]
+    async def get_films_with_sort_after(
+        self,
+        sort: str,
+        genre_id: uuid.UUID | None,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[FilmShort], Cursor | None]:
+        return await self.storage_handler.get_films_with_sort_after(
+            sort, genre_id, page_size, cursor, fields
+        )
 
-        key = '/'.join(film_ids)
-        films = await self.cache_handler.get_film(key)
-        if not films:
-            films = await self.storage_handler.get_films_by_ids(film_ids)
-            if not films:
-                return []
-            if len(films) == 1:
-                value = films[0].model_dump_json()
-            else:
-                value = json.dumps([film.model_dump_json() for film in films])
-            await self.cache_handler.put_film(key, value)
+    def export_films(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Film]]:
+        """Потоковая выгрузка фильмов мимо кеша: каждый документ читается один раз."""
+        return self.storage_handler.export_films(fields, since)
 
-        return films if type(films) == list else [films]
+    async def get_person_films(
+        self,
+        person: Person,
+    ) -> list[FilmShort]:
+        """
+        Фильмы персоны кешируются по одному, поэтому пересекающиеся фильмографии
+        используют общие записи. Из хранилища запрашиваются только недостающие фильмы.
+        """
+        films = await self._get_items(
+            [str(film.id) for film in person.films],
+            film_short_key,
+            self.storage_handler.get_films_by_ids
+        )
+        return [film for film in films if film is not None]
+
+    async def get_films_by_ids(self, film_ids: list[uuid.UUID]) -> list[Film | None]:
+        """
+        Фильмы в порядке film_ids, None - для отсутствующих в хранилище. Записи кеша
+        читаются одним запросом, промахи загружаются из хранилища одним запросом.
+        """
+        return await self._get_items(
+            film_ids, film_key, self.storage_handler.get_full_films_by_ids, self.cache_handler.codec
+        )
 
 
 @lru_cache()
@@ -332,7 +454,13 @@ def get_film_service(
     cache: ICache = Depends(get_cache),
     elastic: ElasticStorage = Depends(get_elastic),
 ) -> FilmService:
-    cache_handler = CacheFilmHandler(cache, FILM_CACHE_EXPIRE_IN_SECONDS)
+    cache_handler = CacheFilmHandler(
+        cache,
+        FILM_CACHE_EXPIRE_IN_SECONDS,
+        FILM_CACHE_REFRESH_IN_SECONDS,
+        FILM_NOT_FOUND_CACHE_EXPIRE_IN_SECONDS,
+        settings.cache_early_refresh_beta
+    )
     storage_handler = ElasticFilmHandler(elastic)
 
     return FilmService(cache_handler, storage_handler)
@@ -1,7 +1,7 @@
-import json
 import uuid
-from functools import lru_cache
-from typing import Any
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import AsyncIterator
 from abc import ABC, abstractmethod
 
 from fastapi import Depends
@@ -10,11 +10,22 @@ from db.cache import get_cache
 from db.redis import ICache
 from db.storage import get_elastic
 from db.elastic import ElasticStorage, IStorage
+from db.query_builder import SearchQuery
+from models.base import projection_model
 from models.genre import Genres
 from core.config import settings
+from services.base import BaseCacheHandler, BaseService
+from services.cache_keys import genre_key, genres_key
+from services.pagination import export_query, scan
 
 
-GENRE_CACHE_EXPIRE_IN_SECONDS = 5 * 60  # 5 min
+# Записи сбрасываются по сообщениям ETL (см. services/invalidation.py)
+GENRE_CACHE_EXPIRE_IN_SECONDS = 6 * 60 * 60  # 6 hours
+GENRE_CACHE_REFRESH_IN_SECONDS = 60 * 60  # 1 hour
+GENRE_NOT_FOUND_CACHE_EXPIRE_IN_SECONDS = 60  # 1 min
+# Списки сбрасываются увеличением поколения индекса в ETL
+GENRE_LIST_CACHE_EXPIRE_IN_SECONDS = 6 * 60 * 60  # 6 hours
+GENRE_LIST_CACHE_REFRESH_IN_SECONDS = 60 * 60  # 1 hour
 
 
 class StorageGenreHandler(ABC):
@@ -22,32 +33,30 @@ class StorageGenreHandler(ABC):
         self.storage = storage
 
     @abstractmethod
-    async def get_genre_by_id(self, genre_id: uuid.UUID) -> Genres | None:
+    async def get_genre_by_id(
+        self,
+        genre_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
+    ) -> Genres | None:
         pass
 
     @abstractmethod
-    async def get_genres(self) -> list[Genres] | None:
+    async def get_genres(self, fields: tuple[str, ...] | None = None) -> list[Genres] | None:
         pass
 
+    @abstractmethod
+    def export_genres(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Genres]]:
+        pass
 
-class CacheGenreHandler:
-    """Класс CacheGenreHandler отвечает за работу с кешом по информации о жанрах."""
-
-    def __init__(self, cache: ICache, expired_time: int) -> None:
-        self.cache = cache
-        self.expired_time = expired_time
-
-    async def get_genre(self, key: str) -> None | Genres | list[Genres] | Any:
-        data = await self.cache.get(key)
-        if not data:
-            return None
 
-        if key != 'genres':
-            return Genres.model_validate_json(data)
-        return [Genres.model_validate_json(obj) for obj in json.loads(data)]
+class CacheGenreHandler(BaseCacheHandler):
+    """Класс CacheGenreHandler отвечает за работу с кешом по информации о жанрах."""
 
-    async def put_genre(self, value: Any, key: str):
-        await self.cache.set(value, key, self.expired_time)
+    model = Genres
 
 
 class ElasticGenreHandler(StorageGenreHandler):
@@ -58,65 +67,82 @@ class ElasticGenreHandler(StorageGenreHandler):
 
     async def get_genre_by_id(
         self,
-        genre_id: uuid.UUID
+        genre_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
     ) -> Genres | None:
         doc = await self.storage.get_by_id(
-            index=settings.es_genres_index, id=str(genre_id)
+            index=settings.es_genres_index,
+            id=str(genre_id),
+            fields=list(fields) if fields is not None else None
         )
         if not doc:
             return None
-        return Genres(**doc)
+        return projection_model(Genres, fields)(**doc)
 
-    async def get_genres(self) -> list[Genres] | None:
-        query = {
-            'query': {
-                'match_all': {}
-            },
-            'size': 1000
-        }
+    async def get_genres(self, fields: tuple[str, ...] | None = None) -> list[Genres] | None:
+        search_query = SearchQuery(size=1000)
 
         docs = await self.storage.search(
-            index=settings.es_genres_index, body=query
+            index=settings.es_genres_index,
+            body=search_query.to_body(),
+            fields=list(fields) if fields is not None else None,
+            request_cache=search_query.request_cache
         )
         if not docs:
             return None
-        return [Genres(**doc) for doc in docs]
-
+        model = projection_model(Genres, fields)
+        return [model(**doc) for doc in docs]
 
-class GenreService:
+    async def export_genres(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Genres]]:
+        """Страницы всех жанров, fields - проекция документа (см. projection_model)."""
+        model = projection_model(Genres, fields)
+        async for docs in scan(
+            self.storage,
+            settings.es_genres_index,
+            export_query(since).to_body(),
+            list(fields) if fields is not None else None
+        ):
+            yield [model(**doc) for doc in docs]
+
+
+class GenreService(BaseService):
     """Класс GenreService содержит бизнес-логику по работе с жанрами."""
 
-    def __init__(
-        self,
-        cache_handler: CacheGenreHandler,
-        storage_handler: ElasticGenreHandler
-    ) -> None:
-        self.cache_handler = cache_handler
-        self.storage_handler = storage_handler
+    cache_handler: CacheGenreHandler
+    storage_handler: StorageGenreHandler
 
     async def get_genre_by_id(
         self,
-        genre_id: uuid.UUID
+        genre_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
     ) -> Genres | None:
-        genre = await self.cache_handler.get_genre(str(genre_id))
-        if not genre:
-            genre = await self.storage_handler.get_genre_by_id(genre_id)
-            if not genre:
-                return None
-
-            await self.cache_handler.put_genre(genre.model_dump_json(), str(genre_id))
-        return genre
+        """Проекция fields кешируется отдельно от полной записи."""
+        if fields is None:
+            key = genre_key(genre_id)
+        else:
+            generation = await self.cache_handler.get_generation(settings.es_genres_index)
+            key = genre_key(genre_id, fields, generation)
+        return await self._get(
+            key, partial(self.storage_handler.get_genre_by_id, genre_id, fields)
+        )
 
-    async def get_genres(self) -> list[Genres]:
-        genres = await self.cache_handler.get_genre('genres')
-        if not genres:
-            genres = await self.storage_handler.get_genres()
-            if not genres:
-                return []
-            value = json.dumps([genre.model_dump_json() for genre in genres])
-            await self.cache_handler.put_genre(value, 'genres')
+    async def get_genres(self, fields: tuple[str, ...] | None = None) -> list[Genres]:
+        generation = await self.cache_handler.get_generation(settings.es_genres_index)
+        return await self._get(
+            genres_key(generation, fields), partial(self.storage_handler.get_genres, fields)
+        )
 
-        return genres
+    def export_genres(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Genres]]:
+        """Потоковая выгрузка жанров мимо кеша: каждый документ читается один раз."""
+        return self.storage_handler.export_genres(fields, since)
 
 
 @lru_cache()
@@ -124,6 +150,14 @@ def get_genre_service(
     cache: ICache = Depends(get_cache),
     elastic: ElasticStorage = Depends(get_elastic),
 ) -> GenreService:
-    cache_handler = CacheGenreHandler(cache, GENRE_CACHE_EXPIRE_IN_SECONDS)
+    cache_handler = CacheGenreHandler(
+        cache,
+        GENRE_CACHE_EXPIRE_IN_SECONDS,
+        GENRE_CACHE_REFRESH_IN_SECONDS,
+        GENRE_NOT_FOUND_CACHE_EXPIRE_IN_SECONDS,
+        settings.cache_early_refresh_beta,
+        list_expired_time=GENRE_LIST_CACHE_EXPIRE_IN_SECONDS,
+        list_refresh_time=GENRE_LIST_CACHE_REFRESH_IN_SECONDS
+    )
     storage_handler = ElasticGenreHandler(elastic)
     return GenreService(cache_handler, storage_handler)
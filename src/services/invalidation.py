@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+
+from redis.exceptions import RedisError
+
+from core.config import settings
+from db.redis import ICache, RedisCache
+from services.cache_keys import (
+    detail_response_key,
+    film_key,
+    film_short_key,
+    generation_key,
+    genre_key,
+    person_key
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторной подпиской после потери соединения с Redis (секунды)
+RECONNECT_DELAY_IN_SECONDS = 1
+
+# Ключи записей по идентификатору для каждого индекса
+INDEX_KEYS = {
+    settings.es_movies_index: (film_key, film_short_key),
+    settings.es_genres_index: (genre_key,),
+    settings.es_persons_index: (person_key,),
+}
+
+# Индексы, из которых собраны ответы эндпоинтов /api/v1/<resource> (см. ResponseCacheMiddleware)
+RESOURCE_INDEXES = {
+    'films': (settings.es_movies_index,),
+    'genres': (settings.es_genres_index,),
+    'persons': (settings.es_persons_index, settings.es_movies_index),
+}
+
+# Ресурс API, ответ которого по идентификатору строится из документа индекса
+INDEX_RESOURCES = {
+    settings.es_movies_index: 'films',
+    settings.es_genres_index: 'genres',
+    settings.es_persons_index: 'persons',
+}
+
+
+class CacheInvalidationSubscriber:
+    """
+    Класс CacheInvalidationSubscriber слушает канал, в который ETL публикует
+    идентификаторы обновленных документов, и удаляет соответствующие записи
+    из кеша, в том числе из in-memory кеша воркера.
+
+    Формат сообщения: {"index": "persons", "ids": ["<uuid>", ...]}.
+    """
+
+    def __init__(self, cache: ICache, source: RedisCache, channel: str) -> None:
+        self.cache = cache
+        self.source = source
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                async for data in self.source.listen(self.channel):
+                    await self.handle(data)
+            except RedisError as e:
+                logger.error(f'Подписка на канал {self.channel} прервана: {e}')
+            # Подписка могла завершиться и без ошибки, пауза нужна в обоих случаях
+            await asyncio.sleep(RECONNECT_DELAY_IN_SECONDS)
+
+    async def handle(self, data: str | bytes) -> None:
+        try:
+            message = json.loads(data)
+            key_builders = INDEX_KEYS[message['index']]
+            resource = INDEX_RESOURCES[message['index']]
+            keys = [
+                str(build_key(id)) for id in message['ids'] for build_key in key_builders
+            ]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f'Некорректное сообщение в канале {self.channel}: {e}')
+            return
+
+        # Ответы с другими параметрами запроса перестанут отдаваться после увеличения поколения
+        generations = tuple([
+            await self.cache.get_counter(str(generation_key(index)))
+            for index in RESOURCE_INDEXES[resource]
+        ])
+        keys += [str(detail_response_key(resource, id, generations)) for id in message['ids']]
+        await self.cache.delete(*keys)
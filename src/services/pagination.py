@@ -0,0 +1,157 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator
+
+from elasticsearch.exceptions import NotFoundError, RequestError
+
+from core.config import settings
+from db.elastic import IStorage
+from db.query_builder import TIE_BREAKER, Range, SearchQuery
+
+
+# Поле документа со временем последнего изменения, заполняется ETL
+MODIFIED_FIELD = 'modified'
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """
+    Позиция постраничного обхода: значения сортировки последнего отданного
+    документа (search_after), если включен - идентификатор point-in-time,
+    и индекс, в котором выполнялся обход. Пустой курсор означает первую страницу.
+    """
+    after: list[Any] | None = None
+    point_in_time: str | None = None
+    index: str | None = None
+
+
+def sign_cursor(data: bytes) -> str:
+    digest = hmac.new(settings.cursor_secret_key.encode('utf-8'), data, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Курсор в base64, если задан cursor_secret_key - с подписью через точку."""
+    data = json.dumps(asdict(cursor), separators=(',', ':')).encode('utf-8')
+    value = base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+    if settings.cursor_secret_key:
+        value = f'{value}.{sign_cursor(data)}'
+    return value
+
+
+def decode_cursor(value: str) -> Cursor:
+    if not value:
+        return Cursor()
+    value, _, signature = value.partition('.')
+    try:
+        data = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursorError('Некорректный курсор') from e
+    if settings.cursor_secret_key and not hmac.compare_digest(
+        signature.encode('utf-8'), sign_cursor(data).encode('utf-8')
+    ):
+        raise InvalidCursorError('Некорректная подпись курсора')
+    try:
+        cursor = Cursor(**json.loads(data))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('Некорректный курсор') from e
+    if not isinstance(cursor.after, (list, type(None))) or not all(
+        isinstance(value, (str, type(None))) for value in (cursor.point_in_time, cursor.index)
+    ):
+        raise InvalidCursorError('Некорректный курсор')
+    return cursor
+
+
+async def search_page(
+    storage: IStorage,
+    index: str,
+    body: dict,
+    cursor: Cursor,
+    fields: list[str] | None = None
+) -> tuple[list[dict], Cursor | None]:
+    """
+    Возвращает страницу документов и курсор следующей страницы (None для последней).
+    Стоимость запроса не зависит от глубины страницы, в отличие от from/size.
+
+    Курсор должен относиться к тому же индексу и сортировке, иначе, как и при ошибке
+    запроса с его значениями или истекшем point-in-time, вызывается InvalidCursorError.
+    Point-in-time закрывается после последней страницы.
+    """
+    if cursor != Cursor() and (
+        cursor.index != index or len(cursor.after or []) != len(body.get('sort', []))
+    ):
+        raise InvalidCursorError('Курсор относится к другому запросу')
+
+    point_in_time = None
+    if cursor.point_in_time or settings.es_point_in_time_enabled:
+        point_in_time = {
+            'id': cursor.point_in_time or await storage.open_point_in_time(
+                index, settings.es_point_in_time_keep_alive
+            ),
+            'keep_alive': settings.es_point_in_time_keep_alive
+        }
+
+    try:
+        page = await storage.search_after(index, body, cursor.after, fields, point_in_time)
+    except RequestError as e:
+        if cursor == Cursor():
+            raise
+        raise InvalidCursorError('Некорректный курсор') from e
+    except NotFoundError as e:
+        if cursor.point_in_time is None:
+            raise
+        raise InvalidCursorError('Курсор истек') from e
+    if len(page.docs) < body['size']:
+        if point_in_time is not None:
+            await storage.close_point_in_time(page.point_in_time or point_in_time['id'])
+        return page.docs, None
+    return page.docs, Cursor(page.sort, page.point_in_time, index)
+
+
+def export_query(since: datetime | None) -> SearchQuery:
+    """Запрос выгрузки индекса: все документы (или измененные начиная с since) в порядке id."""
+    return SearchQuery(
+        filters=[Range(MODIFIED_FIELD, since.isoformat())] if since is not None else [],
+        sort=[TIE_BREAKER],
+        size=settings.export_page_size
+    )
+
+
+async def scan(
+    storage: IStorage,
+    index: str,
+    body: dict,
+    fields: list[str] | None = None
+) -> AsyncIterator[list[dict]]:
+    """
+    Обходит все документы запроса страницами по body['size'] через search_after
+    в закрепленном point-in-time. В памяти находится только текущая страница,
+    документы, измененные во время обхода, не пропускаются и не повторяются.
+    Если point-in-time истек, NotFoundError прерывает обход, а не завершает его.
+    """
+    point_in_time = {
+        'id': await storage.open_point_in_time(index, settings.es_point_in_time_keep_alive),
+        'keep_alive': settings.es_point_in_time_keep_alive
+    }
+    after = None
+    try:
+        while True:
+            page = await storage.search_after(index, body, after, fields, point_in_time)
+            if page.docs:
+                yield page.docs
+            if len(page.docs) < body['size']:
+                return
+            after = page.sort
+            # Elasticsearch может вернуть новый идентификатор point-in-time
+            point_in_time['id'] = page.point_in_time or point_in_time['id']
+    finally:
+        await storage.close_point_in_time(point_in_time['id'])
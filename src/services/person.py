@@ -1,44 +1,41 @@
-import json
 import uuid
 
-from functools import lru_cache
-from typing import Any
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import AsyncIterator
 from abc import ABC, abstractmethod
 from fastapi import Depends
 
 from db.storage import get_elastic
 from db.cache import get_cache
 from db.elastic import ElasticStorage, IStorage
+from db.query_builder import BY_SCORE, TIE_BREAKER, FuzzyMatch, SearchQuery
 from db.redis import ICache
+from models.base import projection_model
 from models.person import Person
 from core.config import settings
+from services.base import BaseCacheHandler, BaseService
+from services.cache_keys import person_key, persons_search_key
+from services.pagination import Cursor, export_query, scan, search_page
 
 
-PERSON_CACHE_EXPIRE_IN_SECONDS = 5 * 60  # 5 min
+# Записи сбрасываются по сообщениям ETL (см. services/invalidation.py)
+PERSON_CACHE_EXPIRE_IN_SECONDS = 6 * 60 * 60  # 6 hours
+PERSON_CACHE_REFRESH_IN_SECONDS = 60 * 60  # 1 hour
+PERSON_NOT_FOUND_CACHE_EXPIRE_IN_SECONDS = 60  # 1 min
+# Списки сбрасываются увеличением поколения индекса в ETL
+PERSON_LIST_CACHE_EXPIRE_IN_SECONDS = 6 * 60 * 60  # 6 hours
+PERSON_LIST_CACHE_REFRESH_IN_SECONDS = 60 * 60  # 1 hour
 
 
 def calculate_offset(page_size: int, page_number: int) -> int:
     return (page_number - 1) * page_size
 
 
-class CachePersonHandler:
+class CachePersonHandler(BaseCacheHandler):
     """Класс CachePersonHandler отвечает за работу с кешом по информации о персонах."""
 
-    def __init__(self, cache: ICache, expired_time: int) -> None:
-        self.cache = cache
-        self.expired_time = expired_time
-
-    async def get_person(self, key: str) -> None | Person | list[Person] | Any:
-        data = await self.cache.get(key)
-        if not data:
-            return None
-
-        if '/' not in key:
-            return Person.model_validate_json(data)
-        return [Person.model_validate_json(obj) for obj in json.loads(data)]
-
-    async def put_person(self, key: str, value: Any):
-        await self.cache.set(key, value, self.expired_time)
+    model = Person
 
 
 class StoragePersonHandler(ABC):
@@ -48,19 +45,46 @@ class StoragePersonHandler(ABC):
     @abstractmethod
     async def get_person_by_id(
         self,
-        person_id: uuid.UUID
+        person_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
     ) -> Person | None:
         pass
 
+    @abstractmethod
+    async def get_persons_by_ids(
+        self,
+        person_ids: list[str]
+    ) -> list[Person] | None:
+        pass
+
     @abstractmethod
     async def get_persons_by_query(
         self,
         query: str,
         page_size: int,
-        page_number: int
+        page_number: int,
+        fields: tuple[str, ...] | None = None
     ) -> list[Person] | None:
         pass
 
+    @abstractmethod
+    async def get_persons_by_query_after(
+        self,
+        query: str,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[Person], Cursor | None]:
+        pass
+
+    @abstractmethod
+    def export_persons(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Person]]:
+        pass
+
 
 class ElasticPersonHandler(StoragePersonHandler):
     """Класс ElasticPersonHandler отвечает за работу с эластиком по информации о персонах."""
@@ -70,88 +94,156 @@ class ElasticPersonHandler(StoragePersonHandler):
 
     async def get_person_by_id(
         self,
-        person_id: uuid.UUID
+        person_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
     ) -> Person | None:
         doc = await self.storage.get_by_id(
-            index=settings.es_persons_index, id=str(person_id)
+            index=settings.es_persons_index,
+            id=str(person_id),
+            fields=list(fields) if fields is not None else None
         )
         if not doc:
             return None
-        return Person(**doc)
+        return projection_model(Person, fields)(**doc)
+
+    async def get_persons_by_ids(
+        self,
+        person_ids: list[str]
+    ) -> list[Person] | None:
+        docs = await self.storage.get_by_ids(index=settings.es_persons_index, ids=person_ids)
+        if not docs:
+            return None
+        return [Person(**doc) for doc in docs]
 
     async def get_persons_by_query(
         self,
         query: str,
         page_size: int,
-        page_number: int
+        page_number: int,
+        fields: tuple[str, ...] | None = None
     ) -> list[Person] | None:
-        elastic_query = {
-            'query': {
-                'fuzzy': {
-                    'full_name': {
-                        'value': query,
-                        'fuzziness': 'AUTO'
-                    }
-                }
-            },
-            'size': page_size,
-            'from': calculate_offset(page_size, page_number)
-        }
+        search_query = SearchQuery(
+            match=FuzzyMatch('full_name', query),
+            size=page_size,
+            offset=calculate_offset(page_size, page_number)
+        )
 
         docs = await self.storage.search(
-            index=settings.es_persons_index, body=elastic_query
+            index=settings.es_persons_index,
+            body=search_query.to_body(),
+            fields=list(fields) if fields is not None else None,
+            request_cache=search_query.request_cache
         )
         if not docs:
             return None
-        return [Person(**doc) for doc in docs]
+        model = projection_model(Person, fields)
+        return [model(**doc) for doc in docs]
+
+    async def get_persons_by_query_after(
+        self,
+        query: str,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[Person], Cursor | None]:
+        search_query = SearchQuery(
+            match=FuzzyMatch('full_name', query),
+            sort=[BY_SCORE, TIE_BREAKER],
+            size=page_size
+        )
 
+        docs, next_cursor = await search_page(
+            self.storage,
+            settings.es_persons_index,
+            search_query.to_body(),
+            cursor,
+            list(fields) if fields is not None else None
+        )
+        model = projection_model(Person, fields)
+        return [model(**doc) for doc in docs], next_cursor
 
-class PersonService:
+    async def export_persons(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Person]]:
+        """Страницы всех персон, fields - проекция документа (см. projection_model)."""
+        model = projection_model(Person, fields)
+        async for docs in scan(
+            self.storage,
+            settings.es_persons_index,
+            export_query(since).to_body(),
+            list(fields) if fields is not None else None
+        ):
+            yield [model(**doc) for doc in docs]
+
+
+class PersonService(BaseService):
     """Класс PersonService содержит бизнес-логику по работе с персонами."""
 
-    def __init__(
-        self,
-        cache_handler: CachePersonHandler,
-        storage_handler: ElasticPersonHandler
-    ) -> None:
-        self.cache_handler = cache_handler
-        self.storage_handler = storage_handler
+    cache_handler: CachePersonHandler
+    storage_handler: StoragePersonHandler
 
-    async def get_person_by_id(self, person_id: uuid.UUID) -> Person | None:
+    async def get_person_by_id(
+        self,
+        person_id: uuid.UUID,
+        fields: tuple[str, ...] | None = None
+    ) -> Person | None:
         """
         Функция возвращает объект персоны.
         Он опционален, так как персона может отсутствовать в базе.
+        Проекция fields кешируется отдельно от полной записи.
         """
-        person = await self.cache_handler.get_person(str(person_id))
-        if not person:
-            person = await self.storage_handler.get_person_by_id(person_id)
-            if not person:
-                return None
-            await self.cache_handler.put_person(str(person_id), person.model_dump_json())
+        if fields is None:
+            key = person_key(person_id)
+        else:
+            generation = await self.cache_handler.get_generation(settings.es_persons_index)
+            key = person_key(person_id, fields, generation)
+        return await self._get(
+            key, partial(self.storage_handler.get_person_by_id, person_id, fields)
+        )
 
-        return person
+    async def get_persons_by_ids(self, person_ids: list[uuid.UUID]) -> list[Person | None]:
+        """
+        Персоны в порядке person_ids, None - для отсутствующих в хранилище. Записи кеша
+        читаются одним запросом, промахи загружаются из хранилища одним запросом.
+        """
+        return await self._get_items(person_ids, person_key, self.storage_handler.get_persons_by_ids)
 
     async def get_persons_by_query(
         self,
         query: str,
         page_size: int,
-        page_number: int
+        page_number: int,
+        fields: tuple[str, ...] | None = None
     ) -> list[Person]:
         """Функция возвращает список персон на основании запроса."""
-        key = f'{query}/{page_size}/{page_number}'
-        persons = await self.cache_handler.get_person(key)
-        if not persons:
-            persons = await self.storage_handler.get_persons_by_query(
-                query, page_size, page_number
-            )
+        generation = await self.cache_handler.get_generation(settings.es_persons_index)
+        key = persons_search_key(query, page_size, page_number, generation, fields)
+        return await self._get(
+            key,
+            partial(self.storage_handler.get_persons_by_query, query, page_size, page_number, fields)
+        )
 
-            if not persons:
-                return []
-            value = json.dumps([person.model_dump_json()
-                               for person in persons])
-            await self.cache_handler.put_person(key, value)
+    async def get_persons_by_query_after(
+        self,
+        query: str,
+        page_size: int,
+        cursor: Cursor,
+        fields: tuple[str, ...] | None = None
+    ) -> tuple[list[Person], Cursor | None]:
+        """Функция возвращает страницу персон по курсору и курсор следующей страницы."""
+        return await self.storage_handler.get_persons_by_query_after(
+            query, page_size, cursor, fields
+        )
 
-        return persons
+    def export_persons(
+        self,
+        fields: tuple[str, ...] | None,
+        since: datetime | None
+    ) -> AsyncIterator[list[Person]]:
+        """Потоковая выгрузка персон мимо кеша: каждый документ читается один раз."""
+        return self.storage_handler.export_persons(fields, since)
 
 
 @lru_cache()
@@ -159,7 +251,14 @@ def get_person_service(
     cache: ICache = Depends(get_cache),
     elastic: ElasticStorage = Depends(get_elastic),
 ) -> PersonService:
-    cache_handler = CachePersonHandler(cache, PERSON_CACHE_EXPIRE_IN_SECONDS)
+    cache_handler = CachePersonHandler(
+        cache,
+        PERSON_CACHE_EXPIRE_IN_SECONDS,
+        PERSON_CACHE_REFRESH_IN_SECONDS,
+        PERSON_NOT_FOUND_CACHE_EXPIRE_IN_SECONDS,
+        list_expired_time=PERSON_LIST_CACHE_EXPIRE_IN_SECONDS,
+        list_refresh_time=PERSON_LIST_CACHE_REFRESH_IN_SECONDS
+    )
     storage_handler = ElasticPersonHandler(elastic)
 
     return PersonService(cache_handler, storage_handler)
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Класс SingleFlight объединяет одновременные запросы по одному ключу кеша:
+    загрузку из хранилища выполняет только первый вызов, остальные ожидают его результат.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # shield: отмена одного из ожидающих запросов не прерывает загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def do_many(
+        self,
+        keys: list[str],
+        func: Callable[[list[str]], Awaitable[dict[str, Any]]]
+    ) -> list[Any]:
+        """
+        Аналог do для нескольких ключей: ключи, которые уже загружаются, ожидают текущую
+        загрузку, остальные загружаются одним вызовом func, возвращающим значения по ключам.
+        """
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self._calls]
+        if new_keys:
+            batch = asyncio.ensure_future(func(new_keys))
+            for key in new_keys:
+                task = asyncio.ensure_future(self._pick(batch, key))
+                self._calls[key] = task
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+        return await asyncio.gather(*[asyncio.shield(self._calls[key]) for key in keys])
+
+    @staticmethod
+    async def _pick(batch: asyncio.Future, key: str) -> Any:
+        return (await batch).get(key)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Исключение уже получили ожидающие вызовы
+            task.exception()
@@ -60,6 +60,34 @@ async def test_search_film_by_film_id_positive(
     ), 'Тело фильма в ответе должно быть идентично ожидаемому фильму'
 
 
+async def test_films_batch_keeps_request_order(make_get_request, es_write_data):
+    await es_write_data(es_films_data, index=test_settings.es_movies_index)
+    missing_id = str(uuid.uuid4())
+    ids = [es_films_data[1]['id'], missing_id, es_films_data[0]['id']]
+
+    response = await make_get_request('films/batch', [('ids', film_id) for film_id in ids])
+
+    assert response.get('status') == HTTP_200
+    assert (
+        response['body']['films'] == [FILMS_RESPONSE_DATA[1], FILMS_RESPONSE_DATA[0]]
+    ), 'Фильмы должны возвращаться в порядке запрошенных идентификаторов'
+    assert response['body']['not_found'] == [missing_id]
+
+
+async def test_film_details_returns_requested_fields(make_get_request, es_write_data):
+    await es_write_data(es_films_data, index=test_settings.es_movies_index)
+    film_id = es_films_data[0]['id']
+
+    response = await make_get_request(f'films/{film_id}', {'fields': 'title,genres'})
+    assert response.get('status') == HTTP_200
+    assert response['body'] == {
+        key: FILMS_RESPONSE_DATA[0][key] for key in ('uuid', 'title', 'genres')
+    }, 'В ответе должны быть только запрошенные поля и идентификатор'
+
+    response = await make_get_request(f'films/{film_id}', {'fields': 'title,budget'})
+    assert response.get('status') == HTTP_422
+
+
 @pytest.mark.parametrize(
     'film_data, expected_answer',
     [
@@ -217,7 +245,7 @@ async def test_get_film_from_cache():
     film_id_mock = uuid.uuid4()
 
     with (patch.object(
-        cache_handler_mock, 'get_film', return_value='cache data'
+        cache_handler_mock, 'get_value', return_value='cache data'
     ) as get_film_mock, patch.object(
         storage_handler_mock, 'get_film_by_id', return_value='storage data'
     ) as get_film_by_id_mock):
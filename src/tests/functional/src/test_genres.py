@@ -128,7 +128,7 @@ async def test_get_film_from_cache(
     genre_id_mock = uuid.uuid4()
 
     with (patch.object(
-        cache_handler_mock, 'get_genre', return_value='cache data'
+        cache_handler_mock, 'get_value', return_value='cache data'
     ) as get_film_mock, patch.object(
         storage_handler_mock, 'get_genre_by_id', return_value='storage_data'
     ) as get_film_by_id_mock):
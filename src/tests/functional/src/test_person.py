@@ -1,12 +1,24 @@
 import copy
-import json
 import pytest
+import sys
+import time
 import uuid
 
+from pathlib import Path
+
 from ..settings import test_settings
 from ..testdata.es_data import es_films_data, es_persons_data, es_person_films_data, person_cache_data
 from ..testdata.response_data import HTTP_200, HTTP_404, HTTP_422
 
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+
+from db.redis import compress_value, decompress_value
+from services.base import pack_entry, unpack_entry
+from services.cache_keys import film_short_key, person_key
+from services.codecs import JsonCodec
+from models.film import FilmShort
+from models.person import Person
+
 
 @pytest.mark.parametrize(
     'query_data, expected_answer',
@@ -154,10 +166,10 @@ async def test_person_cach(
     await es_write_data(person_cache_data, test_settings.es_persons_index)
     await make_get_request(f'persons/{query_data.get("id")}', {})
 
-    key = str(query_data.get('id'))
-    value = await redis_client.get(key)
+    key = str(person_key(query_data.get('id')))
+    *_, value = unpack_entry(decompress_value(await redis_client.get(key)))
 
-    assert json.loads(value) == expected_answer.get('body')
+    assert JsonCodec(Person).decode(value, many=False) == Person(**expected_answer.get('body'))
 
 
 async def test_person_cache(
@@ -165,23 +177,30 @@ async def test_person_cache(
     make_get_request
 ):
     """Кладем в редис персону, которой точно нет в эластике. При запросе - ожидаем ответ из кеша."""
-    key = str(str(uuid.uuid4()))
+    person_id = str(uuid.uuid4())
     value = {
-        'id': key,
+        'id': person_id,
         'full_name': 'Absent in ES',
         'films': [
             {'id': str(uuid.uuid4()), 'roles': ['Writer']},
         ]
     }
     expected_value = {
-        'uuid': key,
+        'uuid': person_id,
         'full_name': 'Absent in ES',
         'films': [
             {'uuid': value.get('films')[0].get('id'), 'roles': ['Writer']},
         ]
     }
-    await redis_client.set(key, json.dumps(value))
-    response = await make_get_request(f"persons/{key}", {})
+    await redis_client.set(
+        str(person_key(person_id)),
+        compress_value(
+            pack_entry(JsonCodec(Person).encode(Person(**value)), time.time() + 60),
+            min_size=1024,
+            level=6
+        )
+    )
+    response = await make_get_request(f"persons/{person_id}", {})
 
     assert response.get('status') == HTTP_200
     assert response.get('body') == expected_value
@@ -195,12 +214,7 @@ async def test_person_cache(
             {'body': {
                 'id': es_films_data[0].get('id'),
                 'title': es_films_data[0].get('title'),
-                'description': es_films_data[0].get('description'),
                 'imdb_rating': es_films_data[0].get('imdb_rating'),
-                'genres': es_films_data[0].get('genres'),
-                'directors': es_films_data[0].get('directors'),
-                'actors': es_films_data[0].get('actors'),
-                'writers': es_films_data[0].get('writers'),
             }, }
         ),
     ]
@@ -212,13 +226,13 @@ async def test_person_films_cache(
     query_data,
     expected_answer
 ):
-    """После запроса фильмов персоны по апи, идем в редис и ожидаем увидеть там список фильмов персоны."""
+    """После запроса фильмов персоны по апи, идем в редис и ожидаем увидеть там каждый фильм персоны."""
     await es_write_data(es_films_data, test_settings.es_movies_index)
     await es_write_data(es_person_films_data, test_settings.es_persons_index)
 
     await make_get_request(f'persons/{query_data.get("id")}/film', {})
 
-    key = str(expected_answer.get('body').get('id'))
-    value = await redis_client.get(key)
+    key = str(film_short_key(expected_answer.get('body').get('id')))
+    *_, value = unpack_entry(decompress_value(await redis_client.get(key)))
 
-    assert json.loads(value) == expected_answer.get('body')
+    assert JsonCodec(FilmShort).decode(value, many=False) == FilmShort(**expected_answer.get('body'))
@@ -1,10 +1,21 @@
-import json
 import pytest
+import sys
+
+from pathlib import Path
 
 from ..settings import test_settings
 from ..testdata.es_data import es_films_data, es_persons_data
 from ..testdata.response_data import HTTP_200, HTTP_422
 
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+
+from db.redis import decompress_value
+from services.base import unpack_entry
+from services.cache_keys import films_search_key, persons_search_key
+from services.codecs import JsonCodec
+from models.film import FilmShort
+from models.person import Person
+
 
 @pytest.mark.parametrize(
     'query_data, expected_answer, endpoint, data, index',
@@ -287,17 +298,96 @@ async def test_search_with_cache(
     data,
     index
 ):
-    key_string = f'{query_data.get("query")}/{query_data.get("page_size")}/{query_data.get("page_number")}'
-    key = bytes(key_string, 'utf-8')
+    build_key, model = (
+        (films_search_key, FilmShort) if endpoint == 'films/search' else (persons_search_key, Person)
+    )
+    key = str(build_key(
+        query_data.get('query'), query_data.get('page_size'), query_data.get('page_number')
+    ))
     await redis_client.set(key, '')
 
     await make_get_request(endpoint, query_data)
 
-    value = await redis_client.get(key)
-    str1 = value.decode('UTF-8')
-    dict_str = json.loads(str1)
-    list_of_dicts = [json.loads(s) for s in dict_str]
+    *_, value = unpack_entry(decompress_value(await redis_client.get(key)))
+    list_of_dicts = [
+        obj.model_dump(mode='json') for obj in JsonCodec(model).decode(value, many=True)
+    ]
 
     assert (
-        list_of_dicts == data[:query_data.get('page_size')]
+        list_of_dicts == [
+            {field: doc[field] for field in model.model_fields}
+            for doc in data[:query_data.get('page_size')]
+        ]
     ), 'В кэше значения после вызова эндпоинта search не соответствуют ожидаемым'
+
+
+@pytest.mark.parametrize(
+    'endpoint, data, index',
+    [
+        ('films/search', es_films_data, test_settings.es_movies_index),
+        ('persons/search', es_persons_data, test_settings.es_persons_index),
+    ]
+)
+async def test_search_with_cursor(
+    make_get_request,
+    es_write_data,
+    endpoint,
+    data,
+    index
+):
+    await es_write_data(data, index)
+
+    query_data = {'query': 'Star' if endpoint == 'films/search' else 'Mat', 'page_size': 15, 'cursor': ''}
+    ids = []
+    while True:
+        response = await make_get_request(endpoint, query_data)
+        assert response.get('status') == HTTP_200
+        ids.extend(obj['uuid'] for obj in response.get('body'))
+        if 'X-Next-Cursor' not in response.get('headers'):
+            break
+        query_data['cursor'] = response.get('headers')['X-Next-Cursor']
+
+    assert (
+        sorted(ids) == sorted(doc['id'] for doc in data)
+    ), 'Обход по курсору должен вернуть каждый документ ровно один раз'
+
+    response = await make_get_request(endpoint, {'query': 'Star', 'cursor': 'broken'})
+    assert response.get('status') == HTTP_422, 'Некорректный курсор должен приводить к HTTP_422'
+
+
+
+@pytest.mark.parametrize(
+    'endpoint, query_data, data, index',
+    [
+        ('films/search', {'query': 'Star', 'fields': 'title'}, es_films_data, test_settings.es_movies_index),
+        ('films/', {'fields': 'title'}, es_films_data, test_settings.es_movies_index),
+        ('persons/search', {'query': 'Mat', 'fields': 'full_name'}, es_persons_data, test_settings.es_persons_index),
+    ]
+)
+async def test_search_with_cursor_and_fields(
+    make_get_request,
+    es_write_data,
+    endpoint,
+    query_data,
+    data,
+    index
+):
+    await es_write_data(data, index)
+
+    query_data = {**query_data, 'page_size': 15, 'cursor': ''}
+    ids = []
+    while True:
+        response = await make_get_request(endpoint, query_data)
+        assert response.get('status') == HTTP_200
+        assert all(
+            set(obj) == {'uuid', query_data['fields']} for obj in response.get('body')
+        ), 'В ответе должны быть только запрошенные поля'
+        ids.extend(obj['uuid'] for obj in response.get('body'))
+        if 'X-Next-Cursor' not in response.get('headers'):
+            break
+        query_data['cursor'] = response.get('headers')['X-Next-Cursor']
+
+    assert len(ids) == len(set(ids)), 'Обход по курсору не должен повторять документы'
+    assert (
+        {doc['id'] for doc in data} <= set(ids)
+    ), 'Проекция не должна прерывать обход по курсору'
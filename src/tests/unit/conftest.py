@@ -0,0 +1,10 @@
+# общие фикстуры модульных тестов: они не требуют Elasticsearch и Redis.
+
+import pytest
+
+from db.memory import InMemoryCache
+
+
+@pytest.fixture
+def cache() -> InMemoryCache:
+    return InMemoryCache()
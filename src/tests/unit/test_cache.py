@@ -0,0 +1,563 @@
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import pytest
+import time
+import uuid
+
+from unittest.mock import AsyncMock, Mock
+
+from pydantic import ValidationError
+
+from api.response_cache import ResponseCacheMiddleware
+from db.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerStorage,
+    StorageUnavailableError
+)
+from db.elastic import IStorage
+from db.local_cache import LocalCache, TwoTierCache
+from db.memory import InMemoryStorage
+from db.redis import RAW, RedisCache, compress_value, decompress_value
+from services.base import NOT_FOUND, BaseCacheHandler, should_refresh_early
+from services.cache_keys import (
+    build_key,
+    detail_response_key,
+    film_key,
+    generation_key,
+    genre_key,
+    films_search_key,
+    genres_key
+)
+from services.codecs import CodecError, JsonCodec
+from models.base import projection_model
+from models.film import Film, FilmShort
+from models.genre import Genres
+from models.person import Person, PersonRoles
+from services.film import CacheFilmHandler, ElasticFilmHandler, FilmService
+from services.invalidation import CacheInvalidationSubscriber
+from services.single_flight import SingleFlight
+
+
+def test_local_cache_lru_eviction():
+    local_cache = LocalCache(max_entries=2, max_bytes=1024, expired_time=60)
+    local_cache.set('a', b'1', 60)
+    local_cache.set('b', b'2', 60)
+    local_cache.get('a')
+    local_cache.set('c', b'3', 60)
+
+    assert (
+        local_cache.get('b') is None
+    ), 'Из кеша должна вытесняться самая давно использованная запись'
+    assert local_cache.get('a') == b'1'
+    assert local_cache.get('c') == b'3'
+
+
+def test_local_cache_max_bytes():
+    local_cache = LocalCache(max_entries=100, max_bytes=10, expired_time=60)
+    local_cache.set('a', b'12345', 60)
+    local_cache.set('b', b'123456', 60)
+    local_cache.set('c', b'12345678901', 60)
+
+    assert local_cache.get('a') is None, 'Суммарный объем записей не должен превышать max_bytes'
+    assert local_cache.get('b') == b'123456'
+    assert local_cache.get('c') is None, 'Записи больше max_bytes не кешируются'
+    assert local_cache.size == 6
+
+
+def test_local_cache_ttl_not_longer_than_redis():
+    local_cache = LocalCache(max_entries=10, max_bytes=1024, expired_time=60)
+    local_cache.set('a', b'1', 0.01)
+    time.sleep(0.02)
+
+    assert (
+        local_cache.get('a') is None
+    ), 'Время жизни записи в L1 не должно превышать время жизни в Redis'
+
+
+async def test_two_tier_cache_serves_hot_keys_locally():
+    redis_cache = Mock(spec=RedisCache)
+    redis_cache.get_with_ttl = AsyncMock(return_value=(b'data', 300))
+    cache = TwoTierCache(
+        redis_cache, LocalCache(max_entries=10, max_bytes=1024, expired_time=10)
+    )
+
+    assert await cache.get('genres') == b'data'
+    assert await cache.get('genres') == b'data'
+    assert (
+        redis_cache.get_with_ttl.call_count == 1
+    ), 'Повторное чтение горячего ключа не должно обращаться к Redis'
+
+
+async def test_two_tier_cache_keeps_remote_only_keys_out_of_local_cache():
+    redis_cache = Mock(spec=RedisCache)
+    redis_cache.get = AsyncMock(return_value=b'data')
+    redis_cache.get_many_with_ttl = AsyncMock(return_value=[(b'data', 300), (b'data', 300)])
+    cache = TwoTierCache(
+        redis_cache,
+        LocalCache(max_entries=10, max_bytes=1024, expired_time=10),
+        remote_only_prefixes=('response:',)
+    )
+
+    assert await cache.get('response:genres') == b'data'
+    assert await cache.get_many(['response:films', 'genres']) == [b'data', b'data']
+    await cache.set_many({'response:persons': b'data'}, 60)
+    assert len(cache.local_cache) == 1 and cache.local_cache.get('genres') == b'data', (
+        'Ключи с префиксами remote_only_prefixes не должны попадать в L1 ни при каком чтении или записи'
+    )
+
+
+async def test_single_flight_coalesces_concurrent_loads():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 'storage data'
+
+    results = await asyncio.gather(
+        *[single_flight.do('-imdb_rating/50/1', load) for _ in range(10)]
+    )
+
+    assert calls == 1, 'Одновременные промахи кеша должны выполнять один запрос в хранилище'
+    assert results == ['storage data'] * 10
+    assert await single_flight.do('-imdb_rating/50/1', load) == 'storage data'
+    assert calls == 2, 'После завершения загрузки ключ не должен оставаться в работе'
+
+
+async def test_stale_value_is_served_while_revalidating(cache):
+    cache_handler = BaseCacheHandler(
+        cache, expired_time=60, refresh_time=0.01, codec=JsonCodec(Genres)
+    )
+    key = genres_key()
+    await cache_handler.put(key, b'old')
+    time.sleep(0.02)
+
+    refreshed = asyncio.Event()
+
+    async def refresh():
+        await cache_handler.put(key, b'new')
+        refreshed.set()
+
+    assert (
+        await cache_handler.get(key) is None
+    ), 'Без функции обновления устаревшее значение считается промахом'
+    results = [await cache_handler.get(key, refresh) for _ in range(5)]
+    assert results == [b'old'] * 5, 'После мягкого TTL сразу отдается устаревшее значение'
+
+    await asyncio.wait_for(refreshed.wait(), 1)
+    assert await cache_handler.get(key, refresh) == b'new'
+
+
+def test_long_cache_keys_are_hashed():
+    query = ' '.join(str(uuid.uuid4()) for _ in range(10))
+    key = films_search_key(query, 50, 1)
+
+    assert len(str(key)) < 64, 'Длинные ключи должны заменяться хешем'
+    assert key == films_search_key(query, 50, 1)
+    assert key.many
+    film_id = str(uuid.uuid4())
+    assert str(build_key('film', film_id)) == f'film:{film_id}'
+
+
+def test_json_codec_round_trip():
+    codec = JsonCodec(Genres)
+    genres = [Genres(id=uuid.uuid4(), name='Action'), Genres(id=uuid.uuid4(), name='Drama')]
+
+    data = codec.encode(genres)
+
+    assert data[0] == JsonCodec.version, 'Значение в кеше должно начинаться с байта версии формата'
+    assert codec.decode(data, many=True) == genres
+    assert codec.decode(codec.encode(genres[0]), many=False) == genres[0]
+    with pytest.raises(CodecError):
+        codec.decode(b'["legacy"]', many=True)
+
+
+def test_large_values_are_compressed():
+    small = b'{"name": "Action"}'
+    large = b'{"name": "Action"}' * 100
+
+    assert compress_value(small, min_size=1024, level=6) == bytes((RAW,)) + small
+    stored = compress_value(large, min_size=1024, level=6)
+    assert stored[0] != RAW and len(stored) < len(large), 'Крупные значения должны сжиматься'
+    assert decompress_value(stored) == large
+    assert decompress_value(b'') is None
+
+
+async def test_precompressed_values_are_stored_raw():
+    redis_cache = RedisCache(compress_min_size=16)
+    redis_cache.connection = Mock(set=AsyncMock())
+    value = b'{"name": "Action"}' * 100
+
+    await redis_cache.set('response:genres', value, 60, compress=False)
+    stored = redis_cache.connection.set.await_args.args[1]
+    assert stored == bytes((RAW,)) + value, 'Уже сжатые значения не должны сжиматься повторно'
+
+
+async def test_redis_stats_report_configured_pool():
+    redis_cache = RedisCache(host='localhost', port=6379, password='secret', max_connections=8)
+    try:
+        stats = redis_cache.stats()
+    finally:
+        await redis_cache.close()
+
+    assert stats['pool'] == {
+        'max_connections': 8,
+        'host': 'localhost',
+        'port': 6379,
+        'db': 0,
+        'socket_timeout': None,
+        'socket_connect_timeout': None,
+    }, 'В статистике только настройки пула, без пароля'
+
+
+async def test_not_found_is_cached(cache):
+    cache_handler = BaseCacheHandler(
+        cache, expired_time=60, not_found_time=30, codec=JsonCodec(Genres)
+    )
+    key = build_key('genre', uuid.uuid4())
+
+    assert await cache_handler.get_value(key) is None
+    await cache_handler.put_not_found(key)
+    assert (
+        await cache_handler.get_value(key) is NOT_FOUND
+    ), 'Отсутствие сущности в хранилище должно кешироваться'
+
+
+def test_xfetch_spreads_refreshes_before_expiry():
+    """
+    Симуляция: 4 воркера читают горячий ключ каждые 10 мс. Для каждого прогона
+    фиксируется момент первого досрочного обновления относительно момента устаревания.
+    """
+    rng = random.Random(42)
+    fresh_until, cost, beta = 300.0, 0.5, 1.0
+    workers, read_interval = 4, 0.01
+
+    refresh_times = []
+    for _ in range(200):
+        now = fresh_until - 30
+        while now < fresh_until:
+            if any(
+                should_refresh_early(now, fresh_until, cost, beta, 1.0 - rng.random())
+                for _ in range(workers)
+            ):
+                break
+            now += read_interval
+        refresh_times.append(now - fresh_until)
+
+    assert all(
+        t < 0 for t in refresh_times
+    ), 'Горячий ключ должен обновляться до момента устаревания'
+    assert min(refresh_times) > -30, 'Далеко от устаревания досрочное обновление маловероятно'
+    assert (
+        statistics.pstdev(refresh_times) > 10 * read_interval
+    ), 'Моменты обновления должны быть распределены во времени, а не совпадать'
+    assert not should_refresh_early(0, fresh_until, cost=0.0, beta=beta)
+
+
+async def test_generation_bump_hides_cached_lists(cache):
+    cache_handler = BaseCacheHandler(
+        cache, expired_time=60, list_expired_time=6 * 60 * 60, codec=JsonCodec(Genres)
+    )
+    genres = [Genres(id=uuid.uuid4(), name='Comedy')]
+
+    generation = await cache_handler.get_generation('genres')
+    await cache_handler.put_value(genres_key(generation), genres)
+    assert await cache_handler.get_value(genres_key(generation)) == genres
+
+    # ETL увеличивает поколение индекса командой INCR
+    cache.data[str(generation_key('genres'))] = b'1'
+    assert (
+        await cache_handler.get_generation('genres') == generation
+    ), 'Поколение индекса запоминается воркером на короткое время'
+
+    cache_handler._generations.clear()
+    new_generation = await cache_handler.get_generation('genres')
+    assert new_generation == generation + 1
+    assert (
+        await cache_handler.get_value(genres_key(new_generation)) is None
+    ), 'После увеличения поколения закешированные списки недоступны'
+
+
+async def test_invalidation_message_evicts_both_tiers():
+    redis_cache = Mock(spec=RedisCache)
+    cache = TwoTierCache(redis_cache, LocalCache(max_entries=10, max_bytes=1024, expired_time=60))
+    genre_id, other_id = uuid.uuid4(), uuid.uuid4()
+    for key in (genre_key(genre_id), genre_key(other_id)):
+        cache.local_cache.set(str(key), b'cached', 60)
+
+    redis_cache.get_counter = AsyncMock(return_value=3)
+
+    subscriber = CacheInvalidationSubscriber(cache, redis_cache, 'cache:invalidate')
+    await subscriber.handle(json.dumps({'index': 'genres', 'ids': [str(genre_id)]}))
+    await subscriber.handle(b'not json')
+
+    assert cache.local_cache.get(str(genre_key(genre_id))) is None
+    assert (
+        cache.local_cache.get(str(genre_key(other_id))) == b'cached'
+    ), 'Записи по другим идентификаторам не должны удаляться'
+    redis_cache.delete.assert_awaited_once_with(
+        str(genre_key(genre_id)), str(detail_response_key('genres', genre_id, (3,)))
+    )
+
+
+async def test_invalidation_subscription_pauses_before_resubscribing(monkeypatch):
+    async def listen(channel):
+        return
+        yield
+
+    redis_cache = Mock(spec=RedisCache)
+    redis_cache.listen = listen
+    sleep = AsyncMock(side_effect=[None, asyncio.CancelledError])
+    monkeypatch.setattr('services.invalidation.asyncio.sleep', sleep)
+
+    subscriber = CacheInvalidationSubscriber(redis_cache, redis_cache, 'cache:invalidate')
+    with pytest.raises(asyncio.CancelledError):
+        await subscriber.run()
+    assert sleep.await_count == 2, 'Завершившаяся без ошибки подписка не должна переподключаться без паузы'
+
+
+async def test_overlapping_filmographies_share_film_entries(cache):
+    films = [FilmShort(id=uuid.uuid4(), title=f'film {i}', imdb_rating=7.0) for i in range(3)]
+    storage_handler = Mock(spec=ElasticFilmHandler)
+    storage_handler.get_films_by_ids = AsyncMock(
+        side_effect=lambda ids: [film for film in films if str(film.id) in ids]
+    )
+    film_service = FilmService(CacheFilmHandler(cache, 60), storage_handler)
+
+    def person(*film_indexes):
+        return Person(
+            id=uuid.uuid4(),
+            full_name='Ann',
+            films=[PersonRoles(id=films[i].id, roles=['actor']) for i in film_indexes]
+        )
+
+    assert await film_service.get_person_films(person(0, 1)) == films[:2]
+    assert await film_service.get_person_films(person(2, 1, 0)) == films[::-1]
+    assert (
+        storage_handler.get_films_by_ids.await_args.args[0] == [str(films[2].id)]
+    ), 'Из хранилища должны запрашиваться только фильмы, которых нет в кеше'
+
+
+async def test_films_batch_loads_only_cache_misses(cache):
+    films = [
+        Film(id=uuid.uuid4(), title=f'film {i}', imdb_rating=7.0, description=None)
+        for i in range(3)
+    ]
+    missing_id = uuid.uuid4()
+    storage_handler = Mock(spec=ElasticFilmHandler)
+    storage_handler.get_full_films_by_ids = AsyncMock(
+        side_effect=lambda ids: [film for film in films if str(film.id) in ids]
+    )
+    film_service = FilmService(CacheFilmHandler(cache, 60, not_found_time=30), storage_handler)
+    await film_service.cache_handler.put_items(
+        {film_key(films[0].id): films[0]}, film_service.cache_handler.codec
+    )
+
+    ids = [films[2].id, missing_id, films[0].id, films[1].id]
+    results = await asyncio.gather(
+        film_service.get_films_by_ids(ids), film_service.get_films_by_ids(ids[:2])
+    )
+    assert results == [[films[2], None, films[0], films[1]], [films[2], None]]
+    assert storage_handler.get_full_films_by_ids.await_count == 1, (
+        'Одновременные запросы должны ожидать уже начатую загрузку тех же фильмов'
+    )
+    assert storage_handler.get_full_films_by_ids.await_args.args[0] == [
+        str(films[2].id), str(missing_id), str(films[1].id)
+    ], 'Из хранилища должны одним запросом загружаться только промахи кеша'
+
+    assert await film_service.get_films_by_ids([missing_id]) == [None]
+    assert (
+        storage_handler.get_full_films_by_ids.await_count == 1
+    ), 'Отсутствие фильма в хранилище должно кешироваться'
+
+
+async def test_film_projection_is_cached_apart_from_full_document(cache):
+    film = Film(
+        id=uuid.uuid4(),
+        title='Star',
+        imdb_rating=7.0,
+        description='A long description',
+        genres=[Genres(id=uuid.uuid4(), name='Action')]
+    )
+    storage = InMemoryStorage({'movies': [film.model_dump(mode='json')]})
+    film_service = FilmService(CacheFilmHandler(cache, 60), ElasticFilmHandler(storage))
+
+    assert await film_service.get_film_by_id(film.id) == film
+    projection = await film_service.get_film_by_id(film.id, ('id', 'title'))
+    assert projection.model_dump(by_alias=True) == {'uuid': film.id, 'title': 'Star'}
+
+    storage.indexes.clear()
+    assert await film_service.get_film_by_id(film.id) == film, 'Проекция не должна вытеснять полную запись'
+    assert (
+        await film_service.get_film_by_id(film.id, ('id', 'title')) == projection
+    ), 'Проекция должна читаться из кеша'
+
+
+def test_projection_keeps_field_validators():
+    model = projection_model(FilmShort, ('id', 'imdb_rating'))
+    film_id = uuid.uuid4()
+
+    assert model(id=film_id, imdb_rating=7.0).model_dump(by_alias=True) == {
+        'uuid': film_id, 'imdb_rating': 7.0
+    }
+    with pytest.raises(ValidationError):
+        model(id=film_id, imdb_rating=150)
+
+
+async def test_circuit_breaker_opens_on_failures_and_closes_after_probe():
+    breaker = CircuitBreaker(
+        failure_rate=0.5, slow_call_time=1.0, min_calls=4, window=10, open_time=0.05
+    )
+    storage = Mock(spec=IStorage)
+    storage.get_by_id = AsyncMock(side_effect=asyncio.TimeoutError)
+    breaker_storage = CircuitBreakerStorage(storage, breaker, call_timeout=1.0)
+
+    for _ in range(4):
+        with pytest.raises(StorageUnavailableError):
+            await breaker_storage.get_by_id('movies', 'id')
+    assert breaker.state == OPEN
+    with pytest.raises(StorageUnavailableError):
+        await breaker_storage.get_by_id('movies', 'id')
+    assert storage.get_by_id.await_count == 4, 'Разомкнутый автомат не должен обращаться к хранилищу'
+
+    await asyncio.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow(), 'В полуоткрытом состоянии допускается один пробный вызов'
+    breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+
+    for _ in range(4):
+        breaker.record(False, 2.0)
+    assert breaker.state == OPEN, 'Медленные вызовы должны считаться сбоями'
+
+
+async def test_shadow_copy_is_served_when_storage_is_unavailable(cache):
+    film = Film(id=uuid.uuid4(), title='film', imdb_rating=7.0, description=None)
+    storage_handler = Mock(spec=ElasticFilmHandler)
+    storage_handler.get_film_by_id = AsyncMock(side_effect=StorageUnavailableError(5))
+    film_service = FilmService(CacheFilmHandler(cache, 0.01, shadow_time=60), storage_handler)
+
+    expired_times = {}
+    set_value = cache.set
+
+    async def set(key, value, expired_time):
+        expired_times[key] = expired_time
+        await set_value(key, value, expired_time)
+
+    cache.set = set
+    await film_service.cache_handler.put_value(film_key(film.id), film)
+    assert list(cache.data) == [str(film_key(film.id))], 'Копия хранится в самой записи, без второго ключа'
+    await film_service.cache_handler.put_value(film_key(film.id, ('id', 'title'), 1), film)
+    await film_service.cache_handler.put_value(
+        films_search_key('film', 10, 1, 1), [FilmShort(id=film.id, title='film', imdb_rating=7.0)]
+    )
+    assert list(expired_times.values()) == [60, 0.01, 0.01], (
+        'Копию дольше expired_time хранят только полные значения по идентификатору'
+    )
+    time.sleep(0.02)
+    assert await film_service.cache_handler.get_value(film_key(film.id)) is None
+    assert await film_service.get_film_by_id(film.id) == film
+    assert film_service.cache_handler.stats['film'].shadow_hits == 1
+
+    with pytest.raises(StorageUnavailableError):
+        await film_service.get_film_by_id(uuid.uuid4())
+
+
+async def test_response_cache_serves_encoded_body_and_not_modified(cache):
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope['query_string'])
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', b'2')],
+        })
+        await send({'type': 'http.response.body', 'body': b'[]'})
+
+    async def get_cache():
+        return cache
+
+    middleware = ResponseCacheMiddleware(
+        app, get_cache, indexes={'/api/v1/films': ('movies',)}, expired_time=60, max_age=30,
+        uncached_params=('cursor',)
+    )
+
+    async def request(query_string, headers=()):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/v1/films/search',
+            'query_string': query_string, 'headers': list(headers),
+        }
+        await middleware(scope, None, send)
+        return messages[0]['status'], dict(messages[0]['headers']), messages[1]['body']
+
+    status, headers, body = await request(b'query=star&page_size=10')
+    assert status == 200 and body == b'[]'
+    assert headers[b'cache-control'] == b'public, max-age=30'
+
+    status, cached_headers, body = await request(b'page_size=10&query=star')
+    assert len(calls) == 1, 'Ответ с теми же параметрами в другом порядке должен отдаваться из кеша'
+    assert cached_headers[b'etag'] == headers[b'etag'] and body == b'[]'
+
+    status, _, body = await request(b'query=star&page_size=10', [(b'if-none-match', headers[b'etag'])])
+    assert status == 304 and body == b''
+
+    # ETL увеличивает поколение индекса после синхронизации
+    cache.data[str(generation_key('movies'))] = b'1'
+    middleware._generations.clear()
+    await request(b'query=star&page_size=10')
+    assert len(calls) == 2, 'После увеличения поколения индекса ответ должен собираться заново'
+
+    keys = set(cache.data)
+    await request(b'query=star&cursor=')
+    await request(b'query=star&cursor=')
+    assert len(calls) == 4 and set(cache.data) == keys, 'Страницы по курсору не должны кешироваться'
+
+
+async def test_response_cache_serves_precompressed_body(cache):
+    payload = json.dumps([{'title': f'film {i}'} for i in range(100)]).encode('utf-8')
+
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def get_cache():
+        return cache
+
+    middleware = ResponseCacheMiddleware(
+        app, get_cache, indexes={'/api/v1/genres': ('genres',)}, expired_time=60, max_age=30
+    )
+
+    async def request(accept_encoding):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/v1/genres/', 'query_string': b'',
+            'headers': [(b'accept-encoding', accept_encoding)],
+        }
+        await middleware(scope, None, send)
+        return dict(messages[0]['headers']), messages[1]['body']
+
+    headers, body = await request(b'gzip, deflate')
+    assert headers[b'content-encoding'] == b'gzip' and headers[b'vary'] == b'Accept-Encoding'
+    assert gzip.decompress(body) == payload and len(body) < len(payload)
+
+    identity_headers, body = await request(b'gzip;q=0')
+    assert body == payload and b'content-encoding' not in identity_headers
+    assert identity_headers[b'etag'] != headers[b'etag'], 'У сжатого тела должен быть свой ETag'
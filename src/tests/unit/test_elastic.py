@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+import uuid
+
+from unittest.mock import AsyncMock, Mock
+
+from elasticsearch import NotFoundError
+from elasticsearch.exceptions import SerializationError
+
+from db.elastic import ElasticStorage
+from db.hedging import HEDGE_MIN_SAMPLES, Hedger
+from db.search_batcher import SearchBatcher
+from db.serializers import create_serializer
+
+
+async def test_concurrent_searches_are_batched():
+    connection = Mock()
+    connection.msearch = AsyncMock(return_value={'responses': [
+        {'hits': {'hits': [{'_source': {'id': 1}}]}},
+        {'status': 404, 'error': {'type': 'index_not_found_exception'}},
+        {'hits': {'hits': [{'_source': {'id': 3}}]}},
+    ]})
+    batcher = SearchBatcher(connection, max_delay=0.01, max_size=10)
+
+    results = await asyncio.gather(
+        batcher.search('movies', {'size': 1}),
+        batcher.search('missing', {'size': 1}),
+        batcher.search('persons', {'size': 1}),
+        return_exceptions=True
+    )
+
+    assert connection.msearch.await_count == 1, 'Одновременные запросы должны уходить одним _msearch'
+    assert results[0]['hits']['hits'][0]['_source'] == {'id': 1}
+    assert isinstance(results[1], NotFoundError)
+    assert results[2]['hits']['hits'][0]['_source'] == {'id': 3}
+    assert batcher.stats.searches == 3 and batcher.stats.batches == 1
+
+
+async def test_slow_requests_are_hedged_within_budget():
+    hedger = Hedger(quantile=0.95, budget=0.05)
+    preferences = []
+
+    async def call(preference, delay):
+        preferences.append(preference)
+        await asyncio.sleep(delay if preference is None else 0)
+        return preference
+
+    for _ in range(HEDGE_MIN_SAMPLES):
+        assert await hedger.run('get:movies', lambda preference: call(preference, 0)) is None
+    assert hedger.stats.hedged == 0, 'До накопления замеров задержки запросы не дублируются'
+
+    results = [
+        await hedger.run('get:movies', lambda preference: call(preference, 0.05))
+        for _ in range(15)
+    ]
+    assert results[0] is not None, 'Медленный запрос должен получить ответ от дублирующего'
+    assert hedger.stats.hedge_wins == hedger.stats.hedged
+    assert hedger.stats.budget_exhausted > 0, 'Количество дублирующих запросов ограничено бюджетом'
+    assert hedger.stats.hedged <= 10 + hedger.stats.requests * 0.05
+    assert len(set(filter(None, preferences))) == hedger.stats.hedged
+
+
+def test_orjson_serializer_matches_client_serializer():
+    serializer, default = create_serializer('orjson'), create_serializer('json')
+    body = {'query': {'term': {'genres.id': uuid.uuid4()}}, 'size': 10}
+
+    assert serializer.loads(serializer.dumps(body)) == default.loads(default.dumps(body))
+    assert isinstance(serializer.dumps(body), str), 'Тела _msearch склеиваются клиентом как строки'
+    assert serializer.loads('{"hits": {"hits": []}}') == {'hits': {'hits': []}}
+    with pytest.raises(SerializationError):
+        serializer.loads('not json')
+
+
+async def test_storage_stats_report_configured_pool():
+    storage = ElasticStorage(search_batch_delay=0.01, hosts=['localhost:9200'], maxsize=5)
+    try:
+        stats = storage.stats()
+    finally:
+        await storage.close()
+
+    assert stats['pool'] == {'nodes': [], 'max_connections_per_node': 5}, (
+        'До первого запроса пул узлов клиента еще не создан'
+    )
+    assert stats['search_batching']['searches'] == 0 and stats['hedging'] is None
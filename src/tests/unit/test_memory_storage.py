@@ -0,0 +1,130 @@
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from elasticsearch.exceptions import NotFoundError, RequestError
+
+from core.config import settings
+from db.memory import InMemoryStorage, edit_distance
+from services.film import ElasticFilmHandler
+from services.genre import ElasticGenreHandler
+from services.pagination import (
+    Cursor,
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    export_query,
+    search_page
+)
+from services.person import ElasticPersonHandler
+
+
+DUMP_PATH = Path(__file__).resolve().parents[3] / 'init_es' / 'es_bulk_dump.json'
+
+
+@pytest.fixture(scope='module')
+def memory_storage() -> InMemoryStorage:
+    return InMemoryStorage.from_bulk_dump(str(DUMP_PATH))
+
+
+def test_edit_distance_counts_transpositions():
+    assert edit_distance('star', 'star', 1) == 0
+    assert edit_distance('star', 'tsar', 1) == 1
+    assert edit_distance('star', 'stray', 1) is None
+
+
+async def test_film_handlers_run_on_memory_storage(memory_storage):
+    films = ElasticFilmHandler(memory_storage)
+
+    found = await films.get_films_by_query('Star', page_size=50, page_number=1)
+    assert found and all('star' in film.title.lower() for film in found[:5])
+
+    rated = await films.get_films_with_sort('-imdb_rating', page_size=20, page_number=1)
+    ratings = [film.imdb_rating for film in rated]
+    assert ratings == sorted(ratings, reverse=True)
+
+    film = await films.get_film_by_id(rated[0].id)
+    assert film.id == rated[0].id and film.genres
+    genre_films = await films.get_films_by_genre_id_with_sort(
+        film.genres[0].id, '-imdb_rating', page_size=10, page_number=1
+    )
+    assert genre_films[0].id == film.id, 'Лучший фильм должен быть первым и в выдаче по жанру'
+    assert await films.get_film_by_id(uuid.uuid4()) is None
+
+
+async def test_cursor_pages_match_offset_pages(memory_storage):
+    films = ElasticFilmHandler(memory_storage)
+
+    first, cursor = await films.get_films_with_sort_after('-imdb_rating', None, 10, Cursor())
+    second, _ = await films.get_films_with_sort_after('-imdb_rating', None, 10, cursor)
+    assert first + second == await films.get_films_with_sort('-imdb_rating', 20, 1)
+
+
+async def test_cursor_is_bound_to_its_query(memory_storage, monkeypatch):
+    monkeypatch.setattr(settings, 'es_point_in_time_enabled', True)
+    monkeypatch.setattr(settings, 'cursor_secret_key', 'secret')
+    films, persons = ElasticFilmHandler(memory_storage), ElasticPersonHandler(memory_storage)
+
+    _, cursor = await films.get_films_by_query_after('Star', 2, Cursor())
+    cursor = decode_cursor(encode_cursor(cursor))
+    with pytest.raises(InvalidCursorError):
+        await persons.get_persons_by_query_after('Star', 2, cursor)
+    with pytest.raises(InvalidCursorError):
+        await search_page(memory_storage, 'movies', export_query(None).to_body(), cursor)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(encode_cursor(cursor).split('.')[0] + '.forged')
+
+    while cursor is not None:
+        _, cursor = await films.get_films_by_query_after('Star', 50, cursor, ('id', 'title'))
+    assert not memory_storage._points_in_time, 'После последней страницы point-in-time закрывается'
+
+
+async def test_expired_point_in_time_is_not_end_of_results(memory_storage, monkeypatch):
+    monkeypatch.setattr(settings, 'es_point_in_time_enabled', True)
+    monkeypatch.setattr(settings, 'export_page_size', 100)
+    films = ElasticFilmHandler(memory_storage)
+
+    _, cursor = await films.get_films_by_query_after('Star', 2, Cursor())
+    await memory_storage.close_point_in_time(cursor.point_in_time)
+    with pytest.raises(InvalidCursorError):
+        await films.get_films_by_query_after('Star', 2, cursor)
+
+    pages = films.export_films(('id', 'title'), None)
+    await anext(pages)
+    memory_storage._points_in_time.clear()
+    with pytest.raises(NotFoundError):
+        await anext(pages)
+
+
+async def test_persons_are_built_from_film_credits(memory_storage):
+    persons = await ElasticPersonHandler(memory_storage).get_persons_by_query('Ross', 10, 1)
+    assert persons and all(person.films for person in persons)
+
+    with pytest.raises(RequestError):
+        await memory_storage.search('movies', {'query': {'match': {'title': 'star'}}})
+
+
+async def test_export_streams_projected_pages_in_point_in_time(memory_storage, monkeypatch):
+    monkeypatch.setattr(settings, 'export_page_size', 100)
+    films = ElasticFilmHandler(memory_storage)
+
+    pages = [page async for page in films.export_films(('id', 'title'), None)]
+    ids = [film.id for page in pages for film in page]
+    assert len(pages) > 1 and all(len(page) <= 100 for page in pages)
+    assert len(ids) == len(set(ids)) == len(memory_storage.indexes['movies'].docs)
+    assert set(pages[0][0].model_dump(by_alias=True)) == {'uuid', 'title'}
+    assert not memory_storage._points_in_time, 'Point-in-time закрывается после выгрузки'
+
+
+async def test_export_since_returns_only_modified_documents():
+    storage = InMemoryStorage({'genres': [
+        {'id': str(uuid.uuid4()), 'name': 'Old', 'modified': '2023-01-01T00:00:00+00:00'},
+        {'id': str(uuid.uuid4()), 'name': 'New', 'modified': '2023-06-01T00:00:00+00:00'},
+        {'id': str(uuid.uuid4()), 'name': 'Unknown'},
+    ]})
+    genres = ElasticGenreHandler(storage)
+
+    since = datetime(2023, 3, 1, tzinfo=timezone.utc)
+    pages = [page async for page in genres.export_genres(None, since)]
+    assert [genre.name for page in pages for genre in page] == ['New']
@@ -0,0 +1,58 @@
+import uuid
+
+from db.query_builder import BY_SCORE, TIE_BREAKER, FuzzyMatch, NestedTerm, SearchQuery, Sort
+from services.film import get_genre_filter, get_sort
+
+
+def test_sort_is_parsed_from_api_parameter():
+    assert Sort.parse('-imdb_rating') == Sort('imdb_rating', 'desc')
+    assert Sort.parse('title') == Sort('title', 'asc')
+    assert get_sort('-imdb_rating') == [Sort('imdb_rating', 'desc'), TIE_BREAKER]
+
+
+def test_genre_filter_is_in_filter_context():
+    genre_id = uuid.uuid4()
+    body = SearchQuery(
+        filters=[get_genre_filter(genre_id)],
+        sort=get_sort('-imdb_rating'),
+        size=50,
+        offset=50
+    ).to_body()
+
+    assert body == {
+        'query': {
+            'bool': {
+                'filter': [{
+                    'nested': {
+                        'path': 'genres',
+                        'query': {'term': {'genres.id': str(genre_id)}}
+                    }
+                }]
+            }
+        },
+        'sort': [{'imdb_rating': {'order': 'desc'}}, {'id': {'order': 'asc'}}],
+        'size': 50,
+        'from': 50
+    }, 'Фильтр по жанру не должен участвовать в расчете релевантности'
+
+
+def test_fuzzy_match_is_scored_and_combined_with_filters():
+    match = FuzzyMatch('title', 'Star')
+    assert SearchQuery(match=match, size=10).to_body() == {
+        'query': {'fuzzy': {'title': {'value': 'Star', 'fuzziness': 'AUTO'}}},
+        'size': 10
+    }
+
+    body = SearchQuery(
+        match=match, filters=[NestedTerm('genres', 'id', 'a')], sort=[BY_SCORE, TIE_BREAKER]
+    ).to_body()
+    assert body['query']['bool']['must'] == [match.to_dsl()]
+    assert body['query']['bool']['filter'] == [NestedTerm('genres', 'id', 'a').to_dsl()]
+    assert body['sort'][0] == {'_score': {'order': 'desc'}}
+
+
+def test_empty_query_matches_all_and_is_cacheable():
+    search_query = SearchQuery(size=1000)
+
+    assert search_query.to_body() == {'size': 1000}
+    assert search_query.request_cache